@@ -0,0 +1,198 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import BooleanField, Count, ExpressionWrapper, Max, Q
+from django.utils import timezone
+from .api import last_change, removal_stamp
+from .archive import read_archive
+from .models import Interview, InterviewScript
+from .twiml import INTERVIEW_QUESTIONS
+import hashlib
+import numpy as np
+import pandas as pd
+
+# The hot table is read in one query: each interview joined with its responses, one row per response.
+# Only whether a call started is needed, which spares converting a datetime per row.
+INTERVIEW_FIELDS = ['id', 'status', 'answered_questions', 'started', 'script_id', 'created_at']
+RESPONSE_FIELDS = ['id', 'question', 'recording_sid', 'recording_duration', 'transcript_status']
+JOINED_FIELDS = INTERVIEW_FIELDS + [f"responses__{field}" for field in RESPONSE_FIELDS]
+
+DURATION_QUANTILES = {'p25': 0.25, 'median': 0.5, 'p75': 0.75, 'p90': 0.9}
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+def analytics_version():
+    """
+    Changes whenever the analytics could: a call or response changed, was
+    deleted or archived, or a script version was published or removed.
+
+    Four queries: the ends of the two updated_at indexes, the removed_rows
+    counter found by its unique name, and an aggregate over the small
+    InterviewScript table, whose script lengths the funnel reads. A cached
+    report is validated without reading the call tables.
+    """
+    scripts = InterviewScript.objects.aggregate(count=Count('id'), last=Max('id'), version=Max('version'))
+    stamp = '|'.join(
+        value.isoformat() if hasattr(value, 'isoformat') else str(value)
+        for value in (last_change(), removal_stamp(), scripts['count'], scripts['last'], scripts['version'])
+    )
+    return hashlib.md5(stamp.encode()).hexdigest()
+
+
+def load_frames():
+    """
+    Every interview and response as two DataFrames, hot rows and archived ones alike.
+
+    The database is read in a single query whose rows are transposed into
+    one NumPy array per column; archived months are read column-wise from
+    their Parquet files.
+    """
+    rows = list(Interview.objects.order_by().annotate(
+        started=ExpressionWrapper(Q(started_at__isnull=False), output_field=BooleanField())
+    ).values_list(*JOINED_FIELDS))
+    columns = dict(zip(JOINED_FIELDS, zip(*rows))) if rows else {field: () for field in JOINED_FIELDS}
+    joined = pd.DataFrame({
+        field: pd.to_datetime(np.array(values, dtype=object), utc=True) if field.endswith('_at')
+        else np.array(values, dtype=object)
+        for field, values in columns.items()
+    })
+
+    interviews = joined[INTERVIEW_FIELDS].drop_duplicates('id')
+    responses = joined[joined['responses__id'].notna()]
+    responses = pd.DataFrame({
+        'interview_id': responses['id'].to_numpy(),
+        **{field: responses[f"responses__{field}"].to_numpy() for field in RESPONSE_FIELDS},
+    })
+
+    archived_interviews = read_archive(
+        'interviews', [field for field in INTERVIEW_FIELDS if field != 'started'] + ['started_at']
+    ).to_pandas()
+    archived_interviews['started'] = archived_interviews.pop('started_at').notna()
+    archived_responses = read_archive('responses', ['interview_id'] + RESPONSE_FIELDS).to_pandas()
+    interviews = pd.concat([frame for frame in (interviews, archived_interviews) if len(frame)] or [interviews])
+    responses = pd.concat([frame for frame in (responses, archived_responses) if len(frame)] or [responses])
+    return interviews.reset_index(drop=True), responses.reset_index(drop=True)
+
+
+def _rate(part, whole):
+    return round(float(part) / whole, 4) if whole else None
+
+
+def picked_up(interviews):
+    """Whether each call was answered; calls imported from Twilio's history only carry their status"""
+    answered_questions = interviews['answered_questions'].fillna(0).astype(int)
+    return interviews['started'].astype(bool) | (interviews['status'] == 'completed') | (answered_questions > 0)
+
+
+def completion_funnel(interviews):
+    """Calls placed, picked up, and with every question of their script answered"""
+    script_lengths = dict(
+        (script_id, len(questions)) for script_id, questions in InterviewScript.objects.values_list('id', 'questions')
+    )
+    expected = interviews['script_id'].map(script_lengths).fillna(len(INTERVIEW_QUESTIONS))
+    finished = interviews['answered_questions'].fillna(0).astype(int) >= expected
+
+    total = len(interviews)
+    return [
+        {'stage': stage, 'calls': int(count), 'rate': _rate(count, total)}
+        for stage, count in (('Initiated', total), ('Answered', picked_up(interviews).sum()), ('All questions answered', finished.sum()))
+    ]
+
+
+def question_stats(responses):
+    """Per question: the distribution of recorded answer lengths and how many were transcribed"""
+    recorded = responses['recording_sid'].notna()
+    frame = pd.DataFrame({
+        'question': responses['question'].fillna('(no question)'),
+        'duration': pd.to_numeric(responses['recording_duration'], errors='coerce'),
+        'recorded': recorded,
+        'transcribed': recorded & (responses['transcript_status'] == 'completed'),
+    })
+    grouped = frame.groupby('question', sort=False)
+    summary = grouped.agg(
+        responses=('question', 'size'), recorded=('recorded', 'sum'), transcribed=('transcribed', 'sum'),
+        durations=('duration', 'count'), mean=('duration', 'mean'), max=('duration', 'max'),
+    )
+    for name, quantile in DURATION_QUANTILES.items():
+        summary[name] = grouped['duration'].quantile(quantile)
+    summary = summary.sort_values('responses', ascending=False)
+
+    def number(value):
+        return None if pd.isna(value) else round(float(value), 1)
+
+    return [
+        {
+            'question': row.Index,
+            'responses': int(row.responses),
+            'durations': int(row.durations),
+            'mean': number(row.mean),
+            **{name: number(getattr(row, name)) for name in DURATION_QUANTILES},
+            'max': number(row.max),
+            'transcribed': int(row.transcribed),
+            'transcript_rate': _rate(row.transcribed, row.recorded),
+        }
+        for row in summary.itertuples()
+    ]
+
+
+def transcript_availability(responses):
+    """How many recorded answers have a transcript, and the status of the rest"""
+    recorded = responses[responses['recording_sid'].notna()]
+    by_status = recorded['transcript_status'].fillna('none').value_counts()
+    completed = int(by_status.get('completed', 0))
+    return {
+        'responses': len(responses),
+        'recorded': len(recorded),
+        'completed': completed,
+        'rate': _rate(completed, len(recorded)),
+        'by_status': {status: int(count) for status, count in by_status.items()},
+    }
+
+
+def pickup_rates(interviews):
+    """The share of calls picked up by hour of day and by day of week they were placed, in TIME_ZONE"""
+    placed = interviews['created_at'].dt.tz_convert(settings.TIME_ZONE)
+    was_picked_up = picked_up(interviews).to_numpy()
+    hours, weekdays = placed.dt.hour.to_numpy(), placed.dt.weekday.to_numpy()
+
+    def rates(keys, size):
+        calls = np.bincount(keys, minlength=size)
+        answered = np.bincount(keys, weights=was_picked_up, minlength=size).astype(int)
+        return [(int(calls[key]), int(answered[key]), _rate(answered[key], calls[key])) for key in range(size)]
+
+    return (
+        [{'hour': hour, 'calls': calls, 'answered': answered, 'rate': rate}
+         for hour, (calls, answered, rate) in enumerate(rates(hours, 24))],
+        [{'day': WEEKDAYS[day], 'calls': calls, 'answered': answered, 'rate': rate}
+         for day, (calls, answered, rate) in enumerate(rates(weekdays, 7))],
+    )
+
+
+def compute_analytics():
+    """Every analytics report, computed from scratch over all calls"""
+    interviews, responses = load_frames()
+    by_hour, by_weekday = pickup_rates(interviews)
+    return {
+        'generated_at': timezone.now().isoformat(),
+        'funnel': completion_funnel(interviews),
+        'questions': question_stats(responses),
+        'transcripts': transcript_availability(responses),
+        'pickup_by_hour': by_hour,
+        'pickup_by_weekday': by_weekday,
+    }
+
+
+def get_analytics(version=None):
+    """
+    The analytics reports, computed once per change to the data.
+
+    Cached under the data's version, so a repeat view costs the version
+    lookups and a cache hit, and any change to a call or response, or an
+    archive run, makes the next view recompute.
+    """
+    version = version or analytics_version()
+    key = f"call.analytics:{version}"
+    report = cache.get(key)
+    if report is None:
+        report = compute_analytics()
+        cache.set(key, report, settings.ANALYTICS_CACHE_TIMEOUT)
+    return report
@@ -0,0 +1,108 @@
+from datetime import timedelta
+from django.db.models import Max, Prefetch, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import CallResponse, DashboardCounter, Interview
+from .stats import REMOVED
+import hashlib
+
+MAX_PAGE_SIZE = 100
+# Changes are stamped before their transaction commits, so a poll re-reads a little before the
+# last change it saw to pick up transactions that were still open; clients merge by call_sid
+OVERLAP = timedelta(seconds=5)
+
+RESPONSE_FIELDS = [
+    'id', 'question', 'recording_sid', 'recording_url', 'recording_duration', 'transcript', 'transcript_status',
+    'created_at', 'updated_at',
+]
+CALL_FIELDS = [
+    'call_sid', 'phone_number', 'status', 'duration', 'answered_questions', 'started_at', 'ended_at', 'created_at',
+    'updated_at',
+]
+
+
+def parse_updated_since(value):
+    """An aware datetime from an ISO 8601 updated_since parameter; raises ValueError if malformed"""
+    since = parse_datetime(value)
+    if since is None:
+        raise ValueError(f"Invalid updated_since: {value!r}")
+    if timezone.is_naive(since):
+        since = timezone.make_aware(since)
+    return since
+
+
+def last_change():
+    """
+    When a call or response last changed, or None without any.
+
+    Two lookups at the end of the updated_at indexes, cheap enough to run on
+    every poll to answer If-None-Match before reading any page.
+    """
+    changes = [
+        Interview.objects.aggregate(last=Max('updated_at'))['last'],
+        CallResponse.objects.aggregate(last=Max('updated_at'))['last'],
+    ]
+    changes = [change for change in changes if change]
+    return max(changes) if changes else None
+
+
+def removal_stamp():
+    """
+    What last_change() cannot see: deleted and archived rows leave no updated_at behind.
+
+    Database triggers count every removed row, so this is one lookup of a
+    counter row by its unique name.
+    """
+    return DashboardCounter.objects.filter(name=REMOVED).values_list('value', flat=True).first() or 0
+
+
+def calls_etag(full_path, changed_at, removed=0):
+    """A validator for one page of the calls API, changing whenever any call or response does or is removed"""
+    stamp = changed_at.isoformat() if changed_at else ''
+    return '"' + hashlib.md5(f"{full_path}|{stamp}|{removed}".encode()).hexdigest() + '"'
+
+
+def changed_calls(cursor=None, limit=20, updated_since=None):
+    """
+    A page of interviews, newest first, each with its responses.
+
+    With ``updated_since`` only interviews that changed after it, or whose
+    responses did, are returned. Pages are keyset-paginated on
+    (created_at, id) like the dashboard; returns the interviews and the
+    cursor of the next page.
+    """
+    interviews = Interview.objects.order_by('-created_at', '-id').prefetch_related(
+        Prefetch('responses', queryset=CallResponse.objects.order_by('created_at', 'id'), to_attr='response_list')
+    )
+    if updated_since:
+        # A UNION of the two updated_at range scans, so a poll reads only what changed; an OR
+        # would walk every interview in created_at order looking for a match
+        changed = (
+            Interview.objects.filter(updated_at__gt=updated_since).order_by().values('id')
+            .union(CallResponse.objects.filter(updated_at__gt=updated_since).order_by().values('interview_id'))
+        )
+        interviews = interviews.filter(id__in=changed)
+    if cursor:
+        created_at, interview_id = cursor
+        interviews = interviews.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=interview_id))
+
+    # Fetch one extra row to know whether there is an older page
+    page = list(interviews[:limit + 1])
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = f"{page[-1].created_at.isoformat()}|{page[-1].id}"
+    return page, next_cursor
+
+
+def _json_value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def serialize_call(interview):
+    data = {field: _json_value(getattr(interview, field)) for field in CALL_FIELDS}
+    data['responses'] = [
+        {field: _json_value(getattr(response, field)) for field in RESPONSE_FIELDS}
+        for response in interview.response_list
+    ]
+    return data
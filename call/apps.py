@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class CallConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'call'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete, post_save
+        from .metrics import install_query_timer
+        from .models import InterviewScript
+        from .twiml import script_changed, warm_twiml_cache
+        connection_created.connect(install_query_timer)
+        post_save.connect(script_changed, sender=InterviewScript)
+        post_delete.connect(script_changed, sender=InterviewScript)
+        warm_twiml_cache()
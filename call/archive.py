@@ -0,0 +1,239 @@
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from functools import reduce
+from .models import CallResponse, Interview
+from .stats import record_archived
+import hashlib
+import operator
+import os
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import tempfile
+
+# Columns kept per archived interview and per archived response
+INTERVIEW_COLUMNS = [
+    'id', 'call_sid', 'phone_number', 'status', 'duration', 'answered_questions', 'started_at', 'ended_at',
+    'script_id', 'created_at', 'updated_at',
+]
+RESPONSE_COLUMNS = [
+    'id', 'interview_id', 'phone_number', 'question', 'response', 'recording_url', 'recording_sid',
+    'recording_duration', 'transcript', 'transcript_status', 'transcript_attempts', 'call_sid', 'call_status',
+    'call_duration', 'created_at', 'updated_at',
+]
+# Responses carry their interview's status and duration, so exports read one dataset
+RESPONSE_LOOKUPS = {'call_status': 'interview__status', 'call_duration': 'interview__duration'}
+ARCHIVE_COLUMN = {lookup: column for column, lookup in RESPONSE_LOOKUPS.items()}
+
+_TIMESTAMP = pa.timestamp('us', tz='UTC')
+SCHEMAS = {
+    'interviews': pa.schema([
+        ('id', pa.int64()), ('call_sid', pa.string()), ('phone_number', pa.string()), ('status', pa.string()),
+        ('duration', pa.int64()), ('answered_questions', pa.int64()), ('started_at', _TIMESTAMP),
+        ('ended_at', _TIMESTAMP), ('script_id', pa.int64()), ('created_at', _TIMESTAMP), ('updated_at', _TIMESTAMP),
+    ]),
+    'responses': pa.schema([
+        ('id', pa.int64()), ('interview_id', pa.int64()), ('phone_number', pa.string()), ('question', pa.string()),
+        ('response', pa.string()), ('recording_url', pa.string()), ('recording_sid', pa.string()),
+        ('recording_duration', pa.int64()), ('transcript', pa.string()), ('transcript_status', pa.string()),
+        ('transcript_attempts', pa.int64()), ('call_sid', pa.string()), ('call_status', pa.string()),
+        ('call_duration', pa.int64()), ('created_at', _TIMESTAMP), ('updated_at', _TIMESTAMP),
+    ]),
+}
+# Month partitions are directories named month=YYYY-MM, by created_at in UTC
+PARTITIONING = ds.partitioning(pa.schema([('month', pa.string())]), flavor='hive')
+
+
+def month_of(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y-%m')
+
+
+def _write_table(table, path):
+    """
+    Write a Parquet file atomically and durably.
+
+    Once the rows are deleted it is their only copy, so it is synced to disk
+    before it takes its final name, and readers never see a partial file.
+    """
+    directory = os.path.dirname(path)
+    descriptor, temporary = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(descriptor, 'wb') as output:
+            pq.write_table(table, output, compression=settings.ARCHIVE_COMPRESSION)
+            output.flush()
+            os.fsync(output.fileno())
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    directory_descriptor = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(directory_descriptor)
+    finally:
+        os.close(directory_descriptor)
+
+
+def write_partitions(kind, rows, root=None):
+    """
+    Write archived rows to one file per month, sorted by created_at; returns the bytes written.
+
+    Files are named by the ids they hold, so archiving the same batch again
+    after a crash replaces its files instead of adding a second copy.
+    """
+    root = root or settings.ARCHIVE_ROOT
+    months = defaultdict(list)
+    for row in rows:
+        months[month_of(row['created_at'])].append(row)
+
+    written = 0
+    for month, month_rows in months.items():
+        month_rows.sort(key=lambda row: (row['created_at'], row['id']))
+        ids = ','.join(str(row['id']) for row in month_rows)
+        name = f"part-{month_rows[0]['id']:012d}-{hashlib.sha256(ids.encode()).hexdigest()[:16]}.parquet"
+        directory = os.path.join(root, kind, f"month={month}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, name)
+        _write_table(pa.Table.from_pylist(month_rows, schema=SCHEMAS[kind]), path)
+        written += os.path.getsize(path)
+    return written
+
+
+def archive_batch(interview_ids=(), response_ids=(), root=None):
+    """
+    Move interviews and their responses from the database to the archive.
+
+    ``response_ids`` adds responses that belong to no interview; those of
+    an interview go with it. The interviews are locked, so none gains a
+    response while the batch is read, written and deleted in one
+    transaction that also notes the rows for the dashboard recounts. The
+    files are synced before the rows are deleted, so a crash leaves rows in
+    both places rather than in neither, and the rerun replaces the files.
+    Returns the interviews and responses archived and the bytes written.
+    """
+    with transaction.atomic():
+        interviews = list(
+            Interview.objects.select_for_update().filter(id__in=interview_ids).values(*INTERVIEW_COLUMNS)
+        )
+        responses = list(CallResponse.objects.filter(
+            Q(interview_id__in=interview_ids) | Q(id__in=response_ids, interview__isnull=True)
+        ).values(
+            *[column for column in RESPONSE_COLUMNS if column not in RESPONSE_LOOKUPS],
+            **{column: F(lookup) for column, lookup in RESPONSE_LOOKUPS.items()}
+        ))
+        written = write_partitions('interviews', interviews, root) + write_partitions('responses', responses, root)
+
+        CallResponse.objects.filter(id__in=[response['id'] for response in responses]).delete()
+        Interview.objects.filter(id__in=[interview['id'] for interview in interviews]).delete()
+        record_archived(
+            total_calls=len(interviews),
+            completed_calls=sum(interview['status'] == 'completed' for interview in interviews),
+            total_responses=len(responses),
+            completed_transcripts=sum(response['transcript_status'] == 'completed' for response in responses),
+        )
+    return len(interviews), len(responses), written
+
+
+def archivable(cutoff):
+    """Interviews created before ``cutoff``, oldest first"""
+    return Interview.objects.filter(created_at__lt=cutoff).order_by('created_at', 'id')
+
+
+def orphaned(cutoff):
+    """Responses created before ``cutoff`` that belong to no interview, oldest first"""
+    return CallResponse.objects.filter(interview__isnull=True, created_at__lt=cutoff).order_by('created_at', 'id')
+
+
+def archive_before(cutoff, batch_size=500, root=None, running=None):
+    """
+    Archive every interview created before ``cutoff``, ``batch_size`` at a time,
+    then the responses of that age that belong to no interview.
+
+    Each batch commits on its own, so the write lock is held briefly and an
+    interrupted run loses nothing; ``running`` is checked between batches.
+    Yields the counts of every batch as archive_batch returns them.
+    """
+    while running is None or running():
+        interview_ids = list(archivable(cutoff).values_list('id', flat=True)[:batch_size])
+        if not interview_ids:
+            break
+        yield archive_batch(interview_ids, root=root)
+    while running is None or running():
+        response_ids = list(orphaned(cutoff).values_list('id', flat=True)[:batch_size])
+        if not response_ids:
+            return
+        yield archive_batch(response_ids=response_ids, root=root)
+
+
+def _dataset(kind, root=None):
+    path = os.path.join(root or settings.ARCHIVE_ROOT, kind)
+    if not os.path.isdir(path):
+        return None
+    return ds.dataset(path, format='parquet', partitioning=PARTITIONING, schema=SCHEMAS[kind].append(
+        pa.field('month', pa.string())
+    ))
+
+
+def _months(kind, root=None):
+    """The month partitions of an archive, newest first"""
+    try:
+        names = os.listdir(os.path.join(root or settings.ARCHIVE_ROOT, kind))
+    except FileNotFoundError:
+        return []
+    return sorted((name.removeprefix('month=') for name in names if name.startswith('month=')), reverse=True)
+
+
+def _filter(start=None, end=None, **equals):
+    """
+    An Arrow filter on created_at in [start, end) and column values.
+
+    The month bounds let the scan skip whole partitions, the created_at
+    bounds skip row groups by their statistics.
+    """
+    conditions = []
+    if start:
+        conditions += [ds.field('month') >= month_of(start), ds.field('created_at') >= start]
+    if end:
+        conditions += [ds.field('month') <= month_of(end - timedelta(microseconds=1)), ds.field('created_at') < end]
+    conditions += [ds.field(name) == value for name, value in equals.items()]
+    return reduce(operator.and_, conditions) if conditions else None
+
+
+def read_archive(kind, columns=None, start=None, end=None, root=None, **equals):
+    """
+    Archived 'interviews' or 'responses' created in [start, end) as an Arrow table.
+
+    Only the requested columns are read; keyword arguments keep rows whose
+    column equals the value. Use ``.to_pandas()`` for analytics.
+    """
+    columns = columns or SCHEMAS[kind].names
+    dataset = _dataset(kind, root)
+    if dataset is None:
+        return SCHEMAS[kind].empty_table().select(columns)
+    return dataset.to_table(columns=columns, filter=_filter(start, end, **equals))
+
+
+def archived_responses(fields, start=None, end=None, status=None, chunk_size=2000, root=None):
+    """
+    Yield archived responses as tuples of ``fields``, newest first, like a values_list of the hot table.
+
+    ``fields`` are CallResponse lookups such as interview__status. Reads one
+    month at a time, so memory is bounded by the largest month.
+    """
+    dataset = _dataset('responses', root)
+    if dataset is None:
+        return
+    columns = [ARCHIVE_COLUMN.get(field, field) for field in fields]
+    equals = {'call_status': status} if status else {}
+    for month in _months('responses', root):
+        if (start and month < month_of(start)) or (end and month > month_of(end - timedelta(microseconds=1))):
+            continue
+        table = dataset.to_table(
+            columns=list(dict.fromkeys(columns + ['created_at'])),
+            filter=_filter(start, end, month=month, **equals)
+        )
+        table = table.sort_by([('created_at', 'descending')]).select(columns)
+        for batch in table.to_batches(max_chunksize=chunk_size):
+            yield from zip(*(column.to_pylist() for column in batch.columns))
@@ -0,0 +1,52 @@
+from contextlib import contextmanager
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+import statistics
+import time
+
+
+def summarize(samples):
+    """Summarize latency samples (in seconds) as milliseconds"""
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+    def percentile(fraction):
+        return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))] * 1000
+    return {
+        'count': len(ordered),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3),
+        'p50_ms': round(percentile(0.50), 3),
+        'p95_ms': round(percentile(0.95), 3),
+        'p99_ms': round(percentile(0.99), 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+
+
+def timed(func, iterations):
+    """Call func() iterations times and return the per-call wall times in seconds"""
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def format_summary(label, summary):
+    """One aligned report line for a summarize() result"""
+    return (
+        f"{label:<28} n={summary['count']:<6} mean={summary['mean_ms']:>9.3f}ms "
+        f"p50={summary['p50_ms']:>9.3f}ms p95={summary['p95_ms']:>9.3f}ms p99={summary['p99_ms']:>9.3f}ms"
+    )
+
+
+@contextmanager
+def test_database(verbosity=0):
+    """Run a block against a throwaway test database instead of db.sqlite3"""
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity)
+        teardown_test_environment()
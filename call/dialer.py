@@ -0,0 +1,233 @@
+from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+from .interviews import start_interview
+from .models import Campaign, CampaignNumber
+from .telephony import TelephonyError, get_provider
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    Tokens refill continuously at ``rate`` per second up to ``capacity``, so a
+    bucket with rate=1 admits one call per second with no bursts above the
+    account's calls-per-second limit.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1.0, self.rate))
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self):
+        """Take a token if one is available, without blocking"""
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def acquire(self):
+        """Block until a token is available"""
+        while not self.try_acquire():
+            with self.lock:
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+    def pause(self, seconds):
+        """Empty the bucket so nothing is admitted for roughly ``seconds``, e.g. after a 429"""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+def create_call(provider, phone_number):
+    """Ask the telephony provider to dial a candidate into the interview flow"""
+    return provider.create_call(phone_number, f"{settings.PUBLIC_URL}/answer/", f"{settings.PUBLIC_URL}/call_status/")
+
+
+async def create_call_async(provider, phone_number):
+    """create_call without holding a thread while the provider answers"""
+    return await provider.create_call_async(
+        phone_number, f"{settings.PUBLIC_URL}/answer/", f"{settings.PUBLIC_URL}/call_status/"
+    )
+
+
+def record_call(phone_number, call, script_id=None):
+    """Create the interview record for a call the provider accepted"""
+    return start_interview(call.sid, phone_number, call.status, script_id)
+
+
+def place_call(phone_number, provider=None, script_id=None):
+    """Dial one number and record it, as make_call does for a single form POST"""
+    call = create_call(provider or get_provider(), phone_number)
+    record_call(phone_number, call, script_id)
+    return call
+
+
+async def place_call_async(phone_number, provider=None, script_id=None):
+    """place_call without holding a thread while the provider answers"""
+    call = await create_call_async(provider or get_provider(), phone_number)
+    await sync_to_async(record_call)(phone_number, call, script_id)
+    return call
+
+
+class CampaignDialer:
+    """
+    Dials queued campaign numbers within the provider's limits.
+
+    Each cycle fills the free live-call slots (``max_live_calls`` minus numbers
+    still dialing) with due numbers. Calls are admitted by a token bucket at
+    ``calls_per_second`` and placed on a small thread pool so the provider's API
+    latency does not cap throughput below the CPS limit. All database writes
+    happen on the calling thread.
+    """
+
+    def __init__(self, provider=None, calls_per_second=None, max_live_calls=None, max_attempts=3,
+                 retry_delay=60, stale_after=3600, workers=4, bucket=None):
+        self.provider = provider or get_provider()
+        self.bucket = bucket or TokenBucket(calls_per_second or settings.TWILIO_CALLS_PER_SECOND)
+        self.max_live_calls = max_live_calls or settings.CAMPAIGN_MAX_LIVE_CALLS
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.stale_after = stale_after
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    def live_calls(self):
+        return CampaignNumber.objects.filter(status='dialing').count()
+
+    def due_numbers(self, limit):
+        now = timezone.now()
+        return list(
+            CampaignNumber.objects
+            .filter(status='queued', campaign__status__in=['pending', 'running'])
+            .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+            .select_related('campaign')
+            .order_by('campaign__created_at', 'id')[:limit]
+        )
+
+    def expire_stale_calls(self):
+        """Free slots held by calls whose final status callback never arrived"""
+        cutoff = timezone.now() - timedelta(seconds=self.stale_after)
+        return CampaignNumber.objects.filter(status='dialing', updated_at__lt=cutoff).update(
+            status='failed', error='No final status callback received', updated_at=timezone.now()
+        )
+
+    def finish_campaigns(self):
+        """Mark running campaigns without queued or live numbers as completed"""
+        return (
+            Campaign.objects
+            .filter(status='running')
+            .exclude(numbers__status__in=['queued', 'dialing'])
+            .update(status='completed', updated_at=timezone.now())
+        )
+
+    def run_once(self):
+        """Run one dialing cycle and return the number of calls the provider accepted"""
+        self.expire_stale_calls()
+        free_slots = self.max_live_calls - self.live_calls()
+        numbers = self.due_numbers(free_slots) if free_slots > 0 else []
+        if not numbers:
+            self.finish_campaigns()
+            return 0
+
+        # Claim the numbers before dialing so they count against the live call cap
+        CampaignNumber.objects.filter(id__in=[number.id for number in numbers]).update(
+            status='dialing', updated_at=timezone.now()
+        )
+        Campaign.objects.filter(id__in={number.campaign_id for number in numbers}, status='pending').update(
+            status='running', updated_at=timezone.now()
+        )
+
+        # Record each call as soon as the provider accepts it, its status callbacks may already be on the way
+        pending, failed, dialed = {}, [], 0
+        try:
+            for number in numbers:
+                self.bucket.acquire()
+                pending[self.executor.submit(create_call, self.provider, number.phone_number)] = number
+                for future in [future for future in pending if future.done()]:
+                    dialed += self._settle(pending.pop(future), future, failed)
+        finally:
+            # Calls already placed are saved even if the cycle is interrupted
+            for future in as_completed(pending):
+                dialed += self._settle(pending[future], future, failed)
+            # bulk_update skips auto_now, updated_at is stamped in _settle
+            CampaignNumber.objects.bulk_update(
+                failed, ['status', 'call_sid', 'call_status', 'attempts', 'next_attempt_at', 'error', 'updated_at']
+            )
+        self.finish_campaigns()
+        return dialed
+
+    def _settle(self, number, future, failed):
+        """
+        Save a dialed number and its interview at once, or add it to ``failed``; returns 1 if it was dialed.
+
+        Never raises, so one number's error does not leave the rest of the cycle unsaved.
+        """
+        now = timezone.now()
+        number.updated_at = now
+        try:
+            call = future.result()
+        except TelephonyError as e:
+            if e.status == 429:
+                # Over the CPS limit: back off and retry without spending an attempt
+                logger.warning(f"Rate limited dialing {number.phone_number}, backing off")
+                self.bucket.pause(1)
+                number.status = 'queued'
+                number.next_attempt_at = now + timedelta(seconds=1)
+            else:
+                self._record_failure(number, e, now)
+            failed.append(number)
+            return 0
+        except Exception as e:
+            self._record_failure(number, e, now)
+            failed.append(number)
+            return 0
+
+        try:
+            # The number first, so a final status flushed right after the interview row exists finds both
+            CampaignNumber.objects.filter(id=number.id).update(
+                status='dialing', call_sid=call.sid, call_status=call.status, attempts=F('attempts') + 1, error=None,
+                updated_at=now
+            )
+            record_call(number.phone_number, call, number.campaign.script_id)
+        except Exception as e:
+            # The call is placed either way, so the number is not dialed again; if the number was not
+            # saved it stays dialing until expire_stale_calls frees it
+            logger.error(f"Error saving call {call.sid} to {number.phone_number}: {str(e)}")
+        else:
+            logger.info(f"Campaign {number.campaign_id} dialed {number.phone_number} with SID: {call.sid}")
+        return 1
+
+    def _record_failure(self, number, error, now):
+        logger.error(f"Error dialing {number.phone_number}: {str(error)}")
+        number.attempts += 1
+        number.error = str(error)
+        if number.attempts >= self.max_attempts:
+            number.status = 'failed'
+            number.next_attempt_at = None
+        else:
+            number.status = 'queued'
+            number.next_attempt_at = now + timedelta(seconds=self.retry_delay)
+
@@ -0,0 +1,194 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.template.loader import render_to_string
+from .api import OVERLAP, changed_calls, last_change
+from .stats import read_stats
+import asyncio
+import contextvars
+import json
+import logging
+import weakref
+
+logger = logging.getLogger(__name__)
+
+# Calls rendered per change; a larger burst tells dashboards to reload instead
+MAX_BATCH = 100
+# Milliseconds a browser waits before reconnecting
+RETRY_MS = 3000
+RESYNC = 'event: resync\ndata: {}\n\n'
+KEEPALIVE = ': keepalive\n\n'
+
+_feeds = weakref.WeakKeyDictionary()
+
+
+def format_event(event, data, event_id=None):
+    """One server-sent event carrying ``data`` as JSON"""
+    lines = [f"id: {event_id}"] if event_id else []
+    lines += [f"event: {event}", f"data: {json.dumps(data)}"]
+    return '\n'.join(lines) + '\n\n'
+
+
+def call_version(interview):
+    """When a call or any of its responses last changed"""
+    return max([interview.updated_at] + [response.updated_at for response in interview.response_list])
+
+
+def change_events(since, changed_at, sent=None):
+    """
+    Server-sent events for the calls that changed after ``since``.
+
+    Each call is rendered once as its dashboard card, oldest change first,
+    followed by the current statistics; events carry ``changed_at`` as their
+    id so a reconnecting browser resumes from it. ``sent`` maps call SIDs to
+    the version last sent and skips calls re-read through the overlap
+    without a new change. Returns None when too many calls changed to patch.
+    """
+    calls, more = changed_calls(limit=MAX_BATCH, updated_since=since)
+    if more:
+        return None
+    event_id = changed_at.isoformat()
+    events = []
+    for interview in reversed(calls):
+        if sent is not None:
+            version = call_version(interview)
+            if sent.get(interview.call_sid) == version:
+                continue
+            sent[interview.call_sid] = version
+        html = render_to_string('call/call_card.html', {'call': interview})
+        events.append(format_event('call', {'call_sid': interview.call_sid, 'html': html}, event_id))
+    if events:
+        events.append(format_event('stats', read_stats()))
+    return events
+
+
+def catch_up(since):
+    """Events for what changed after a reconnecting browser's Last-Event-ID"""
+    changed_at = last_change()
+    if changed_at is None or changed_at <= since:
+        return []
+    return change_events(since - OVERLAP, changed_at)
+
+
+class ChangeFeed:
+    """
+    Call and transcript changes, fanned out to the open dashboards of one event loop.
+
+    While anyone is subscribed a single task checks ``last_change()`` every
+    ``interval`` seconds. The webhooks and the flush_webhooks worker write
+    to the shared database from any process, so every worker sees every
+    change for the price of two index lookups a poll however many dashboards
+    it serves, and renders each change once for all of them. A subscriber
+    buffers at most ``queue_size`` events; one that falls further behind
+    has its backlog replaced by a single resync event.
+    """
+
+    def __init__(self, interval=None, queue_size=None):
+        self.interval = settings.LIVE_EVENTS_POLL_INTERVAL if interval is None else interval
+        self.queue_size = settings.LIVE_EVENTS_QUEUE_SIZE if queue_size is None else queue_size
+        self.subscribers = set()
+        self.task = None
+        self.sent = {}
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.add(queue)
+        if self.task is None:
+            # A fresh context, so the poll's queries are not counted against the request that started it
+            self.task = asyncio.create_task(self.run(), context=contextvars.Context())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+        if not self.subscribers and self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def publish(self, events):
+        for queue in list(self.subscribers):
+            for event in events:
+                try:
+                    queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    while not queue.empty():
+                        queue.get_nowait()
+                    queue.put_nowait(RESYNC)
+                    break
+
+    def start(self):
+        """
+        The last change so far, noting the versions of the calls in its overlap.
+
+        Open dashboards already show those, so only later changes to them are sent.
+        """
+        changed_at = last_change()
+        if changed_at:
+            calls, _ = changed_calls(limit=MAX_BATCH, updated_since=changed_at - OVERLAP)
+            self.sent = {interview.call_sid: call_version(interview) for interview in calls}
+        return changed_at
+
+    def poll(self, changed_at):
+        """Events for what changed since ``changed_at``, and the new last change"""
+        latest = last_change()
+        if latest is None or latest == changed_at:
+            return [], changed_at
+        since = changed_at - OVERLAP if changed_at else None
+        events = change_events(since, latest, self.sent)
+        if since:
+            # Calls last sent before the overlap are not re-read, so their versions are not needed
+            self.sent = {sid: version for sid, version in self.sent.items() if version > since}
+        return [RESYNC] if events is None else events, latest
+
+    async def run(self):
+        self.sent = {}
+        changed_at = await sync_to_async(self.start)()
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                events, changed_at = await sync_to_async(self.poll)(changed_at)
+            except Exception as e:
+                logger.error(f"Error polling for dashboard changes: {str(e)}")
+                continue
+            if events:
+                self.publish(events)
+
+
+def get_feed():
+    """Return the change feed of the running event loop, one per ASGI worker"""
+    loop = asyncio.get_running_loop()
+    feed = _feeds.get(loop)
+    if feed is None:
+        feed = _feeds[loop] = ChangeFeed()
+    return feed
+
+
+async def event_stream(feed, since=None, keepalive=None):
+    """
+    The server-sent events of one dashboard.
+
+    Catches up from ``since``, the browser's Last-Event-ID, then relays the
+    feed with a comment every ``keepalive`` seconds so proxies keep the
+    connection open. Ends after a resync, the browser reloads the page.
+    """
+    keepalive = settings.LIVE_EVENTS_KEEPALIVE if keepalive is None else keepalive
+    # Subscribe before catching up so nothing falls between the two
+    queue = feed.subscribe()
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        if since:
+            events = await sync_to_async(catch_up)(since)
+            if events is None:
+                yield RESYNC
+                return
+            for event in events:
+                yield event
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield KEEPALIVE
+                continue
+            yield event
+            if event == RESYNC:
+                return
+    finally:
+        feed.unsubscribe(queue)
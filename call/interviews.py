@@ -0,0 +1,74 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from . import stats
+from .models import Interview
+
+# Twilio call statuses that end a call, mapped to the outcome of the campaign number that placed it
+FINAL_CALL_STATUSES = {
+    'completed': 'completed',
+    'busy': 'failed',
+    'no-answer': 'failed',
+    'failed': 'failed',
+    'canceled': 'failed',
+}
+
+
+def start_interview(call_sid, phone_number, status=None, script_id=None):
+    """Create the interview for a call we just placed, asking the given script version"""
+    with transaction.atomic():
+        interview = Interview.objects.create(
+            call_sid=call_sid, phone_number=phone_number, status=status, script_id=script_id
+        )
+        stats.increment(total_calls=1, completed_calls=int(status == 'completed'))
+    return interview
+
+
+def answer_interview(call_sid, phone_number):
+    """Mark the interview in progress once the candidate picks up, creating it for calls placed elsewhere"""
+    now = timezone.now()
+    with transaction.atomic():
+        interview, created = Interview.objects.get_or_create(
+            call_sid=call_sid,
+            defaults={'phone_number': phone_number, 'status': 'in-progress', 'started_at': now}
+        )
+        if created:
+            stats.increment(total_calls=1)
+        else:
+            _set_status(call_sid, 'in-progress', started_at=now)
+    return interview
+
+
+def record_answer(call_sid):
+    """Count one more answered question on the interview"""
+    return Interview.objects.filter(call_sid=call_sid).update(
+        answered_questions=F('answered_questions') + 1, updated_at=timezone.now()
+    )
+
+
+def complete_interview(call_sid):
+    """Mark the interview completed after the last question"""
+    with transaction.atomic():
+        return _set_status(call_sid, 'completed', ended_at=timezone.now())
+
+
+def _set_status(call_sid, status, **fields):
+    """
+    Update an interview's status and keep the completed_calls counter in step.
+
+    The first UPDATE only matches when the status crosses the 'completed'
+    boundary, so its row count is exactly the counter delta; otherwise the
+    second UPDATE applies the change. Must run inside a transaction.
+    """
+    interviews = Interview.objects.filter(call_sid=call_sid)
+    fields.update(status=status, updated_at=timezone.now())
+    if status == 'completed':
+        crossed = interviews.exclude(status='completed').update(**fields)
+        delta = crossed
+    else:
+        crossed = interviews.filter(status='completed').update(**fields)
+        delta = -crossed
+    if crossed:
+        stats.increment(completed_calls=delta)
+        return crossed
+    return interviews.update(**fields)
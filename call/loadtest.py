@@ -0,0 +1,304 @@
+from aiohttp import ClientSession, TCPConnector
+from asgiref.sync import sync_to_async
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient
+from .benchmark import summarize
+from .models import Interview
+from .spool import flush_spool
+from .twiml import ERROR_MESSAGE
+import asyncio
+import random
+import re
+import threading
+import time
+
+RESPONSE_ID = re.compile(r'response_id=(\d+)')
+ACCOUNT_SID = 'AC' + '0' * 32
+
+# The endpoint a request or flush is running for; sync_to_async copies it into the view's thread
+_endpoint = ContextVar('loadtest_endpoint', default=None)
+
+
+class QueryCounter:
+    """
+    Counts SQL queries per endpoint across every thread views run on.
+
+    Installed as an execute wrapper on each connection opened while active,
+    it attributes a query to the endpoint in the calling context.
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        endpoint = _endpoint.get()
+        if endpoint:
+            with self.lock:
+                self.counts[endpoint] += 1
+        return execute(sql, params, many, context)
+
+    def install(self, sender=None, connection=None, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def install_open(self):
+        """Install on the connections already open in this thread"""
+        for connection in connections.all(initialized_only=True):
+            self.install(connection=connection)
+
+    def uninstall_open(self):
+        for connection in connections.all(initialized_only=True):
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+
+    @contextmanager
+    def active(self):
+        connection_created.connect(self.install)
+        self.install_open()
+        try:
+            yield self
+        finally:
+            connection_created.disconnect(self.install)
+            self.uninstall_open()
+
+
+class InProcessTransport:
+    """Posts straight into this process's ASGI stack, middleware included"""
+
+    places_calls = True
+
+    def __init__(self):
+        self.client = AsyncClient()
+
+    async def post(self, path, data):
+        response = await self.client.post(path, data)
+        return response.status_code, response.content.decode()
+
+    async def dial(self, phone_number):
+        """Place a call through /make-call/ as the dashboard does, returning the CallSid Twilio gave it"""
+        response = await self.client.post('/make-call/', {'phone_number': phone_number})
+        call_sid = await Interview.objects.filter(phone_number=phone_number).values_list('call_sid', flat=True).afirst()
+        return response.status_code, call_sid
+
+    async def close(self):
+        pass
+
+
+class HttpTransport:
+    """
+    Posts to a running deployment over keep-alive HTTP connections.
+
+    Its Twilio account would ring real phones, so calls are not placed and
+    each simulated call starts at its progress callbacks.
+    """
+
+    places_calls = False
+
+    def __init__(self, base_url, connections=100):
+        self.session = ClientSession(base_url=base_url.rstrip('/'), connector=TCPConnector(limit=connections))
+
+    async def post(self, path, data):
+        async with self.session.post(path, data=data) as response:
+            return response.status, await response.text()
+
+    async def close(self):
+        await self.session.close()
+
+
+class LoadTest:
+    """
+    Simulates concurrent interviews the way Twilio drives them.
+
+    Each call is placed through /make-call/ where the transport can, then
+    sends its progress callbacks, the answer webhook and one voice
+    webhook per recorded answer (after ``think_time`` seconds of speaking,
+    on average), the completed callback and finally the transcription
+    callbacks. At most ``concurrency`` calls are live at once. With
+    ``flush`` the queued status and transcription events are applied while
+    the test runs, as the flush_webhooks worker would.
+    """
+
+    def __init__(self, transport, calls=100, concurrency=20, think_time=1.0, transcripts=True, flush=True,
+                 flush_interval=0.5, seed=17):
+        self.transport = transport
+        self.calls = calls
+        self.concurrency = concurrency
+        self.think_time = think_time
+        self.transcripts = transcripts
+        self.flush = flush
+        self.flush_interval = flush_interval
+        self.rng = random.Random(seed)
+        self.samples = defaultdict(list)
+        self.errors = Counter()
+        self.completed_calls = 0
+        self.live_calls = 0
+        self.peak_live_calls = 0
+        self.flushed_events = 0
+
+    async def run(self, query_counter=None):
+        """Run every call and return the report"""
+        if query_counter is not None:
+            # Views run their queries in the thread sync_to_async keeps for them, whose connection may be open already
+            await sync_to_async(query_counter.install_open)()
+        done = asyncio.Event()
+        flusher = asyncio.create_task(self.flush_until(done)) if self.flush else None
+        started = time.perf_counter()
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def call(number):
+            async with slots:
+                await self.simulate_call(number)
+
+        try:
+            await asyncio.gather(*(call(number) for number in range(self.calls)))
+        finally:
+            wall = time.perf_counter() - started
+            done.set()
+            if flusher:
+                await flusher
+            if query_counter is not None:
+                await sync_to_async(query_counter.uninstall_open)()
+        return self.report(wall, query_counter)
+
+    async def flush_until(self, done):
+        flush = sync_to_async(flush_spool)
+        _endpoint.set('flush')
+        while True:
+            finished = done.is_set()
+            started = time.perf_counter()
+            flushed = await flush()
+            if flushed:
+                self.samples['flush'].append(time.perf_counter() - started)
+                self.flushed_events += flushed
+            if finished:
+                return
+            try:
+                await asyncio.wait_for(done.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def post(self, endpoint, path, data):
+        status, body = await self.request(endpoint, self.transport.post, path, data)
+        body = body or ''
+        failed = not status or status >= 400 or ERROR_MESSAGE in body
+        if failed:
+            self.errors[endpoint] += 1
+        return not failed, body
+
+    async def dial(self, phone_number):
+        if not self.transport.places_calls:
+            return True, f"CA{self.rng.getrandbits(128):032x}"
+        status, call_sid = await self.request('make_call', self.transport.dial, phone_number)
+        if not status or status >= 400 or not call_sid:
+            self.errors['make_call'] += 1
+            return False, None
+        return True, call_sid
+
+    async def request(self, endpoint, send, *args):
+        token = _endpoint.set(endpoint)
+        started = time.perf_counter()
+        try:
+            return await send(*args)
+        except Exception:
+            return 0, None
+        finally:
+            self.samples[endpoint].append(time.perf_counter() - started)
+            _endpoint.reset(token)
+
+    async def think(self):
+        if self.think_time:
+            await asyncio.sleep(self.rng.uniform(0.5, 1.5) * self.think_time)
+
+    async def simulate_call(self, number):
+        self.live_calls += 1
+        self.peak_live_calls = max(self.peak_live_calls, self.live_calls)
+        try:
+            ok = await self.interview(number)
+        finally:
+            self.live_calls -= 1
+        if ok:
+            self.completed_calls += 1
+
+    async def interview(self, number):
+        phone_number = f"+9190{number:08d}"
+        dialed, call_sid = await self.dial(phone_number)
+        if not dialed:
+            return False
+        call = {
+            'AccountSid': ACCOUNT_SID, 'ApiVersion': '2010-04-01', 'CallSid': call_sid, 'Direction': 'outbound-api',
+            'From': '+14155550100', 'To': phone_number, 'Called': phone_number, 'Caller': '+14155550100',
+            'CallerCountry': 'US', 'CalledCountry': 'IN',
+        }
+        results = []
+        for sequence, call_status in enumerate(['initiated', 'ringing']):
+            results.append((await self.post('call_status', '/call_status/', dict(
+                call, CallStatus=call_status, SequenceNumber=str(sequence), CallbackSource='call-progress-events'
+            )))[0])
+
+        ok, body = await self.post('answer', '/answer/', dict(call, CallStatus='in-progress'))
+        results.append(ok)
+        results.append((await self.post('call_status', '/call_status/', dict(
+            call, CallStatus='in-progress', SequenceNumber='2', CallbackSource='call-progress-events'
+        )))[0])
+
+        recordings = []
+        while match := RESPONSE_ID.search(body):
+            await self.think()
+            recording_sid = f"RE{self.rng.getrandbits(128):032x}"
+            recording_url = f"https://api.twilio.com/2010-04-01/Accounts/{ACCOUNT_SID}/Recordings/{recording_sid}"
+            recordings.append((recording_sid, recording_url))
+            ok, body = await self.post('voice', f"/voice/?response_id={match.group(1)}", dict(
+                call, CallStatus='in-progress', RecordingSid=recording_sid, RecordingUrl=recording_url,
+                RecordingDuration=str(self.rng.randint(3, 30)), Digits=''
+            ))
+            results.append(ok)
+
+        results.append((await self.post('call_status', '/call_status/', dict(
+            call, CallStatus='completed', SequenceNumber='3', CallDuration=str(self.rng.randint(30, 180)),
+            CallbackSource='call-progress-events'
+        )))[0])
+
+        if self.transcripts:
+            # Transcripts arrive a while after the call ends
+            await self.think()
+            for index, (recording_sid, recording_url) in enumerate(recordings):
+                results.append((await self.post('transcription', '/transcription/', dict(
+                    call, RecordingSid=recording_sid, RecordingUrl=recording_url,
+                    TranscriptionSid=f"TR{recording_sid[2:]}", TranscriptionStatus='completed',
+                    TranscriptionText=f"Simulated answer {index + 1} for call {number}"
+                )))[0])
+        return all(results) and bool(recordings)
+
+    def report(self, wall, query_counter=None):
+        requests = sum(len(samples) for endpoint, samples in self.samples.items() if endpoint != 'flush')
+        endpoints = {}
+        for endpoint, samples in sorted(self.samples.items()):
+            stats = summarize(samples)
+            stats['errors'] = self.errors[endpoint]
+            stats['error_rate'] = round(self.errors[endpoint] / len(samples), 4)
+            if query_counter is not None:
+                stats['queries'] = query_counter.counts[endpoint]
+                stats['queries_per_request'] = round(query_counter.counts[endpoint] / len(samples), 2)
+            endpoints[endpoint] = stats
+        return {
+            'config': {
+                'calls': self.calls, 'concurrency': self.concurrency, 'think_time': self.think_time,
+                'transcripts': self.transcripts,
+            },
+            'wall_s': round(wall, 3),
+            'requests': requests,
+            'requests_per_second': round(requests / wall, 1) if wall else None,
+            'calls': {
+                'completed': self.completed_calls,
+                'failed': self.calls - self.completed_calls,
+                'peak_live': self.peak_live_calls,
+            },
+            'errors': sum(count for endpoint, count in self.errors.items()),
+            'flushed_events': self.flushed_events,
+            'endpoints': endpoints,
+        }
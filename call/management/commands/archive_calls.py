@@ -0,0 +1,56 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.utils import timezone
+from call.archive import archivable, archive_before, orphaned
+import signal
+
+
+class Command(BaseCommand):
+    help = ('Move interviews older than ARCHIVE_AFTER_DAYS, with their responses, and responses of that age '
+            'without an interview from the database to compressed Parquet files under ARCHIVE_ROOT, '
+            'partitioned by month')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=None,
+                            help='Archive interviews created more than this many days ago (default ARCHIVE_AFTER_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Interviews moved per transaction')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how much would be archived')
+
+    def handle(self, *args, **options):
+        days = settings.ARCHIVE_AFTER_DAYS if options['older_than_days'] is None else options['older_than_days']
+        if days < 1:
+            raise CommandError('--older-than-days must be at least 1')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        cutoff = timezone.now() - timedelta(days=days)
+
+        if options['dry_run']:
+            counts = archivable(cutoff).aggregate(calls=Count('id', distinct=True), responses=Count('responses'))
+            responses = counts['responses'] + orphaned(cutoff).count()
+            self.stdout.write(
+                f"Would archive {counts['calls']} calls and {responses} responses created before "
+                f"{cutoff:%Y-%m-%d %H:%M}"
+            )
+            return
+
+        # Finish the current batch before exiting on SIGTERM/SIGINT
+        self.running = True
+        def stop(signum, frame):
+            self.running = False
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        total_calls = total_responses = total_bytes = 0
+        for calls, responses, written in archive_before(cutoff, options['batch_size'], running=lambda: self.running):
+            total_calls += calls
+            total_responses += responses
+            total_bytes += written
+            self.stdout.write(f"Archived {calls} calls and {responses} responses ({written} bytes)")
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {total_calls} calls and {total_responses} responses created before {cutoff:%Y-%m-%d %H:%M} "
+            f"into {total_bytes} bytes under {settings.ARCHIVE_ROOT}"
+        ))
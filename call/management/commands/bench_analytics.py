@@ -0,0 +1,60 @@
+from datetime import timedelta
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from call.analytics import compute_analytics, get_analytics
+from call.benchmark import format_summary, summarize, test_database, timed
+from call.models import CallResponse, Interview
+import random
+
+
+class Command(BaseCommand):
+    help = 'Time computing the analytics reports from scratch against serving them from the cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=20000, help='Synthetic calls, with up to four responses each')
+        parser.add_argument('--iterations', type=int, default=5, help='Reports computed from scratch')
+        parser.add_argument('--views', type=int, default=1000, help='Cached report views')
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        with test_database():
+            now = timezone.now()
+            Interview.objects.bulk_create(
+                Interview(
+                    call_sid=f"CA{index:032d}",
+                    phone_number='+919876543210',
+                    status=rng.choice(['completed', 'completed', 'no-answer', 'busy']),
+                    answered_questions=rng.randrange(5),
+                    created_at=now - timedelta(minutes=index * 7),
+                )
+                for index in range(options['calls'])
+            )
+            CallResponse.objects.bulk_create(
+                CallResponse(
+                    interview_id=interview_id,
+                    phone_number='+919876543210',
+                    question=f"Question {question}",
+                    recording_sid=f"RE{interview_id:012d}{question}",
+                    recording_duration=rng.randrange(5, 60),
+                    transcript_status=rng.choice(['completed', 'completed', 'pending', 'failed']),
+                    created_at=now,
+                )
+                for interview_id, answered in Interview.objects.values_list('id', 'answered_questions')
+                for question in range(answered)
+            )
+
+            cache.clear()
+            results = [
+                ('computed from scratch', summarize(timed(compute_analytics, options['iterations']))),
+                ('cached', summarize(timed(get_analytics, options['views']))),
+            ]
+            cache.clear()
+
+        for label, summary in results:
+            self.stdout.write(format_summary(label, summary))
+        before, after = results[0][1], results[1][1]
+        self.stdout.write(self.style.SUCCESS(
+            f"A cached view is {before['mean_ms'] / after['mean_ms']:.0f}x faster than computing the reports "
+            f"over {options['calls']} calls, including the first view that fills the cache"
+        ))
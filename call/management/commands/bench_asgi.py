@@ -0,0 +1,95 @@
+from asgiref.sync import async_to_sync
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client as TestClient
+from django.test.utils import override_settings
+from call.benchmark import format_summary, summarize, test_database
+from call.models import Interview
+from call.twilio_client import close_async_client, reset_client
+from call.twilio_stub import StubTwilioServer
+import asyncio
+import re
+import time
+
+RESPONSE_ID = re.compile(r'response_id=(\d+)')
+
+
+class Command(BaseCommand):
+    help = 'Compare how many interviews one WSGI and one ASGI process keep in flight against a slow Twilio API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interviews', type=int, default=100, help='Interviews to run through each stack')
+        parser.add_argument('--latency', type=float, default=0.2, help='Seconds the stub Twilio API takes per request')
+        parser.add_argument('--threads', type=int, default=1,
+                            help='Request threads of the WSGI process, as gunicorn --threads')
+        parser.add_argument('--pool-size', type=int, default=None,
+                            help='Twilio connections per process, defaults to TWILIO_HTTP_POOL_SIZE')
+
+    def handle(self, *args, **options):
+        pool_size = options['pool_size'] or settings.TWILIO_HTTP_POOL_SIZE
+        with test_database(), override_settings(
+            TWILIO_ACCOUNT_SID='AC' + '0' * 32, TWILIO_AUTH_TOKEN='benchmark', PUBLIC_URL='https://hr.example.com',
+            TWILIO_HTTP_POOL_SIZE=pool_size
+        ):
+            results = [
+                self.run_stack('WSGI', self.run_wsgi, options),
+                self.run_stack('ASGI', async_to_sync(self.run_asgi), options),
+            ]
+
+        for label, wall, samples, peak in results:
+            self.stdout.write(format_summary(f"{label} make_call", summarize(samples)))
+            self.stdout.write(
+                f"{label}: {options['interviews']} interviews in {wall:.2f}s "
+                f"({options['interviews'] / wall:.1f}/s), peak in-flight Twilio requests: {peak}"
+            )
+
+    def run_stack(self, label, run, options):
+        samples = []
+        with StubTwilioServer(latency=options['latency']) as stub, override_settings(TWILIO_API_BASE_URL=stub.url):
+            reset_client()
+            started = time.perf_counter()
+            run(label, samples, options)
+            wall = time.perf_counter() - started
+            reset_client()
+        return label, wall, samples, stub.peak_in_flight
+
+    def run_wsgi(self, label, samples, options):
+        def interview(number):
+            client = TestClient()
+            phone_number = f"+9170{number:08d}"
+            started = time.perf_counter()
+            client.post('/make-call/', {'phone_number': phone_number})
+            samples.append(time.perf_counter() - started)
+
+            call_sid = Interview.objects.get(phone_number=phone_number).call_sid
+            response = client.post('/answer/', {'CallSid': call_sid, 'To': phone_number})
+            while match := RESPONSE_ID.search(response.content.decode()):
+                response = client.post(f"/voice/?response_id={match.group(1)}", {
+                    'CallSid': call_sid, 'To': phone_number, 'RecordingSid': f"RE{call_sid[2:]}{match.group(1)}"
+                })
+
+        # Like a gunicorn worker, the process serves --threads requests at a time
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            list(executor.map(interview, range(options['interviews'])))
+
+    async def run_asgi(self, label, samples, options):
+        async def interview(number):
+            client = AsyncClient()
+            phone_number = f"+9180{number:08d}"
+            started = time.perf_counter()
+            await client.post('/make-call/', {'phone_number': phone_number})
+            samples.append(time.perf_counter() - started)
+
+            call_sid = (await Interview.objects.aget(phone_number=phone_number)).call_sid
+            response = await client.post('/answer/', {'CallSid': call_sid, 'To': phone_number})
+            while match := RESPONSE_ID.search(response.content.decode()):
+                response = await client.post(f"/voice/?response_id={match.group(1)}", {
+                    'CallSid': call_sid, 'To': phone_number, 'RecordingSid': f"RE{call_sid[2:]}{match.group(1)}"
+                })
+
+        # One event loop serves every interview at once
+        try:
+            await asyncio.gather(*(interview(number) for number in range(options['interviews'])))
+        finally:
+            await close_async_client()
@@ -0,0 +1,157 @@
+from contextlib import contextmanager
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client as TestClient
+from django.test.utils import override_settings
+from call.benchmark import format_summary, summarize, test_database
+from call.spool import flush_spool
+from hr_team.database import database_config
+from pathlib import Path
+import logging
+import re
+import tempfile
+import threading
+import time
+
+RESPONSE_ID = re.compile(r'response_id=(\d+)')
+
+
+class ErrorCounter(logging.Handler):
+    """Counts the errors the webhook views log and swallow, such as "database is locked" """
+
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.count = 0
+
+    def emit(self, record):
+        # Handler.handle holds the handler's lock around emit
+        self.count += 1
+
+
+@contextmanager
+def use_database(config):
+    """Point the default alias at ``config`` for every thread opening a connection inside the block"""
+    settings_dict = connections.settings['default']
+    original = dict(settings_dict)
+    connections.close_all()
+    settings_dict.clear()
+    settings_dict.update(original)
+    settings_dict.update(config, TEST=dict(original['TEST'], **config.get('TEST', {})))
+    try:
+        yield
+    finally:
+        connections.close_all()
+        settings_dict.clear()
+        settings_dict.update(original)
+
+
+class Command(BaseCommand):
+    help = 'Compare write contention of SQLite journaling modes (and optionally Postgres) under concurrent webhooks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interviews', type=int, default=200, help='Interviews to run per database mode')
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent webhook threads, as gunicorn workers')
+        parser.add_argument('--postgres-url', default=None,
+                            help='Also benchmark this Postgres server; a throwaway test database is created on it')
+        parser.add_argument('--pool', action='store_true', help='Use the connection pool for --postgres-url')
+
+    def handle(self, *args, **options):
+        errors = ErrorCounter()
+        logging.getLogger('call').addHandler(errors)
+        try:
+            with tempfile.TemporaryDirectory() as directory, override_settings(PUBLIC_URL='https://hr.example.com'):
+                for label, config in self.modes(Path(directory), options):
+                    errors.count = 0
+                    with use_database(config), test_database():
+                        wall, samples, flushed = self.run_workload(options)
+                    self.stdout.write(format_summary(label, summarize(samples)))
+                    self.stdout.write(
+                        f"{label}: {len(samples)} webhooks in {wall:.2f}s ({len(samples) / wall:.0f}/s), "
+                        f"{errors.count} errors, {flushed} queued events applied"
+                    )
+        finally:
+            logging.getLogger('call').removeHandler(errors)
+
+    def modes(self, directory, options):
+        # SQLite defaults: rollback journal, deferred transactions, no pragmas
+        yield 'sqlite rollback journal', {
+            'ENGINE': 'django.db.backends.sqlite3', 'NAME': str(directory / 'rollback.sqlite3'),
+            'OPTIONS': {}, 'PRAGMAS': {}, 'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False,
+            'TEST': {'NAME': str(directory / 'rollback.sqlite3')},
+        }
+        wal = database_config(f"sqlite:///{directory / 'wal.sqlite3'}")
+        yield 'sqlite WAL', dict(wal, TEST={'NAME': wal['NAME']})
+        if options['postgres_url']:
+            label = 'postgres pooled' if options['pool'] else 'postgres'
+            yield label, database_config(options['postgres_url'], pool=options['pool'])
+
+    def run_workload(self, options):
+        """Run the interviews on --threads threads while a flusher applies queued status and transcription events"""
+        samples, lock, done = [], threading.Lock(), threading.Event()
+        numbers = iter(range(options['interviews']))
+        flushed = 0
+
+        def post(client, url, data):
+            started = time.perf_counter()
+            response = client.post(url, data)
+            with lock:
+                samples.append(time.perf_counter() - started)
+            return response
+
+        def interviews():
+            client = TestClient(raise_request_exception=False)
+            try:
+                while True:
+                    with lock:
+                        number = next(numbers, None)
+                    if number is None:
+                        return
+                    self.interview(post, client, number)
+            finally:
+                connections.close_all()
+
+        def flusher():
+            nonlocal flushed
+            try:
+                while not done.is_set():
+                    try:
+                        flushed += flush_spool()
+                    except Exception as e:
+                        logging.getLogger('call').error(f"Error flushing webhooks: {str(e)}")
+                    time.sleep(0.05)
+                flushed += flush_spool()
+            finally:
+                connections.close_all()
+
+        flush_thread = threading.Thread(target=flusher)
+        threads = [threading.Thread(target=interviews) for _ in range(options['threads'])]
+        started = time.perf_counter()
+        flush_thread.start()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        done.set()
+        flush_thread.join()
+        return time.perf_counter() - started, samples, flushed
+
+    def interview(self, post, client, number):
+        """One interview's webhooks, in the order Twilio sends them"""
+        call_sid, phone_number = f"CA{number:032x}", f"+9170{number:08d}"
+        for sequence, call_status in enumerate(['ringing', 'in-progress']):
+            post(client, '/call_status/', {'CallSid': call_sid, 'CallStatus': call_status, 'SequenceNumber': sequence})
+        response = post(client, '/answer/', {'CallSid': call_sid, 'To': phone_number})
+        recordings = []
+        while match := RESPONSE_ID.search(response.content.decode()):
+            recording_sid = f"RE{number:026x}{len(recordings):06d}"
+            recordings.append(recording_sid)
+            response = post(client, f"/voice/?response_id={match.group(1)}", {
+                'CallSid': call_sid, 'To': phone_number, 'RecordingSid': recording_sid, 'RecordingDuration': '5'
+            })
+        post(client, '/call_status/', {
+            'CallSid': call_sid, 'CallStatus': 'completed', 'CallDuration': '60', 'SequenceNumber': 2
+        })
+        for recording_sid in recordings:
+            post(client, '/transcription/', {
+                'CallSid': call_sid, 'RecordingSid': recording_sid, 'TranscriptionText': 'Answer'
+            })
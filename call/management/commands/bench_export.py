@@ -0,0 +1,79 @@
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client as TestClient
+from django.utils import timezone
+from call.benchmark import test_database
+from call.models import CallResponse, Interview
+from datetime import timedelta
+import time
+import tracemalloc
+
+
+class Command(BaseCommand):
+    help = 'Measure time and peak Python memory of the streaming exports through the WSGI and ASGI handlers as the table grows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000], help='Table sizes to measure')
+        parser.add_argument('--formats', nargs='+', choices=['csv', 'xlsx'], default=['csv', 'xlsx'], help='Exports to measure')
+        parser.add_argument('--handlers', nargs='+', choices=['wsgi', 'asgi'], default=['wsgi', 'asgi'], help='Request handlers to measure through')
+
+    def handle(self, *args, **options):
+        urls = {'csv': '/export-csv/', 'xlsx': '/export-excel/'}
+        handlers = {'wsgi': self.get_wsgi, 'asgi': async_to_sync(self.get_asgi)}
+        with test_database():
+            created = 0
+            for rows in sorted(options['rows']):
+                self.populate(created, rows)
+                created = rows
+                for name in options['formats']:
+                    for handler in options['handlers']:
+                        tracemalloc.start()
+                        started = time.perf_counter()
+                        size = handlers[handler](urls[name])
+                        elapsed = time.perf_counter() - started
+                        _, peak = tracemalloc.get_traced_memory()
+                        tracemalloc.stop()
+                        self.stdout.write(
+                            f"{name:<5} {handler} rows={rows:<9} time={elapsed:8.2f}s "
+                            f"size={size / 2**20:8.1f}MiB peak={peak / 2**20:6.1f}MiB"
+                        )
+
+    def get_wsgi(self, url):
+        return sum(len(chunk) for chunk in TestClient().get(url).streaming_content)
+
+    async def get_asgi(self, url):
+        # Read the response as the ASGI handler sends it, a sync iterator would be buffered whole first
+        response = await AsyncClient().get(url)
+        size = 0
+        async for chunk in response:
+            size += len(chunk)
+        return size
+
+    def populate(self, start, end, batch_size=5000):
+        now = timezone.now()
+        for offset in range(start, end, batch_size):
+            indexes = range(offset, min(offset + batch_size, end))
+            interviews = Interview.objects.bulk_create(
+                Interview(
+                    call_sid=f"CA{index // 4:032x}",
+                    phone_number='+919876543210',
+                    status='completed',
+                    answered_questions=4,
+                    created_at=now - timedelta(seconds=index)
+                )
+                for index in indexes if index % 4 == 0
+            )
+            interview_ids = {interview.call_sid: interview.id for interview in interviews}
+            CallResponse.objects.bulk_create(
+                CallResponse(
+                    interview_id=interview_ids.get(f"CA{index // 4:032x}"),
+                    phone_number='+919876543210',
+                    call_sid=f"CA{index // 4:032x}",
+                    question=f"Question {index % 4}",
+                    transcript='I have five years of experience in customer support and team leadership.',
+                    transcript_status='completed',
+                    recording_duration=12,
+                    created_at=now - timedelta(seconds=index)
+                )
+                for index in indexes
+            )
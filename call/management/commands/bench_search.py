@@ -0,0 +1,78 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from call.benchmark import format_summary, summarize, test_database, timed
+from call.models import CallResponse
+from call.search import parse_search_cursor, search_responses
+from itertools import accumulate
+import random
+import time
+
+BATCH_SIZE = 10000
+WORDS_PER_TRANSCRIPT = 30
+# Words planted at a known share of transcripts, from rare to common
+NEEDLES = {'kubernetes': 0.001, 'python': 0.01, 'leadership': 0.1}
+QUERIES = ['kubernetes', 'python', 'leadership', 'python leadership']
+
+
+def vocabulary(rng, size=5000):
+    """Pronounceable made-up words, so matches only come from the planted needles"""
+    syllables = [consonant + vowel for consonant in 'bdfgklmnprstvz' for vowel in 'aeiou']
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choices(syllables, k=rng.randint(2, 4))))
+    return sorted(words)
+
+
+class Command(BaseCommand):
+    help = 'Time ranked transcript search over a synthetic corpus against a LIKE scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--responses', type=int, default=1000000, help='Transcripts to index')
+        parser.add_argument('--iterations', type=int, default=50, help='Searches per query')
+        parser.add_argument('--page-size', type=int, default=20, help='Results per page')
+
+    def handle(self, *args, **options):
+        with test_database():
+            started = time.perf_counter()
+            self.populate(options['responses'])
+            self.stdout.write(f"Indexed {options['responses']} transcripts in {time.perf_counter() - started:.1f}s")
+
+            page_size = options['page_size']
+            for query in QUERIES:
+                results, next_cursor = search_responses(query, limit=page_size)
+                samples = timed(lambda: search_responses(query, limit=page_size), options['iterations'])
+                self.stdout.write(format_summary(f"search {query!r}", summarize(samples)))
+                if next_cursor:
+                    cursor = parse_search_cursor(next_cursor)
+                    samples = timed(lambda: search_responses(query, limit=page_size, cursor=cursor), options['iterations'])
+                    self.stdout.write(format_summary('  page 2', summarize(samples)))
+
+            # Without the index a search is a substring scan, which reads every transcript when nothing matches
+            for word in ['kubernetes', 'recruiter']:
+                samples = timed(lambda: list(CallResponse.objects.filter(transcript__icontains=word)[:page_size]), 3)
+                self.stdout.write(format_summary(f"LIKE scan {word!r}", summarize(samples)))
+
+    def populate(self, count):
+        rng = random.Random(16)
+        words = vocabulary(rng)
+        # Zipf-like word frequencies, as in natural language
+        cum_weights = list(accumulate(1 / rank for rank in range(1, len(words) + 1)))
+        now = timezone.now()
+        batch = []
+        for index in range(count):
+            transcript = rng.choices(words, cum_weights=cum_weights, k=WORDS_PER_TRANSCRIPT)
+            for needle, share in NEEDLES.items():
+                if rng.random() < share:
+                    transcript[rng.randrange(WORDS_PER_TRANSCRIPT)] = needle
+            batch.append(CallResponse(
+                call_sid=f"CA{index // 4:032x}",
+                phone_number='+919876543210',
+                question=f"Question {index % 4 + 1}",
+                transcript=' '.join(transcript),
+                transcript_status='completed',
+                created_at=now
+            ))
+            if len(batch) >= BATCH_SIZE:
+                CallResponse.objects.bulk_create(batch)
+                batch = []
+        CallResponse.objects.bulk_create(batch)
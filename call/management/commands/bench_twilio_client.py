@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from twilio.rest import Client
+from call.benchmark import format_summary, summarize, timed
+from call.twilio_client import PooledTwilioHttpClient, get_client, reset_client
+from call.twilio_stub import StubTwilioServer
+
+ACCOUNT_SID = 'AC' + '0' * 32
+AUTH_TOKEN = 'benchmark'
+CALL_SID = 'CA' + '0' * 32
+
+
+class Command(BaseCommand):
+    help = 'Compare per-request Twilio clients with the shared pooled client against a local stub server'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Calls per variant')
+        parser.add_argument('--latency', type=float, default=0.0, help='Artificial stub latency in seconds')
+
+    def handle(self, *args, **options):
+        with StubTwilioServer(latency=options['latency']) as stub:
+            self.stdout.write(f"Stub Twilio API at {stub.url}, {options['requests']} calls.fetch() per variant")
+
+            # What the views used to do: a new Client, session and connection per request
+            def per_request():
+                client = Client(ACCOUNT_SID, AUTH_TOKEN, http_client=PooledTwilioHttpClient(base_url=stub.url))
+                client.calls(CALL_SID).fetch()
+                client.http_client.session.close()
+
+            connections_before = stub.connections
+            per_request_samples = timed(per_request, options['requests'])
+            per_request_connections = stub.connections - connections_before
+
+            # The shared client reuses one keep-alive connection
+            with override_settings(TWILIO_ACCOUNT_SID=ACCOUNT_SID, TWILIO_AUTH_TOKEN=AUTH_TOKEN, TWILIO_API_BASE_URL=stub.url):
+                reset_client()
+                connections_before = stub.connections
+                pooled_samples = timed(lambda: get_client().calls(CALL_SID).fetch(), options['requests'])
+                pooled_connections = stub.connections - connections_before
+                reset_client()
+
+        per_request_summary = summarize(per_request_samples)
+        pooled_summary = summarize(pooled_samples)
+        self.stdout.write(format_summary('Client() per request', per_request_summary) + f" connections={per_request_connections}")
+        self.stdout.write(format_summary('shared pooled client', pooled_summary) + f" connections={pooled_connections}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Pooled client is {per_request_summary['mean_ms'] / pooled_summary['mean_ms']:.1f}x faster per call "
+            f"(plain HTTP stub, so real TLS handshakes widen the gap further)"
+        ))
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from call.benchmark import format_summary, summarize, test_database, timed
+from call.models import InterviewScript
+from call.scripts import publish_script
+from call.telephony import TwilioProvider, reset_provider
+from call.twiml import build_question_twiml, invalidate_script, question_twiml
+
+QUESTIONS = [f"Question {index}: tell us about a project you are proud of." for index in range(8)]
+
+
+class Command(BaseCommand):
+    help = 'Compare building the TwiML of every webhook from scratch with serving compiled script fragments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000, help='TwiML responses per variant')
+
+    def handle(self, *args, **options):
+        requests = options['requests']
+        with test_database(), override_settings(
+            PUBLIC_URL='https://hr.example.com', TELEPHONY_PROVIDER='call.telephony.TwilioProvider'
+        ):
+            reset_provider()
+            script = publish_script('Benchmark', QUESTIONS, voice='Polly.Joanna', max_length=60)
+            provider = TwilioProvider()
+
+            def responses():
+                for number in range(requests):
+                    yield number % len(QUESTIONS), number
+
+            # Before: a VoiceResponse built for every webhook from the script settings
+            built = iter(responses())
+            def build():
+                index, response_id = next(built)
+                build_question_twiml(script.questions[index], response_id, provider=provider, script=script)
+
+            # A script table without a cache would also read the row on every webhook
+            read = iter(responses())
+            def read_and_build():
+                index, response_id = next(read)
+                row = InterviewScript.objects.get(id=script.id)
+                build_question_twiml(row.questions[index], response_id, provider=provider, script=row)
+
+            # After: the version's fragments are compiled once and the response id is swapped in
+            invalidate_script(script.id)
+            served = iter(responses())
+            def serve():
+                index, response_id = next(served)
+                question_twiml(index, response_id, script.id)
+
+            results = [
+                ('VoiceResponse per webhook', summarize(timed(build, requests))),
+                ('script row + VoiceResponse', summarize(timed(read_and_build, requests))),
+                ('compiled script', summarize(timed(serve, requests))),
+            ]
+            reset_provider()
+
+        for label, summary in results:
+            self.stdout.write(format_summary(label, summary))
+        before, after = results[0][1], results[-1][1]
+        self.stdout.write(self.style.SUCCESS(
+            f"Compiled fragments are {before['mean_ms'] / after['mean_ms']:.0f}x faster per webhook than "
+            f"building the TwiML, including the one-time compile and row read in the first sample"
+        ))
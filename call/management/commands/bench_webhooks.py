@@ -0,0 +1,68 @@
+from collections import defaultdict
+from django.core.management.base import BaseCommand
+from django.test import Client as TestClient
+from django.test.utils import override_settings
+from call.benchmark import format_summary, summarize, test_database
+from call.twilio_client import reset_client
+from call.twilio_stub import StubTwilioServer
+from pathlib import Path
+import json
+import re
+import time
+
+PAYLOADS = Path(__file__).resolve().parents[2] / 'testdata' / 'webhook_payloads.json'
+TARGET_MS = 10
+
+
+class Command(BaseCommand):
+    help = 'Replay recorded Twilio webhook payloads and report server time per webhook'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=200, help='Interviews to replay')
+        parser.add_argument('--payloads', default=str(PAYLOADS), help='JSON file of recorded webhook requests')
+
+    def handle(self, *args, **options):
+        with open(options['payloads']) as f:
+            events = json.load(f)
+
+        samples = defaultdict(list)
+        # Any outbound Twilio request would show up on the stub
+        with StubTwilioServer() as stub, test_database(), override_settings(
+            TWILIO_ACCOUNT_SID='AC' + '0' * 32, TWILIO_AUTH_TOKEN='benchmark', TWILIO_API_BASE_URL=stub.url
+        ):
+            reset_client()
+            for number in range(options['calls']):
+                self.replay_call(events, f"CA{number:032x}", samples)
+            reset_client()
+
+        for path, path_samples in samples.items():
+            self.stdout.write(format_summary(path, summarize(path_samples)))
+        overall = summarize([sample for path_samples in samples.values() for sample in path_samples])
+        self.stdout.write(format_summary('all webhooks', overall))
+        self.stdout.write(f"Outbound Twilio API requests: {stub.requests}")
+
+        if overall['p95_ms'] < TARGET_MS and stub.requests == 0:
+            self.stdout.write(self.style.SUCCESS(f"p95 under the {TARGET_MS}ms target with no outbound API calls"))
+        else:
+            self.stdout.write(self.style.WARNING(f"Missed the {TARGET_MS}ms / zero outbound call target"))
+
+    def replay_call(self, events, call_sid, samples):
+        """Replay one interview; each call gets its own cookie jar, like a Twilio call leg"""
+        client = TestClient()
+        response_id = ''
+        for event in events:
+            data = dict(event['data'], CallSid=call_sid)
+            if 'RecordingSid' in data:
+                data['RecordingSid'] = 'RE' + call_sid[-26:] + data['RecordingSid'][-6:]
+            url = event['path']
+            if event['query']:
+                url += '?' + event['query'].format(response_id=response_id)
+
+            started = time.perf_counter()
+            response = client.post(url, data)
+            samples[event['path']].append(time.perf_counter() - started)
+
+            # Follow the <Record action> to the next webhook, as Twilio would
+            match = re.search(r'response_id=(\d+)', response.content.decode())
+            if match:
+                response_id = match.group(1)
@@ -0,0 +1,35 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from call.models import CallResponse
+from call.recordings import RecordingCache, prefetch_recordings
+from call.telephony import get_provider
+
+
+class Command(BaseCommand):
+    help = 'Download recent recordings into the local recording cache so the dashboard plays them without waiting on the provider'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=24, help='Cache recordings of responses from the last HOURS')
+        parser.add_argument('--limit', type=int, default=500, help='Newest recordings to cache at most')
+        parser.add_argument('--workers', type=int, default=4, help='Concurrent downloads')
+
+    def handle(self, *args, **options):
+        # Check if the provider, e.g. its Twilio credentials, is configured
+        error = get_provider().configuration_error()
+        if error:
+            self.stdout.write(self.style.ERROR(error))
+            return
+
+        since = timezone.now() - timedelta(hours=options['hours'])
+        recording_sids = list(
+            CallResponse.objects
+            .filter(created_at__gte=since, recording_sid__isnull=False)
+            .order_by('-created_at')
+            .values_list('recording_sid', flat=True)[:options['limit']]
+        )
+        cache = RecordingCache()
+        fetched = prefetch_recordings(recording_sids, cache=cache, workers=options['workers'])
+        self.stdout.write(
+            self.style.SUCCESS(f"Cached {fetched} new recordings ({len(recording_sids)} recent) in {cache.directory}")
+        )
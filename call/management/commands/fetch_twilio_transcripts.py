@@ -1,14 +1,32 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
-from twilio.rest import Client
-from call.models import CallResponse
-from datetime import datetime, timedelta
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from call.twilio_client import get_client
+from call.twilio_import import import_since
+from datetime import datetime, time
 import logging
 
 logger = logging.getLogger(__name__)
 
 class Command(BaseCommand):
-    help = 'Fetch transcripts from Twilio and save them to the database'
+    help = 'Fetch calls, recordings and transcripts from Twilio created since the last run and save them to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='ISO date or datetime to import from, instead of the last run (default: 30 days ago)')
+        parser.add_argument('--workers', type=int, default=8, help='Maximum concurrent transcript requests')
+        parser.add_argument('--batch-size', type=int, default=200, help='Rows per bulk write')
+        parser.add_argument('--dry-run', action='store_true', help='Fetch and report without writing anything')
+
+    def parse_since(self, value):
+        if value is None:
+            return None
+        since = parse_datetime(value)
+        if since is None and (day := parse_date(value)):
+            since = datetime.combine(day, time.min)
+        if since is None:
+            raise CommandError(f"Invalid --since value: {value}")
+        return timezone.make_aware(since) if timezone.is_naive(since) else since
 
     def handle(self, *args, **options):
         try:
@@ -17,64 +35,26 @@ class Command(BaseCommand):
                 self.stdout.write(self.style.ERROR('Twilio credentials not found in settings'))
                 return
 
-            # Initialize Twilio client
-            client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-            
-            # Get calls from the last 30 days
-            start_date = datetime.utcnow() - timedelta(days=30)
-            calls = client.calls.list(start_time_after=start_date)
-            
-            self.stdout.write(f"Found {len(calls)} calls in the last 30 days")
-            
-            for call in calls:
-                try:
-                    # Get call details
-                    call_details = client.calls(call.sid).fetch()
-                    phone_number = call_details.to
-                    
-                    # Get recordings for this call
-                    recordings = client.recordings.list(call_sid=call.sid)
-                    
-                    for recording in recordings:
-                        try:
-                            # Get transcript for this recording
-                            transcript = None
-                            transcript_status = 'pending'
-                            
-                            try:
-                                transcript = client.transcriptions.list(recording_sid=recording.sid)
-                                if transcript:
-                                    transcript = transcript[0].transcription_text
-                                    transcript_status = 'completed'
-                            except Exception as e:
-                                logger.error(f"Error fetching transcript for recording {recording.sid}: {str(e)}")
-                                transcript_status = 'failed'
-                            
-                            # Create or update CallResponse
-                            response, created = CallResponse.objects.update_or_create(
-                                recording_sid=recording.sid,
-                                defaults={
-                                    'phone_number': phone_number,
-                                    'recording_url': recording.uri,
-                                    'recording_duration': recording.duration,
-                                    'transcript': transcript,
-                                    'transcript_status': transcript_status
-                                }
-                            )
-                            
-                            status = "Created" if created else "Updated"
-                            self.stdout.write(f"{status} response for call {call.sid} with recording {recording.sid}")
-                            
-                        except Exception as e:
-                            logger.error(f"Error processing recording {recording.sid}: {str(e)}")
-                            continue
-                            
-                except Exception as e:
-                    logger.error(f"Error processing call {call.sid}: {str(e)}")
-                    continue
-            
-            self.stdout.write(self.style.SUCCESS('Successfully fetched transcripts from Twilio'))
-            
+            since, (calls, recordings) = import_since(
+                get_client(),
+                since=self.parse_since(options['since']),
+                workers=options['workers'],
+                batch_size=options['batch_size'],
+                dry_run=options['dry_run'],
+                stdout=self.stdout
+            )
+
+            if options['dry_run']:
+                self.stdout.write(self.style.WARNING(
+                    f"Dry run: found {calls} calls and {recordings} recordings since {since.isoformat()}, nothing saved"
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Imported {calls} calls and {recordings} recordings since {since.isoformat()}"
+                ))
+
+        except CommandError:
+            raise
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'Error: {str(e)}'))
-            logger.error(f"Error in fetch_twilio_transcripts: {str(e)}") 
\ No newline at end of file
+            logger.error(f"Error in fetch_twilio_transcripts: {str(e)}")
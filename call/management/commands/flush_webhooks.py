@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from call.spool import flush_spool
+import logging
+import signal
+import time
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Background worker that applies spooled status and transcription webhooks in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Events applied per transaction')
+        parser.add_argument('--poll-interval', type=float, default=1, help='Seconds between flushes')
+        parser.add_argument('--once', action='store_true', help='Flush the spool once and exit')
+
+    def handle(self, *args, **options):
+        # Finish the current flush before exiting on SIGTERM/SIGINT
+        self.running = True
+        def stop(signum, frame):
+            self.running = False
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        self.stdout.write('Webhook flusher started')
+        while self.running:
+            try:
+                flushed = flush_spool(batch_size=options['batch_size'])
+            except Exception as e:
+                logger.error(f"Error in flush_webhooks: {str(e)}")
+                flushed = 0
+
+            if flushed:
+                self.stdout.write(f"Applied {flushed} webhook events")
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
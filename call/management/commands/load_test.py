@@ -0,0 +1,84 @@
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from call.benchmark import format_summary, test_database
+from call.loadtest import HttpTransport, InProcessTransport, LoadTest, QueryCounter
+from call.telephony import get_provider, reset_provider
+from call.twilio_client import close_async_client, reset_client
+from call.twilio_stub import StubTwilioServer
+import json
+
+
+class Command(BaseCommand):
+    help = 'Drive simulated interviews through the webhooks like Twilio would and report latency, errors and queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=200, help='Interviews to simulate')
+        parser.add_argument('--concurrency', type=int, default=50, help='Interviews in progress at once')
+        parser.add_argument('--think-time', type=float, default=1.0,
+                            help='Mean seconds a candidate speaks per answer, and before transcripts arrive')
+        parser.add_argument('--no-transcripts', action='store_true', help='Skip the transcription callbacks')
+        parser.add_argument('--seed', type=int, default=17, help='Seed of the simulated call data')
+        parser.add_argument('--latency', type=float, default=0.05,
+                            help='Seconds the stub Twilio API takes per request, in process only')
+        parser.add_argument('--fake-provider', action='store_true',
+                            help='Place calls with the in-process FakeProvider instead of Twilio against a stub API')
+        parser.add_argument('--url', help='Base URL of a running deployment to load instead of this process')
+        parser.add_argument('--output', help='Write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        settings = {
+            'calls': options['calls'], 'concurrency': options['concurrency'], 'think_time': options['think_time'],
+            'transcripts': not options['no_transcripts'], 'seed': options['seed'],
+        }
+        if options['url']:
+            # The deployment applies queued webhooks with its own flush_webhooks worker
+            report = async_to_sync(self.run_remote)(options['url'], settings)
+        else:
+            report = self.run_in_process(options['latency'], options['fake_provider'], settings)
+
+        for endpoint, stats in report['endpoints'].items():
+            line = format_summary(endpoint, stats) + f" errors={stats['errors']}"
+            if 'queries_per_request' in stats:
+                line += f" queries/req={stats['queries_per_request']}"
+            self.stdout.write(line)
+        calls = report['calls']
+        self.stdout.write(
+            f"{calls['completed']}/{options['calls']} interviews completed, {report['requests']} requests in "
+            f"{report['wall_s']:.2f}s ({report['requests_per_second']}/s), {report['errors']} errors"
+        )
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+    def run_in_process(self, latency, fake_provider, settings):
+        with test_database(), StubTwilioServer(latency=latency) as stub, override_settings(
+            TWILIO_ACCOUNT_SID='AC' + '0' * 32, TWILIO_AUTH_TOKEN='loadtest', PUBLIC_URL='https://hr.example.com',
+            TWILIO_API_BASE_URL=stub.url,
+            TELEPHONY_PROVIDER='call.telephony.FakeProvider' if fake_provider else 'call.telephony.TwilioProvider',
+            FAKE_TELEPHONY_LATENCY=latency
+        ):
+            reset_client()
+            reset_provider()
+            try:
+                with QueryCounter().active() as counter:
+                    report = async_to_sync(self.run_local)(settings, counter)
+                report['provider_requests'] = get_provider().requests if fake_provider else stub.requests
+            finally:
+                reset_client()
+                reset_provider()
+        return report
+
+    async def run_local(self, settings, counter):
+        try:
+            return await LoadTest(InProcessTransport(), **settings).run(counter)
+        finally:
+            await close_async_client()
+
+    async def run_remote(self, url, settings):
+        transport = HttpTransport(url, connections=settings['concurrency'])
+        try:
+            return await LoadTest(transport, flush=False, **settings).run()
+        finally:
+            await transport.close()
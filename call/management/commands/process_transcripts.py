@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from call.telephony import get_provider
+from call.transcripts import reconcile_transcripts
+import logging
+import signal
+import time
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Background worker that fetches pending transcripts from the telephony provider'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Responses to pick up per batch')
+        parser.add_argument('--workers', type=int, default=4, help='Maximum concurrent provider requests')
+        parser.add_argument('--max-attempts', type=int, default=5, help='Attempts before a transcript is marked failed')
+        parser.add_argument('--base-delay', type=int, default=30, help='First retry delay in seconds, doubled on every attempt')
+        parser.add_argument('--max-delay', type=int, default=3600, help='Upper bound for the retry delay in seconds')
+        parser.add_argument('--poll-interval', type=float, default=10, help='Seconds to sleep when there is nothing to do')
+        parser.add_argument('--once', action='store_true', help='Process a single batch and exit')
+
+    def handle(self, *args, **options):
+        # Check if the provider, e.g. its Twilio credentials, is configured
+        provider = get_provider()
+        error = provider.configuration_error()
+        if error:
+            self.stdout.write(self.style.ERROR(error))
+            return
+
+        # Finish the current batch before exiting on SIGTERM/SIGINT
+        self.running = True
+        def stop(signum, frame):
+            self.running = False
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        self.stdout.write('Transcript worker started')
+        while self.running:
+            try:
+                processed = reconcile_transcripts(
+                    provider,
+                    batch_size=options['batch_size'],
+                    workers=options['workers'],
+                    max_attempts=options['max_attempts'],
+                    base_delay=options['base_delay'],
+                    max_delay=options['max_delay']
+                )
+            except Exception as e:
+                logger.error(f"Error in process_transcripts: {str(e)}")
+                processed = 0
+
+            if processed:
+                self.stdout.write(f"Processed {processed} pending transcripts")
+            if options['once']:
+                break
+            # Drain the backlog back to back, only sleep when it is empty
+            if not processed:
+                time.sleep(options['poll_interval'])
+
+        self.stdout.write(self.style.SUCCESS('Transcript worker stopped'))
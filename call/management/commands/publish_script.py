@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from call.prompts import get_synthesizer
+from call.scripts import TRIM_OPTIONS, publish_script
+from call.telephony import MAX_RECORDING_SECONDS, TRIM, VOICE
+from call.twiml import render_script_prompts
+import sys
+
+
+class Command(BaseCommand):
+    help = 'Publish the next version of an interview script from a file with one question per line'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help='Script name; publishing an existing name adds its next version')
+        parser.add_argument('questions', help="File with one question per line, or '-' for stdin")
+        parser.add_argument('--voice', default=VOICE, help='Text-to-speech voice the questions are asked in')
+        parser.add_argument('--max-length', type=int, default=MAX_RECORDING_SECONDS,
+                            help='Seconds an answer may run before recording stops')
+        parser.add_argument('--trim', default=TRIM, choices=TRIM_OPTIONS, help='Whether to trim silence from answers')
+        parser.add_argument('--no-audio', action='store_true',
+                            help='Skip rendering the prompts to audio; calls speak them until render_prompts runs')
+
+    def handle(self, *args, **options):
+        if options['questions'] == '-':
+            questions = sys.stdin.read().splitlines()
+        else:
+            with open(options['questions'], encoding='utf-8') as questions_file:
+                questions = questions_file.read().splitlines()
+
+        try:
+            script = publish_script(
+                options['name'], questions, voice=options['voice'], max_length=options['max_length'],
+                trim=options['trim']
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Published {script} with {len(script.questions)} questions; new calls can pick it now"
+        ))
+        if get_synthesizer() is not None and not options['no_audio']:
+            self.stdout.write(f"Rendered {render_script_prompts(script)} prompts to audio")
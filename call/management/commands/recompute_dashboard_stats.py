@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from call.stats import recompute_stats
+import logging
+import signal
+import time
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Recount the dashboard statistics from scratch to correct any drift in the counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Keep running and recompute every INTERVAL seconds instead of once')
+
+    def handle(self, *args, **options):
+        # Finish the current recount before exiting on SIGTERM/SIGINT
+        self.running = True
+        def stop(signum, frame):
+            self.running = False
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        while self.running:
+            try:
+                counts, drift = recompute_stats()
+            except Exception as e:
+                logger.error(f"Error in recompute_dashboard_stats: {str(e)}")
+            else:
+                for name, delta in drift.items():
+                    logger.warning(f"Dashboard counter {name} drifted by {delta:+d}")
+                summary = ', '.join(f"{name}={value}" for name, value in counts.items())
+                self.stdout.write(f"Recomputed dashboard statistics: {summary}")
+
+            if options['interval'] is None:
+                break
+            time.sleep(options['interval'])
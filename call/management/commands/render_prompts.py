@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from call.models import InterviewScript
+from call.prompts import get_synthesizer
+from call.twiml import builtin_script, render_script_prompts
+
+
+class Command(BaseCommand):
+    help = 'Render the prompts of the built-in and current interview scripts to audio, skipping those already rendered'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all-versions', action='store_true',
+                            help='Also render earlier versions, which calls placed before a publish may still ask')
+
+    def handle(self, *args, **options):
+        synthesizer = get_synthesizer()
+        if synthesizer is None:
+            raise CommandError('PROMPT_SYNTHESIZER is not set')
+        error = synthesizer.configuration_error()
+        if error:
+            raise CommandError(error)
+
+        scripts = InterviewScript.objects.all()
+        if not options['all_versions']:
+            scripts = scripts.filter(is_current=True)
+        total = 0
+        for script in [builtin_script(), *scripts]:
+            rendered = render_script_prompts(script)
+            total += rendered
+            self.stdout.write(f"{script}: rendered {rendered} of {len(script.questions) + 1} prompts")
+        self.stdout.write(self.style.SUCCESS(f"Rendered {total} prompts with {synthesizer.name}"))
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand
+from call.dialer import CampaignDialer
+from call.telephony import get_provider
+import logging
+import signal
+import time
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Background worker that dials queued campaign numbers within the account CPS limit'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls-per-second', type=float, default=None, help='Defaults to TWILIO_CALLS_PER_SECOND')
+        parser.add_argument('--max-live-calls', type=int, default=None, help='Defaults to CAMPAIGN_MAX_LIVE_CALLS')
+        parser.add_argument('--max-attempts', type=int, default=3, help='Dial attempts before a number is marked failed')
+        parser.add_argument('--retry-delay', type=int, default=60, help='Seconds before retrying a failed dial')
+        parser.add_argument('--stale-after', type=int, default=3600, help='Seconds before a call without a final status frees its slot')
+        parser.add_argument('--workers', type=int, default=4, help='Concurrent provider API requests')
+        parser.add_argument('--poll-interval', type=float, default=2, help='Seconds to sleep when nothing could be dialed')
+        parser.add_argument('--once', action='store_true', help='Run a single dialing cycle and exit')
+
+    def handle(self, *args, **options):
+        # Check if the provider, e.g. its Twilio credentials, is configured
+        error = get_provider().configuration_error()
+        if error:
+            self.stdout.write(self.style.ERROR(error))
+            return
+
+        dialer = CampaignDialer(
+            calls_per_second=options['calls_per_second'],
+            max_live_calls=options['max_live_calls'],
+            max_attempts=options['max_attempts'],
+            retry_delay=options['retry_delay'],
+            stale_after=options['stale_after'],
+            workers=options['workers']
+        )
+
+        # Finish the current cycle before exiting on SIGTERM/SIGINT
+        self.running = True
+        def stop(signum, frame):
+            self.running = False
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        self.stdout.write(
+            f"Campaign dialer started at {dialer.bucket.rate:g} calls/second, "
+            f"{dialer.max_live_calls} live calls max"
+        )
+        try:
+            while self.running:
+                try:
+                    dialed = dialer.run_once()
+                except Exception as e:
+                    logger.error(f"Error in run_campaigns: {str(e)}")
+                    dialed = 0
+
+                if dialed:
+                    self.stdout.write(f"Dialed {dialed} numbers")
+                if options['once']:
+                    break
+                if not dialed:
+                    time.sleep(options['poll_interval'])
+        finally:
+            dialer.close()
+
+        self.stdout.write(self.style.SUCCESS('Campaign dialer stopped'))
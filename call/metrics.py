@@ -0,0 +1,162 @@
+from bisect import bisect_left
+from contextvars import ContextVar
+from django.conf import settings
+from urllib.parse import urlsplit
+import json
+import logging
+import re
+import threading
+import time
+
+slow_logger = logging.getLogger('call.slow_requests')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+# Twilio SIDs in API paths, replaced so each endpoint is one series
+SID = re.compile(r'\b[A-Z]{2}[0-9a-fA-F]{32}\b')
+
+# The RequestStats of the request being served; sync_to_async copies it into the view's thread
+_current = ContextVar('request_stats', default=None)
+
+
+class Histogram:
+    """
+    A Prometheus histogram with fixed buckets and a few labels.
+
+    Kept in process memory, so every worker exports its own series.
+    Observing takes a lock and a bisect, cheap enough to run on every request.
+    """
+
+    def __init__(self, name, documentation, labels, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                # One count per bucket plus +Inf, then the sum
+                series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = {labels: list(values) for labels, values in self.series.items()}
+        for labels, values in sorted(series.items()):
+            pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(self.labels, labels)]
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values):
+                cumulative += count
+                bucket_pairs = ','.join(pairs + [f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_pairs}}} {cumulative}")
+            label_text = f"{{{','.join(pairs)}}}" if pairs else ''
+            lines.append(f"{self.name}_sum{label_text} {values[-1]!r}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return '\n'.join(lines)
+
+
+def escape_label(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+REQUEST_SECONDS = Histogram(
+    'hr_http_request_duration_seconds', 'Wall time of requests by view', ('view', 'method', 'status'), LATENCY_BUCKETS
+)
+REQUEST_DB_QUERIES = Histogram('hr_http_request_db_queries', 'SQL queries per request by view', ('view',), QUERY_BUCKETS)
+REQUEST_DB_SECONDS = Histogram(
+    'hr_http_request_db_seconds', 'Time spent in SQL per request by view', ('view',), LATENCY_BUCKETS
+)
+TWILIO_SECONDS = Histogram(
+    'hr_twilio_api_request_duration_seconds', 'Latency of outbound Twilio API requests by endpoint',
+    ('method', 'endpoint', 'status'), LATENCY_BUCKETS
+)
+METRICS = [REQUEST_SECONDS, REQUEST_DB_QUERIES, REQUEST_DB_SECONDS, TWILIO_SECONDS]
+
+
+class RequestStats:
+    __slots__ = ('started', 'queries', 'db_seconds', 'api_calls', 'api_seconds')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.api_calls = 0
+        self.api_seconds = 0.0
+
+
+def start_request():
+    """Start collecting stats for the current request, returns them and the token to stop"""
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def finish_request(request, response, stats, token):
+    """Record a finished request's stats and log it if it was slow"""
+    _current.reset(token)
+    duration = time.perf_counter() - stats.started
+    match = request.resolver_match
+    view = match.view_name if match else 'unmatched'
+    REQUEST_SECONDS.observe(duration, view, request.method, str(response.status_code))
+    REQUEST_DB_QUERIES.observe(stats.queries, view)
+    REQUEST_DB_SECONDS.observe(stats.db_seconds, view)
+
+    if duration >= settings.SLOW_REQUEST_SECONDS:
+        record = {
+            'view': view,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 1),
+            'db_queries': stats.queries,
+            'db_ms': round(stats.db_seconds * 1000, 1),
+            'twilio_calls': stats.api_calls,
+            'twilio_ms': round(stats.api_seconds * 1000, 1),
+            # Whatever is neither SQL nor Twilio: TwiML, templates, middleware, waiting for a thread
+            'other_ms': round((duration - stats.db_seconds - stats.api_seconds) * 1000, 1),
+        }
+        slow_logger.warning(json.dumps(record), extra={'request_metrics': record})
+
+
+def time_query(execute, sql, params, many, context):
+    """Database execute wrapper adding each query's time to the current request"""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - started
+
+
+def install_query_timer(sender, connection, **kwargs):
+    """connection_created receiver, see CallConfig.ready"""
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+def endpoint_label(url):
+    """The path of a Twilio API URL with its SIDs replaced, e.g. /2010-04-01/Accounts/{sid}/Calls.json"""
+    return SID.sub('{sid}', urlsplit(url).path)
+
+
+def observe_twilio(method, url, status, seconds):
+    """Record one outbound Twilio API request, also against the current request"""
+    TWILIO_SECONDS.observe(seconds, method.upper(), endpoint_label(url), str(status))
+    stats = _current.get()
+    if stats is not None:
+        stats.api_calls += 1
+        stats.api_seconds += seconds
+
+
+def render_metrics():
+    """All metrics of this process in the Prometheus text format"""
+    return '\n'.join(metric.render() for metric in METRICS) + '\n'
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('call', '0004_alter_callresponse_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='callresponse',
+            name='transcript_attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='callresponse',
+            name='transcript_next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
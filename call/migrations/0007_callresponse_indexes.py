@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('call', '0006_campaign'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='callresponse',
+            index=models.Index(fields=['call_sid', 'created_at'], name='callresponse_call_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='callresponse',
+            index=models.Index(fields=['transcript_status', 'recording_sid'], name='callresponse_transcript_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='callresponse',
+            index=models.Index(fields=['call_status', 'created_at'], name='callresponse_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='callresponse',
+            index=models.Index(fields=['-created_at'], name='callresponse_created_idx'),
+        ),
+    ]
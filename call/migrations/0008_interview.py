@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:54
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('call', '0007_callresponse_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Interview',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('call_sid', models.CharField(max_length=100, unique=True)),
+                ('phone_number', models.CharField(max_length=20)),
+                ('status', models.CharField(blank=True, max_length=20, null=True)),
+                ('duration', models.IntegerField(blank=True, null=True)),
+                ('answered_questions', models.PositiveIntegerField(default=0)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('ended_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['-created_at', '-id'], name='interview_created_idx'), models.Index(fields=['status', 'created_at'], name='interview_status_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='callresponse',
+            name='interview',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='responses', to='call.interview'),
+        ),
+    ]
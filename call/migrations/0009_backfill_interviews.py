@@ -0,0 +1,70 @@
+from django.db import migrations
+from django.db.models import Count, Max, Min, OuterRef, Q, Subquery
+
+BATCH_SIZE = 1000
+
+
+def backfill_interviews(apps, schema_editor):
+    """Create one Interview per call_sid from its responses and link the responses to it"""
+    CallResponse = apps.get_model('call', 'CallResponse')
+    Interview = apps.get_model('call', 'Interview')
+
+    # The most recent response carries the latest call details
+    latest = CallResponse.objects.filter(call_sid=OuterRef('call_sid')).order_by('-created_at', '-id')
+    calls = (
+        CallResponse.objects
+        .filter(call_sid__isnull=False)
+        .values('call_sid')
+        .annotate(
+            first_created_at=Min('created_at'),
+            last_updated_at=Max('updated_at'),
+            duration=Max('call_duration'),
+            answered=Count('id', filter=Q(recording_sid__isnull=False)),
+            latest_phone_number=Subquery(latest.values('phone_number')[:1]),
+            latest_status=Subquery(latest.values('call_status')[:1]),
+        )
+        .order_by()
+    )
+
+    batch = []
+    for call in calls.iterator(chunk_size=BATCH_SIZE):
+        batch.append(Interview(
+            call_sid=call['call_sid'],
+            phone_number=call['latest_phone_number'],
+            status=call['latest_status'],
+            duration=call['duration'],
+            answered_questions=call['answered'],
+            ended_at=call['last_updated_at'] if call['latest_status'] == 'completed' else None,
+            created_at=call['first_created_at'],
+        ))
+        if len(batch) >= BATCH_SIZE:
+            Interview.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    Interview.objects.bulk_create(batch, ignore_conflicts=True)
+
+    # Link every response in a single statement
+    CallResponse.objects.filter(call_sid__isnull=False, interview__isnull=True).update(
+        interview_id=Subquery(Interview.objects.filter(call_sid=OuterRef('call_sid')).values('id')[:1])
+    )
+
+
+def restore_call_fields(apps, schema_editor):
+    """Copy call-level facts back onto the responses"""
+    CallResponse = apps.get_model('call', 'CallResponse')
+    Interview = apps.get_model('call', 'Interview')
+    interview = Interview.objects.filter(id=OuterRef('interview_id'))
+    CallResponse.objects.filter(interview__isnull=False).update(
+        call_status=Subquery(interview.values('status')[:1]),
+        call_duration=Subquery(interview.values('duration')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('call', '0008_interview'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_interviews, restore_call_fields),
+    ]
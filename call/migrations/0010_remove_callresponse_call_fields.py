@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:54
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('call', '0009_backfill_interviews'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='callresponse',
+            name='callresponse_status_idx',
+        ),
+        migrations.RemoveField(
+            model_name='callresponse',
+            name='call_duration',
+        ),
+        migrations.RemoveField(
+            model_name='callresponse',
+            name='call_status',
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:57
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def seed_counters(apps, schema_editor):
+    """Start the counters from a full recount of the existing rows"""
+    CallResponse = apps.get_model('call', 'CallResponse')
+    DashboardCounter = apps.get_model('call', 'DashboardCounter')
+    Interview = apps.get_model('call', 'Interview')
+    DashboardCounter.objects.bulk_create([
+        DashboardCounter(name='total_calls', value=Interview.objects.count()),
+        DashboardCounter(name='completed_calls', value=Interview.objects.filter(status='completed').count()),
+        DashboardCounter(name='total_responses', value=CallResponse.objects.count()),
+        DashboardCounter(name='completed_transcripts', value=CallResponse.objects.filter(transcript_status='completed').count()),
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('call', '0010_remove_callresponse_call_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
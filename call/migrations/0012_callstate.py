@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('call', '0011_dashboardcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CallState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('call_sid', models.CharField(max_length=100, unique=True)),
+                ('question_index', models.PositiveIntegerField(default=0)),
+                ('response_id', models.IntegerField(blank=True, null=True)),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
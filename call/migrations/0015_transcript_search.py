@@ -0,0 +1,76 @@
+from django.db import migrations
+
+# SQLite: an external-content FTS5 index over call_callresponse, kept in step by triggers.
+# SQLite schema changes rebuild the table and drop its triggers; a later migration that
+# alters call_callresponse must recreate them and rebuild the index.
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE call_callresponse_fts USING fts5(
+        question, transcript, content='call_callresponse', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER call_callresponse_fts_insert AFTER INSERT ON call_callresponse BEGIN
+        INSERT INTO call_callresponse_fts(rowid, question, transcript) VALUES (new.id, new.question, new.transcript);
+    END
+    """,
+    """
+    CREATE TRIGGER call_callresponse_fts_delete AFTER DELETE ON call_callresponse BEGIN
+        INSERT INTO call_callresponse_fts(call_callresponse_fts, rowid, question, transcript)
+        VALUES ('delete', old.id, old.question, old.transcript);
+    END
+    """,
+    """
+    CREATE TRIGGER call_callresponse_fts_update AFTER UPDATE OF question, transcript ON call_callresponse BEGIN
+        INSERT INTO call_callresponse_fts(call_callresponse_fts, rowid, question, transcript)
+        VALUES ('delete', old.id, old.question, old.transcript);
+        INSERT INTO call_callresponse_fts(rowid, question, transcript) VALUES (new.id, new.question, new.transcript);
+    END
+    """,
+    # Rank transcript matches above question matches, the columns are (question, transcript)
+    "INSERT INTO call_callresponse_fts(call_callresponse_fts, rank) VALUES ('rank', 'bm25(1.0, 2.0)')",
+    "INSERT INTO call_callresponse_fts(call_callresponse_fts) VALUES ('rebuild')",
+]
+SQLITE_BACKWARD = [
+    'DROP TRIGGER call_callresponse_fts_update',
+    'DROP TRIGGER call_callresponse_fts_delete',
+    'DROP TRIGGER call_callresponse_fts_insert',
+    'DROP TABLE call_callresponse_fts',
+]
+
+# Postgres: a generated tsvector column, transcript words ranked above question words, and a GIN index
+POSTGRES_FORWARD = [
+    """
+    ALTER TABLE call_callresponse ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(transcript, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(question, '')), 'B')
+    ) STORED
+    """,
+    'CREATE INDEX callresponse_search_idx ON call_callresponse USING GIN (search_vector)',
+]
+POSTGRES_BACKWARD = [
+    'DROP INDEX callresponse_search_idx',
+    'ALTER TABLE call_callresponse DROP COLUMN search_vector',
+]
+
+
+def run(statements):
+    def apply(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for sql in statements.get(vendor, []):
+            schema_editor.execute(sql)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('call', '0014_webhookevent'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            run({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}),
+        ),
+    ]
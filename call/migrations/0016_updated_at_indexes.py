@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('call', '0015_transcript_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='callresponse',
+            index=models.Index(fields=['updated_at'], name='callresponse_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='interview',
+            index=models.Index(fields=['updated_at'], name='interview_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:53
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('call', '0016_updated_at_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InterviewScript',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('questions', models.JSONField(default=list)),
+                ('voice', models.CharField(default='Polly.Amy', max_length=50)),
+                ('max_length', models.PositiveIntegerField(default=30)),
+                ('trim', models.CharField(choices=[('trim-silence', 'Trim silence'), ('do-not-trim', 'Do not trim')], default='trim-silence', max_length=20)),
+                ('is_current', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['name', '-version'],
+                'constraints': [models.UniqueConstraint(fields=('name', 'version'), name='interviewscript_version_unique'), models.UniqueConstraint(condition=models.Q(('is_current', True)), fields=('name',), name='interviewscript_current_unique')],
+            },
+        ),
+        migrations.AddField(
+            model_name='campaign',
+            name='script',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='campaigns', to='call.interviewscript'),
+        ),
+        migrations.AddField(
+            model_name='interview',
+            name='script',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='interviews', to='call.interviewscript'),
+        ),
+    ]
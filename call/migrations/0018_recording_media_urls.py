@@ -0,0 +1,30 @@
+from django.db import migrations
+
+BATCH_SIZE = 1000
+API_ROOT = 'https://api.twilio.com'
+
+
+def media_urls(apps, schema_editor):
+    """Point recordings imported with their REST resource URI (.json) at the MP3 audio instead"""
+    CallResponse = apps.get_model('call', 'CallResponse')
+    responses = CallResponse.objects.filter(recording_url__endswith='.json').only('id', 'recording_url')
+    batch = []
+    for response in responses.iterator(chunk_size=BATCH_SIZE):
+        url = response.recording_url.removesuffix('.json') + '.mp3'
+        response.recording_url = API_ROOT + url if url.startswith('/') else url
+        batch.append(response)
+        if len(batch) >= BATCH_SIZE:
+            CallResponse.objects.bulk_update(batch, ['recording_url'])
+            batch = []
+    CallResponse.objects.bulk_update(batch, ['recording_url'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('call', '0017_interviewscript'),
+    ]
+
+    operations = [
+        migrations.RunPython(media_urls, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+from django.db import migrations
+
+# Deleted rows leave no updated_at behind, so every delete from call_interview or call_callresponse
+# bumps the removed_rows counter (call.stats.REMOVED) in the same transaction, whatever issued it.
+# SQLite schema changes rebuild the table and drop its triggers; a later migration that alters
+# either table must recreate them.
+SQLITE_FORWARD = [
+    f"""
+    CREATE TRIGGER {table}_removed AFTER DELETE ON {table} BEGIN
+        INSERT INTO call_dashboardcounter(name, value, updated_at) VALUES ('removed_rows', 1, datetime('now'))
+        ON CONFLICT(name) DO UPDATE SET value = value + 1, updated_at = excluded.updated_at;
+    END
+    """
+    for table in ('call_interview', 'call_callresponse')
+]
+SQLITE_BACKWARD = [
+    'DROP TRIGGER call_callresponse_removed',
+    'DROP TRIGGER call_interview_removed',
+]
+
+# Postgres: once per DELETE statement rather than per row
+POSTGRES_FORWARD = [
+    """
+    CREATE FUNCTION call_note_removal() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO call_dashboardcounter(name, value, updated_at) VALUES ('removed_rows', 1, now())
+        ON CONFLICT (name) DO UPDATE SET value = call_dashboardcounter.value + 1, updated_at = now();
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+] + [
+    f"""
+    CREATE TRIGGER {table}_removed AFTER DELETE ON {table}
+    FOR EACH STATEMENT EXECUTE FUNCTION call_note_removal()
+    """
+    for table in ('call_interview', 'call_callresponse')
+]
+POSTGRES_BACKWARD = [
+    'DROP TRIGGER call_callresponse_removed ON call_callresponse',
+    'DROP TRIGGER call_interview_removed ON call_interview',
+    'DROP FUNCTION call_note_removal()',
+]
+
+
+def run(statements):
+    def apply(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        for sql in statements.get(vendor, []):
+            schema_editor.execute(sql)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('call', '0018_recording_media_urls'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            run({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}),
+        ),
+    ]
@@ -11,7 +11,71 @@ class Recording(models.Model):
     def __str__(self):
         return self.question
 
+class InterviewScript(models.Model):
+    """
+    One published version of an interview script, see call.scripts.
+
+    Versions are never edited: publishing a change adds the next version and
+    makes it the current one, while calls already placed keep the version
+    they were placed with.
+    """
+    name = models.CharField(max_length=100)
+    version = models.PositiveIntegerField(default=1)
+    questions = models.JSONField(default=list)
+    voice = models.CharField(max_length=50, default='Polly.Amy')
+    # Seconds an answer may run, Twilio's <Record maxLength>
+    max_length = models.PositiveIntegerField(default=30)
+    trim = models.CharField(
+        max_length=20,
+        choices=[
+            ('trim-silence', 'Trim silence'),
+            ('do-not-trim', 'Do not trim')
+        ],
+        default='trim-silence'
+    )
+    is_current = models.BooleanField(default=False)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['name', '-version']
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'version'], name='interviewscript_version_unique'),
+            # One current version per script, and the index the script pickers read
+            models.UniqueConstraint(
+                fields=['name'], condition=models.Q(is_current=True), name='interviewscript_current_unique'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+class Interview(models.Model):
+    """One phone interview; owns the call-level facts shared by its responses"""
+    call_sid = models.CharField(max_length=100, unique=True)
+    phone_number = models.CharField(max_length=20)
+    status = models.CharField(max_length=20, blank=True, null=True)
+    duration = models.IntegerField(blank=True, null=True)
+    answered_questions = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(blank=True, null=True)
+    ended_at = models.DateTimeField(blank=True, null=True)
+    # The script version the call asks; calls without one ask INTERVIEW_QUESTIONS
+    script = models.ForeignKey(InterviewScript, on_delete=models.PROTECT, related_name='interviews', blank=True, null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='interview_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='interview_status_idx'),
+            models.Index(fields=['updated_at'], name='interview_updated_idx'),
+        ]
+
+    def __str__(self):
+        return f"Interview with {self.phone_number} ({self.call_sid})"
+
 class CallResponse(models.Model):
+    interview = models.ForeignKey(Interview, on_delete=models.CASCADE, related_name='responses', blank=True, null=True)
     phone_number = models.CharField(max_length=20)
     question = models.TextField(blank=True, null=True)
     response = models.TextField(blank=True, null=True)
@@ -28,14 +92,122 @@ class CallResponse(models.Model):
         ],
         default='pending'
     )
+    transcript_attempts = models.PositiveIntegerField(default=0)
+    transcript_next_attempt_at = models.DateTimeField(blank=True, null=True)
     call_sid = models.CharField(max_length=100, blank=True, null=True)
-    call_duration = models.IntegerField(blank=True, null=True)
-    call_status = models.CharField(max_length=20, blank=True, null=True)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Lookups by the CallSid on Twilio webhooks
+            models.Index(fields=['call_sid', 'created_at'], name='callresponse_call_idx'),
+            # The transcript worker's pending queue
+            models.Index(fields=['transcript_status', 'recording_sid'], name='callresponse_transcript_idx'),
+            # Default ordering and date range filters
+            models.Index(fields=['-created_at'], name='callresponse_created_idx'),
+            # Change polling by the calls API
+            models.Index(fields=['updated_at'], name='callresponse_updated_idx'),
+        ]
+
+    def __str__(self):
+        return f"Call to {self.phone_number} at {self.created_at}"
+
+class CallState(models.Model):
+    """Where a live interview is in its script, see call.state.DatabaseStateStore"""
+    call_sid = models.CharField(max_length=100, unique=True)
+    question_index = models.PositiveIntegerField(default=0)
+    response_id = models.IntegerField(blank=True, null=True)
+    version = models.PositiveIntegerField(default=1)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.call_sid} at question {self.question_index}"
+
+class WebhookEvent(models.Model):
+    """A status or transcription webhook waiting for the flush_webhooks worker, see call.spool"""
+    kind = models.CharField(
+        max_length=20,
+        choices=[
+            ('status', 'Call status'),
+            ('transcription', 'Transcription')
+        ]
+    )
+    payload = models.JSONField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.kind} event {self.id}"
+
+class DashboardCounter(models.Model):
+    """A dashboard statistic kept up to date by the code paths that change it, see call.stats"""
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+class ImportWatermark(models.Model):
+    """How far a periodic import from Twilio has got, so the next run only pulls newer data"""
+    name = models.CharField(max_length=50, unique=True)
+    value = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+class Campaign(models.Model):
+    """A batch of numbers uploaded together and dialed by the run_campaigns worker"""
+    name = models.CharField(max_length=255)
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ('pending', 'Pending'),
+            ('running', 'Running'),
+            ('completed', 'Completed'),
+            ('cancelled', 'Cancelled')
+        ],
+        default='pending'
+    )
+    script = models.ForeignKey(InterviewScript, on_delete=models.PROTECT, related_name='campaigns', blank=True, null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return self.name
+
+
+class CampaignNumber(models.Model):
+    """Dialing progress for one number of a campaign"""
+    campaign = models.ForeignKey(Campaign, on_delete=models.CASCADE, related_name='numbers')
+    phone_number = models.CharField(max_length=20)
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ('queued', 'Queued'),
+            ('dialing', 'Dialing'),
+            ('completed', 'Completed'),
+            ('failed', 'Failed')
+        ],
+        default='queued'
+    )
+    call_sid = models.CharField(max_length=100, blank=True, null=True, db_index=True)
+    call_status = models.CharField(max_length=20, blank=True, null=True)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['id']
+        unique_together = [('campaign', 'phone_number')]
+        indexes = [models.Index(fields=['status', 'campaign'])]
 
     def __str__(self):
-        return f"Call to {self.phone_number} at {self.created_at}"
\ No newline at end of file
+        return f"{self.phone_number} ({self.status})"
@@ -0,0 +1,211 @@
+from django.conf import settings
+from django.utils.module_loading import import_string
+from io import BytesIO
+import hashlib
+import json
+import math
+import os
+import re
+import struct
+import tempfile
+import threading
+import wave
+
+# Rendered prompts are named by a hash of their audio, so a name never changes content
+PROMPT_NAME = re.compile(r'^[0-9a-f]{32}\.(?:mp3|wav)$')
+MANIFEST = 'manifest.json'
+
+_synthesizer = None
+_synthesizer_lock = threading.Lock()
+_manifest = {'mtime': None, 'entries': {}}
+_manifest_lock = threading.Lock()
+
+
+class Synthesizer:
+    """
+    Renders prompt text to audio in a given voice.
+
+    ``name`` identifies the engine in the manifest, so switching engines
+    renders every prompt afresh instead of reusing the other engine's audio.
+    """
+
+    name = None
+    extension = 'mp3'
+
+    def configuration_error(self):
+        """Why the synthesizer cannot be used with the current settings, or None"""
+        return None
+
+    def synthesize(self, text, voice):
+        """The audio of ``text`` spoken in ``voice``, as bytes in ``extension`` format"""
+        raise NotImplementedError
+
+
+class FakeSynthesizer(Synthesizer):
+    """
+    Deterministic local stand-in for tests and development.
+
+    Renders a short WAV tone per prompt, pitched by the text and voice and
+    longer for longer text, without any network access. Counts its
+    ``requests`` like FakeProvider.
+    """
+
+    name = 'fake'
+    extension = 'wav'
+    RATE = 8000
+
+    def __init__(self):
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def synthesize(self, text, voice):
+        with self.lock:
+            self.requests += 1
+        digest = hashlib.sha256(f"{voice}|{text}".encode()).digest()
+        frequency = 300 + digest[0] * 2
+        frames = int(self.RATE * min(5.0, 0.2 + 0.05 * len(text.split())))
+        output = BytesIO()
+        with wave.open(output, 'wb') as audio:
+            audio.setnchannels(1)
+            audio.setsampwidth(2)
+            audio.setframerate(self.RATE)
+            audio.writeframes(b''.join(
+                struct.pack('<h', int(8000 * math.sin(2 * math.pi * frequency * frame / self.RATE)))
+                for frame in range(frames)
+            ))
+        return output.getvalue()
+
+
+class PollySynthesizer(Synthesizer):
+    """
+    Amazon Polly, the engine behind Twilio's Polly.* voices, so rendered
+    prompts sound like the <Say> they replace. Needs boto3 and AWS
+    credentials; voices like Polly.Amy-Neural use the neural engine.
+    """
+
+    name = 'polly'
+    extension = 'mp3'
+
+    def __init__(self, client=None):
+        self._client = client
+
+    def configuration_error(self):
+        if self._client is None:
+            try:
+                import boto3  # noqa: F401
+            except ImportError:
+                return 'boto3 is not installed, pip install boto3 to render prompts with Polly'
+        return None
+
+    @property
+    def client(self):
+        if self._client is None:
+            import boto3
+            self._client = boto3.client('polly')
+        return self._client
+
+    def synthesize(self, text, voice):
+        voice_id, _, engine = voice.removeprefix('Polly.').partition('-')
+        response = self.client.synthesize_speech(
+            Text=text, VoiceId=voice_id, OutputFormat='mp3', Engine=engine.lower() or 'standard'
+        )
+        with response['AudioStream'] as stream:
+            return stream.read()
+
+
+def get_synthesizer():
+    """Return the process-wide synthesizer configured by PROMPT_SYNTHESIZER, or None if prompts are spoken"""
+    global _synthesizer
+    if _synthesizer is None and settings.PROMPT_SYNTHESIZER:
+        with _synthesizer_lock:
+            if _synthesizer is None:
+                _synthesizer = import_string(settings.PROMPT_SYNTHESIZER)()
+    return _synthesizer
+
+
+def reset_synthesizer():
+    """Drop the shared synthesizer, e.g. after changing PROMPT_SYNTHESIZER in tests"""
+    global _synthesizer
+    with _synthesizer_lock:
+        _synthesizer = None
+
+
+def prompt_key(synthesizer, text, voice):
+    return hashlib.sha256(f"{synthesizer.name}|{voice}|{text}".encode()).hexdigest()
+
+
+def read_manifest(root=None):
+    """
+    The manifest of rendered prompts, {prompt key: file name}.
+
+    Re-read only when the file changes, so workers see prompts rendered by
+    another process without reading it on every webhook.
+    """
+    path = os.path.join(root or settings.PROMPT_AUDIO_ROOT, MANIFEST)
+    try:
+        mtime = (path, os.stat(path).st_mtime_ns)
+    except FileNotFoundError:
+        return {}
+    with _manifest_lock:
+        if _manifest['mtime'] != mtime:
+            with open(path, encoding='utf-8') as manifest:
+                _manifest['entries'] = json.load(manifest)
+            _manifest['mtime'] = mtime
+        return _manifest['entries']
+
+
+def _write_atomic(path, content):
+    """Write a file so readers see the old or the new content, never a partial one"""
+    directory = os.path.dirname(path)
+    descriptor, temporary = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(descriptor, 'wb') as output:
+            output.write(content)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def prompt_url(text, voice, root=None):
+    """The URL of a rendered prompt, or None while it has not been rendered"""
+    synthesizer = get_synthesizer()
+    if synthesizer is None:
+        return None
+    root = root or settings.PROMPT_AUDIO_ROOT
+    name = read_manifest(root).get(prompt_key(synthesizer, text, voice))
+    # Only point calls at audio this server can actually serve
+    if name is None or not os.path.exists(os.path.join(root, name)):
+        return None
+    return f"{settings.PUBLIC_URL}{settings.PROMPT_AUDIO_URL}{name}"
+
+
+def render_prompts(texts, voice, synthesizer=None, root=None):
+    """
+    Render every prompt not rendered yet and record it in the manifest.
+
+    Audio is stored under a hash of its content, so the files can be served
+    with far-future cache headers. Returns the number of prompts rendered.
+    """
+    synthesizer = synthesizer or get_synthesizer()
+    if synthesizer is None:
+        return 0
+    root = root or settings.PROMPT_AUDIO_ROOT
+    os.makedirs(root, exist_ok=True)
+
+    manifest = dict(read_manifest(root))
+    rendered = 0
+    for text in dict.fromkeys(texts):
+        key = prompt_key(synthesizer, text, voice)
+        if key in manifest and os.path.exists(os.path.join(root, manifest[key])):
+            continue
+        audio = synthesizer.synthesize(text, voice)
+        name = f"{hashlib.sha256(audio).hexdigest()[:32]}.{synthesizer.extension}"
+        _write_atomic(os.path.join(root, name), audio)
+        manifest[key] = name
+        rendered += 1
+
+    if rendered:
+        # Renders run from one release step or command at a time, the last writer's manifest wins
+        _write_atomic(os.path.join(root, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return rendered
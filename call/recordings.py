@@ -0,0 +1,164 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from django.conf import settings
+from pathlib import Path
+from .telephony import get_provider
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+RECORDING_SID = re.compile(r'^RE[0-9a-fA-F]{32}$')
+# Other workers add files too, so a download sweeps the directory again once this many seconds passed
+SWEEP_INTERVAL = 60
+
+# recording_sid: [lock, threads holding or waiting for it]
+_fetch_locks = {}
+_fetch_locks_lock = threading.Lock()
+# directory: (bytes cached as last counted plus this process's downloads since, time.monotonic() of the count)
+_cache_sizes = {}
+_cache_sizes_lock = threading.Lock()
+
+
+@contextmanager
+def _fetch_lock(recording_sid):
+    """Hold the recording's lock; it is dropped once no thread holds or waits for it"""
+    with _fetch_locks_lock:
+        entry = _fetch_locks.setdefault(recording_sid, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _fetch_locks_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _fetch_locks[recording_sid]
+
+
+class RecordingCache:
+    """
+    On-disk cache of recording audio, evicted least recently played first.
+
+    Files are written to a temporary name and renamed into place, so readers
+    never see a partial file and every worker process can share the directory.
+    A file's mtime is when it was fetched and its atime when it was last
+    served; the atime is set explicitly so noatime mounts do not break LRU.
+    Downloads add to a running total of the cache size, and the directory is
+    only swept when that total exceeds max_bytes or SWEEP_INTERVAL passed.
+    """
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = Path(directory or settings.RECORDING_CACHE_DIR)
+        self.max_bytes = settings.RECORDING_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+
+    def path(self, recording_sid):
+        return self.directory / f"{recording_sid}.mp3"
+
+    def get(self, recording_sid):
+        """Return the cached file's path and mark it recently used, or None on a miss"""
+        path = self.path(recording_sid)
+        try:
+            stat = path.stat()
+            os.utime(path, (time.time(), stat.st_mtime))
+        except FileNotFoundError:
+            return None
+        return path
+
+    def fetch(self, recording_sid, provider=None):
+        """Return the cached file's path, downloading it from the telephony provider on a miss"""
+        path = self.get(recording_sid)
+        if path:
+            return path
+        # One download per recording per process, later callers wait for it
+        with _fetch_lock(recording_sid):
+            path = self.get(recording_sid)
+            if path:
+                return path
+            size = self._download(recording_sid, provider or get_provider())
+        self._added(recording_sid, size)
+        return self.path(recording_sid)
+
+    def open(self, recording_sid, provider=None, attempts=2):
+        """
+        Open the cached file for reading, downloading it on a miss.
+
+        Another worker's eviction can delete the file between finding and
+        opening it; it is then downloaded again. Once open, the file stays
+        readable even if it is evicted while being served.
+        """
+        for attempt in range(attempts):
+            path = self.fetch(recording_sid, provider)
+            try:
+                return open(path, 'rb')
+            except FileNotFoundError:
+                if attempt + 1 == attempts:
+                    raise
+                logger.info(f"Recording {recording_sid} was evicted before it was opened, fetching it again")
+
+    def _download(self, recording_sid, provider):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=self.directory, suffix='.part', delete=False) as file:
+            try:
+                provider.download_recording(recording_sid, file)
+            except BaseException:
+                os.unlink(file.name)
+                raise
+        size = os.path.getsize(file.name)
+        os.replace(file.name, self.path(recording_sid))
+        logger.info(f"Cached recording {recording_sid}")
+        return size
+
+    def _added(self, recording_sid, size):
+        """Count a download towards the cache size, evicting once it may no longer fit"""
+        with _cache_sizes_lock:
+            total, counted_at = _cache_sizes.get(self.directory, (None, 0.0))
+            if (total is not None and total + size <= self.max_bytes
+                    and time.monotonic() - counted_at < SWEEP_INTERVAL):
+                _cache_sizes[self.directory] = (total + size, counted_at)
+                return
+        self.evict(keep=recording_sid)
+
+    def evict(self, keep=None):
+        """Delete least recently used recordings, except ``keep``, until the cache fits in max_bytes"""
+        entries, total = [], 0
+        for path in self.directory.glob('RE*.mp3'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            total += stat.st_size
+            if path.stem != keep:
+                entries.append((stat.st_atime, stat.st_size, path))
+        evicted = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            evicted += 1
+        with _cache_sizes_lock:
+            _cache_sizes[self.directory] = (total, time.monotonic())
+        return evicted
+
+
+def prefetch_recordings(recording_sids, cache=None, provider=None, workers=4):
+    """Download recordings not yet cached on a few threads; returns how many were fetched"""
+    cache = cache or RecordingCache()
+    provider = provider or get_provider()
+    missing = [sid for sid in recording_sids if not cache.path(sid).exists()]
+
+    def fetch(recording_sid):
+        try:
+            cache.fetch(recording_sid, provider)
+            return True
+        except Exception as e:
+            logger.error(f"Error caching recording {recording_sid}: {str(e)}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return sum(executor.map(fetch, missing))
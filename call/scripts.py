@@ -0,0 +1,59 @@
+from django.db import transaction
+from django.db.models import Max
+from .models import InterviewScript
+from .telephony import MAX_RECORDING_SECONDS, TRIM, VOICE
+
+TRIM_OPTIONS = [value for value, _ in InterviewScript._meta.get_field('trim').choices]
+
+
+def publish_script(name, questions, voice=VOICE, max_length=MAX_RECORDING_SECONDS, trim=TRIM):
+    """
+    Publish the next version of a script and make it the one new calls pick.
+
+    Calls already placed keep asking the version they were placed with, so
+    nothing in flight changes under them. Returns the new version.
+    """
+    questions = [question.strip() for question in questions if question.strip()]
+    if not questions:
+        raise ValueError('An interview script needs at least one question')
+    if trim not in TRIM_OPTIONS:
+        raise ValueError(f"trim must be one of {', '.join(TRIM_OPTIONS)}")
+    if max_length < 1:
+        raise ValueError('max_length must be at least one second')
+
+    with transaction.atomic():
+        # A concurrent publish of the same name fails on the (name, version) constraint instead of racing
+        latest = InterviewScript.objects.filter(name=name).aggregate(version=Max('version'))['version']
+        InterviewScript.objects.filter(name=name, is_current=True).update(is_current=False)
+        return InterviewScript.objects.create(
+            name=name,
+            version=(latest or 0) + 1,
+            questions=questions,
+            voice=voice,
+            max_length=max_length,
+            trim=trim,
+            is_current=True
+        )
+
+
+def current_scripts():
+    """The current version of every script, for the script pickers"""
+    return list(InterviewScript.objects.filter(is_current=True).order_by('name'))
+
+
+def parse_script_id(value):
+    """
+    The script version picked in a form, or None for the built-in questions.
+
+    Raises ValueError if it names no script, so no call is placed with a
+    script that is not there.
+    """
+    if not value:
+        return None
+    try:
+        script_id = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid interview script: {value!r}") from None
+    if not InterviewScript.objects.filter(id=script_id).exists():
+        raise ValueError(f"Interview script {script_id} does not exist")
+    return script_id
@@ -0,0 +1,167 @@
+from django.db import NotSupportedError, connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+from .models import CallResponse
+import re
+
+# Control characters never occur in transcripts, so they can mark matches until the text is escaped
+MATCH_START, MATCH_END = '\x02', '\x03'
+# Stands in for the rank in cursors of pages ending past the ranked window
+OLDER = 'older'
+TERM = re.compile(r'\w+')
+# Only the newest matches are ranked, so a word in every other transcript still searches in milliseconds;
+# older matches follow them, newest first
+RANK_WINDOW = 5000
+
+# FTS5 walks a term's matches in rowid order, so the window floor costs a short index scan
+SQLITE_FLOOR = """
+    SELECT rowid FROM call_callresponse_fts WHERE call_callresponse_fts MATCH %s
+    ORDER BY rowid DESC LIMIT 1 OFFSET %s
+"""
+SQLITE_SEARCH = f"""
+    SELECT call_callresponse_fts.rowid, call_callresponse_fts.rank,
+           snippet(call_callresponse_fts, -1, '{MATCH_START}', '{MATCH_END}', '…', 16)
+    FROM call_callresponse_fts
+    WHERE call_callresponse_fts MATCH %s AND call_callresponse_fts.rowid >= %s {{after}}
+    ORDER BY call_callresponse_fts.rank, call_callresponse_fts.rowid
+    LIMIT %s
+"""
+SQLITE_OLDER = f"""
+    SELECT rowid, rank, snippet(call_callresponse_fts, -1, '{MATCH_START}', '{MATCH_END}', '…', 16)
+    FROM call_callresponse_fts
+    WHERE call_callresponse_fts MATCH %s AND rowid < %s
+    ORDER BY rowid DESC
+    LIMIT %s
+"""
+SQLITE_AFTER = """
+    AND (call_callresponse_fts.rank > %s OR (call_callresponse_fts.rank = %s AND call_callresponse_fts.rowid > %s))
+"""
+
+POSTGRES_FLOOR = """
+    SELECT id FROM call_callresponse WHERE search_vector @@ websearch_to_tsquery('english', %s)
+    ORDER BY id DESC LIMIT 1 OFFSET %s
+"""
+# Headlines are built for the page only, after the index has picked the hits
+POSTGRES_SEARCH = f"""
+    SELECT id, rank, ts_headline(
+        'english', coalesce(transcript, question), query,
+        'StartSel={MATCH_START}, StopSel={MATCH_END}, MinWords=8, MaxWords=24'
+    )
+    FROM (
+        SELECT r.id, r.transcript, r.question, query, -ts_rank_cd(r.search_vector, query) AS rank
+        FROM call_callresponse r, websearch_to_tsquery('english', %s) query
+        WHERE r.search_vector @@ query AND r.id >= %s {{after}}
+        ORDER BY rank, r.id
+        LIMIT %s
+    ) hits
+    ORDER BY rank, id
+"""
+POSTGRES_OLDER = f"""
+    SELECT id, rank, ts_headline(
+        'english', coalesce(transcript, question), query,
+        'StartSel={MATCH_START}, StopSel={MATCH_END}, MinWords=8, MaxWords=24'
+    )
+    FROM (
+        SELECT r.id, r.transcript, r.question, query, -ts_rank_cd(r.search_vector, query) AS rank
+        FROM call_callresponse r, websearch_to_tsquery('english', %s) query
+        WHERE r.search_vector @@ query AND r.id < %s
+        ORDER BY r.id DESC
+        LIMIT %s
+    ) hits
+    ORDER BY id DESC
+"""
+POSTGRES_AFTER = """
+    AND (-ts_rank_cd(r.search_vector, query), r.id) > (%s, %s)
+"""
+
+
+def fts5_query(query):
+    """Quote each word of free text so FTS5 matches them all and never sees its own syntax"""
+    terms = TERM.findall(query)
+    return ' '.join(f'"{term}"' for term in terms) or None
+
+
+def highlight(snippet):
+    """Escape a snippet and wrap its marked matches in <mark>"""
+    html = escape(snippet or '').replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>')
+    return mark_safe(html)
+
+
+def parse_search_cursor(cursor):
+    """
+    The (rank, id, window floor) a search page ends at, or None for the first page.
+
+    The rank is None once the page ends among the older matches past the window.
+    """
+    try:
+        rank, response_id, floor = cursor.split('|')
+        return None if rank == OLDER else float(rank), int(response_id), int(floor)
+    except (AttributeError, ValueError):
+        return None
+
+
+def search_responses(query, limit=20, cursor=None, window=RANK_WINDOW):
+    """
+    Find responses whose transcript or question match ``query``, best first.
+
+    Uses the FTS5 table on SQLite and the tsvector column on Postgres, see
+    migration 0015. Relevance is ranked among the newest ``window`` matches;
+    the oldest id in that window is fixed by the first page and carried in
+    the cursor, so new calls do not shift later pages. Matches older than
+    the window follow the ranked ones, newest first. Returns the page of
+    CallResponse objects, each with a ``snippet`` of highlighted HTML and
+    whether it was ``ranked``, and the cursor of the next page. Ranked pages
+    are keyset-paginated on (rank, id), lower ranks being better matches,
+    and older ones on id.
+    """
+    if connection.vendor == 'sqlite':
+        match = fts5_query(query)
+        if match is None:
+            return [], None
+        floor_sql, sql, after, older_sql = SQLITE_FLOOR, SQLITE_SEARCH, SQLITE_AFTER, SQLITE_OLDER
+        after_params = [cursor[0], cursor[0], cursor[1]] if cursor else []
+    elif connection.vendor == 'postgresql':
+        match = query
+        floor_sql, sql, after, older_sql = POSTGRES_FLOOR, POSTGRES_SEARCH, POSTGRES_AFTER, POSTGRES_OLDER
+        after_params = [cursor[0], cursor[1]] if cursor else []
+    else:
+        raise NotSupportedError(f"Transcript search is not available on {connection.vendor}")
+
+    ranked = cursor is None or cursor[0] is not None
+    with connection.cursor() as db_cursor:
+        if cursor:
+            floor = cursor[2]
+        else:
+            db_cursor.execute(floor_sql, [match, window - 1])
+            row = db_cursor.fetchone()
+            floor = row[0] if row else 0
+        rows = []
+        if ranked:
+            db_cursor.execute(sql.format(after=after if cursor else ''), [match, floor] + after_params + [limit + 1])
+            rows = db_cursor.fetchall()
+        older = []
+        if len(rows) <= limit and floor:
+            # The window is exhausted, so the page goes on with the matches older than it
+            db_cursor.execute(older_sql, [match, floor if ranked else cursor[1], limit + 1 - len(rows)])
+            older = db_cursor.fetchall()
+
+    page = [(row, True) for row in rows] + [(row, False) for row in older]
+    has_next = len(page) > limit
+    page = page[:limit]
+    responses = CallResponse.objects.select_related('interview').in_bulk([row[0] for row, _ in page])
+    results = []
+    for (response_id, rank, snippet), in_window in page:
+        response = responses.get(response_id)
+        if response is None:
+            # Deleted since the index was read
+            continue
+        response.rank = rank
+        response.ranked = in_window
+        response.snippet = highlight(snippet)
+        results.append(response)
+
+    next_cursor = None
+    if has_next:
+        (last_id, last_rank, _), in_window = page[-1]
+        next_cursor = f"{repr(last_rank) if in_window else OLDER}|{last_id}|{floor}"
+    return results, next_cursor
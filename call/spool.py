@@ -0,0 +1,185 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .interviews import FINAL_CALL_STATUSES
+from .models import CallResponse, CampaignNumber, Interview, WebhookEvent
+from .state import get_state_store
+from .stats import increment
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def spool_status(call_sid, call_status, duration=None, sequence=None):
+    """Buffer a status callback; a single INSERT, so bursts never wait on the rows they update"""
+    WebhookEvent.objects.create(kind='status', payload={
+        'call_sid': call_sid, 'status': call_status, 'duration': duration, 'sequence': sequence
+    })
+
+
+def spool_transcription(call_sid, recording_sid, recording_url, transcript):
+    """Buffer a transcription webhook"""
+    WebhookEvent.objects.create(kind='transcription', payload={
+        'call_sid': call_sid, 'recording_sid': recording_sid, 'recording_url': recording_url, 'transcript': transcript
+    })
+
+
+def coalesce(events):
+    """
+    Reduce a batch of events to the last status per CallSid and last transcript per RecordingSid.
+
+    Twilio numbers a call's status callbacks with SequenceNumber, which orders
+    them; arrival order breaks ties. Only the final callback carries the
+    duration, so the latest duration seen is kept even if a stray callback sorts after it.
+    """
+    calls, transcriptions = {}, {}
+    for position, event in enumerate(events):
+        if event['type'] == 'status':
+            call = calls.setdefault(event['call_sid'], {'order': None, 'event': None, 'duration': None})
+            order = (event.get('sequence') or 0, position)
+            if call['order'] is None or order > call['order']:
+                call['order'], call['event'] = order, event
+            if event.get('duration') is not None:
+                call['duration'] = event['duration']
+        elif event['type'] == 'transcription':
+            transcriptions[event['recording_sid']] = event
+    statuses = [{**call['event'], 'duration': call['duration']} for call in calls.values()]
+    return statuses, list(transcriptions.values())
+
+
+def _apply_statuses(events):
+    """Apply the last status of each call; returns the CallSids that matched no interview or campaign number"""
+    by_call = {event['call_sid']: event for event in events}
+    now = timezone.now()
+
+    interviews = list(Interview.objects.select_for_update().filter(call_sid__in=by_call))
+    completed_delta = 0
+    for interview in interviews:
+        event = by_call[interview.call_sid]
+        # A late non-final callback never reopens a finished call
+        if interview.status in FINAL_CALL_STATUSES and event['status'] not in FINAL_CALL_STATUSES:
+            continue
+        completed_delta += (event['status'] == 'completed') - (interview.status == 'completed')
+        interview.status = event['status']
+        if event.get('duration') is not None:
+            interview.duration = event['duration']
+        if event['status'] in FINAL_CALL_STATUSES and interview.ended_at is None:
+            interview.ended_at = now
+        # bulk_update skips auto_now
+        interview.updated_at = now
+    Interview.objects.bulk_update(interviews, ['status', 'duration', 'ended_at', 'updated_at'])
+    increment(completed_calls=completed_delta)
+
+    # Free the campaign's live call slot once the call is over
+    numbers = list(CampaignNumber.objects.filter(call_sid__in=by_call))
+    for number in numbers:
+        call_status = by_call[number.call_sid]['status']
+        number.call_status = call_status
+        if call_status in FINAL_CALL_STATUSES:
+            number.status = FINAL_CALL_STATUSES[call_status]
+        number.updated_at = now
+    CampaignNumber.objects.bulk_update(numbers, ['call_status', 'status', 'updated_at'])
+
+    store = get_state_store()
+    for call_sid, event in by_call.items():
+        if event['status'] in FINAL_CALL_STATUSES:
+            store.delete(call_sid)
+    return set(by_call) - {interview.call_sid for interview in interviews} - {number.call_sid for number in numbers}
+
+
+def _apply_transcriptions(events):
+    by_recording = {event['recording_sid']: event for event in events}
+    now = timezone.now()
+
+    responses = list(CallResponse.objects.select_for_update().filter(recording_sid__in=by_recording))
+    completed = 0
+    for response in responses:
+        completed += response.transcript_status != 'completed'
+        response.transcript = by_recording[response.recording_sid]['transcript']
+        response.transcript_status = 'completed'
+        response.updated_at = now
+    CallResponse.objects.bulk_update(responses, ['transcript', 'transcript_status', 'updated_at'])
+
+    # Transcripts for recordings the voice webhook never saw get a response of their own
+    known = {response.recording_sid for response in responses}
+    missing = [event for recording_sid, event in by_recording.items() if recording_sid not in known]
+    interviews = dict(
+        Interview.objects.filter(call_sid__in={event['call_sid'] for event in missing}).values_list('call_sid', 'id')
+    )
+    CallResponse.objects.bulk_create([
+        CallResponse(
+            interview_id=interviews.get(event['call_sid']),
+            call_sid=event['call_sid'],
+            phone_number=event['call_sid'],  # Using call_sid temporarily
+            question='Auto-transcribed response',
+            recording_sid=event['recording_sid'],
+            recording_url=event['recording_url'],
+            transcript=event['transcript'],
+            transcript_status='completed'
+        )
+        for event in missing
+    ])
+    increment(total_responses=len(missing), completed_transcripts=completed + len(missing))
+
+
+def apply_events(events):
+    """
+    Apply one batch of events; callers provide the transaction.
+
+    Returns the CallSids whose status matched no call, so the caller can
+    keep those events for a later attempt.
+    """
+    statuses, transcriptions = coalesce(events)
+    unmatched = set()
+    if statuses:
+        unmatched = _apply_statuses(statuses)
+    if transcriptions:
+        _apply_transcriptions(transcriptions)
+    return unmatched
+
+
+def flush_spool(batch_size=500, grace=None):
+    """
+    Apply buffered webhook events oldest first and return how many were applied.
+
+    Each batch is applied and deleted in one transaction, so an event is
+    applied exactly once even if the flusher dies mid-way. Concurrent flushers
+    skip rows another one has locked where the database supports it.
+
+    A status callback can arrive before the call it belongs to is saved, by
+    make_call or the campaign dialer. Such events stay spooled and are retried
+    by later flushes for ``grace`` seconds (WEBHOOK_UNMATCHED_GRACE), together
+    with any later events of the same call so they still apply in order.
+    """
+    grace = settings.WEBHOOK_UNMATCHED_GRACE if grace is None else grace
+    flushed, after, held_calls = 0, 0, set()
+    while True:
+        with transaction.atomic():
+            batch = list(
+                WebhookEvent.objects.select_for_update(skip_locked=True).filter(id__gt=after).order_by('id')[:batch_size]
+            )
+            if batch:
+                after = batch[-1].id
+                # Later events of a call held earlier in this flush wait with it
+                waiting = {
+                    event.id for event in batch if event.kind == 'status' and event.payload['call_sid'] in held_calls
+                }
+                applying = [event for event in batch if event.id not in waiting]
+                unmatched = apply_events([{'type': event.kind, **event.payload} for event in applying])
+
+                cutoff = timezone.now() - timedelta(seconds=grace)
+                held, dropped = set(waiting), 0
+                for event in applying:
+                    if event.kind != 'status' or event.payload['call_sid'] not in unmatched:
+                        continue
+                    if event.created_at >= cutoff:
+                        held.add(event.id)
+                        held_calls.add(event.payload['call_sid'])
+                    else:
+                        dropped += 1
+                        logger.warning(f"Dropping {event.payload['status']} status for unknown call {event.payload['call_sid']}")
+                WebhookEvent.objects.filter(id__in=[event.id for event in batch if event.id not in held]).delete()
+                flushed += len(batch) - len(held) - dropped
+        if len(batch) < batch_size:
+            return flushed
@@ -0,0 +1,134 @@
+from collections import OrderedDict
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from datetime import timedelta
+from itertools import count
+from .models import CallState
+import threading
+import time
+
+_store = None
+_store_lock = threading.Lock()
+
+
+class LocalStateStore:
+    """
+    In-process LRU of interview state, for a single worker process.
+
+    Entries expire ``ttl`` seconds after their last write and the least
+    recently used entry is evicted beyond ``max_entries``. Every write gets a
+    fresh version number, so a compare-and-set against a stale read fails.
+    """
+
+    def __init__(self, ttl=None, max_entries=None, clock=time.monotonic):
+        self.ttl = ttl or settings.INTERVIEW_STATE_TTL
+        self.max_entries = max_entries or settings.INTERVIEW_STATE_MAX_ENTRIES
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.versions = count(1)
+        self.lock = threading.Lock()
+
+    def _live_entry(self, call_sid):
+        entry = self.entries.get(call_sid)
+        if entry is None:
+            return None
+        if entry['expires_at'] <= self.clock():
+            del self.entries[call_sid]
+            return None
+        self.entries.move_to_end(call_sid)
+        return entry
+
+    def get(self, call_sid):
+        with self.lock:
+            entry = self._live_entry(call_sid)
+            if entry is None:
+                return None
+            return {key: value for key, value in entry.items() if key != 'expires_at'}
+
+    def compare_and_set(self, call_sid, version, question_index, response_id):
+        with self.lock:
+            entry = self._live_entry(call_sid)
+            if (entry['version'] if entry else None) != version:
+                return False
+            self.entries[call_sid] = {
+                'question_index': question_index,
+                'response_id': response_id,
+                'version': next(self.versions),
+                'expires_at': self.clock() + self.ttl,
+            }
+            self.entries.move_to_end(call_sid)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            return True
+
+    def delete(self, call_sid):
+        with self.lock:
+            self.entries.pop(call_sid, None)
+
+
+class DatabaseStateStore:
+    """
+    Interview state in the CallState table, shared by every worker process.
+
+    compare_and_set is a single UPDATE guarded by the version read earlier, so
+    of two concurrent writers only one matches a row. Expired rows read as
+    missing and are taken over by the next write.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl or settings.INTERVIEW_STATE_TTL
+
+    def get(self, call_sid):
+        return (
+            CallState.objects
+            .filter(call_sid=call_sid, expires_at__gt=timezone.now())
+            .values('question_index', 'response_id', 'version')
+            .first()
+        )
+
+    def compare_and_set(self, call_sid, version, question_index, response_id):
+        now = timezone.now()
+        fields = {
+            'question_index': question_index,
+            'response_id': response_id,
+            'expires_at': now + timedelta(seconds=self.ttl),
+        }
+        if version is not None:
+            return bool(
+                CallState.objects
+                .filter(call_sid=call_sid, version=version, expires_at__gt=now)
+                .update(version=version + 1, **fields)
+            )
+
+        # Expecting no state: take over an expired row, or insert a new one
+        if CallState.objects.filter(call_sid=call_sid, expires_at__lte=now).update(version=F('version') + 1, **fields):
+            return True
+        try:
+            with transaction.atomic():
+                CallState.objects.create(call_sid=call_sid, version=1, **fields)
+        except IntegrityError:
+            return False
+        return True
+
+    def delete(self, call_sid):
+        CallState.objects.filter(call_sid=call_sid).delete()
+
+
+def get_state_store():
+    """Return the process-wide interview state store configured by INTERVIEW_STATE_BACKEND"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = import_string(settings.INTERVIEW_STATE_BACKEND)()
+    return _store
+
+
+def reset_state_store():
+    """Drop the shared store, e.g. after changing the backend in tests"""
+    global _store
+    with _store_lock:
+        _store = None
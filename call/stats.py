@@ -0,0 +1,84 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CallResponse, DashboardCounter, Interview
+
+# Dashboard statistics and the from-scratch query each counter must agree with
+COUNTERS = {
+    'total_calls': lambda: Interview.objects.count(),
+    'completed_calls': lambda: Interview.objects.filter(status='completed').count(),
+    'total_responses': lambda: CallResponse.objects.count(),
+    'completed_transcripts': lambda: CallResponse.objects.filter(transcript_status='completed').count(),
+}
+# Rows moved to the archive are noted in counters under this prefix, so recounts still include them
+ARCHIVED = 'archived_'
+# Counts every call and response row deleted, archived ones included; bumped by triggers, see migration 0019
+REMOVED = 'removed_rows'
+
+
+def count_stats():
+    """Compute every statistic with a full aggregate query, plus what has been archived"""
+    archived = dict(
+        DashboardCounter.objects.filter(name__in=[ARCHIVED + name for name in COUNTERS]).values_list('name', 'value')
+    )
+    return {name: count() + archived.get(ARCHIVED + name, 0) for name, count in COUNTERS.items()}
+
+
+def increment(**deltas):
+    """
+    Adjust counters by the given deltas, e.g. increment(total_calls=1).
+
+    Call this inside the transaction that makes the matching change so the
+    counters commit or roll back with it. A missing counter row triggers a
+    recompute, which already sees the change.
+    """
+    now = timezone.now()
+    for name, delta in deltas.items():
+        if not delta:
+            continue
+        updated = DashboardCounter.objects.filter(name=name).update(value=F('value') + delta, updated_at=now)
+        if not updated:
+            recompute_stats()
+            return
+
+
+def record_archived(**counts):
+    """
+    Note rows moved out of the database, e.g. record_archived(total_calls=3).
+
+    Call this inside the transaction that deletes them. The dashboard
+    counters themselves stay as they are, archived calls still happened.
+    """
+    now = timezone.now()
+    for name, count in counts.items():
+        if not count:
+            continue
+        counter, _ = DashboardCounter.objects.get_or_create(name=ARCHIVED + name, defaults={'updated_at': now})
+        DashboardCounter.objects.filter(id=counter.id).update(value=F('value') + count, updated_at=now)
+
+
+def read_stats():
+    """Return the dashboard statistics from the counter rows in one small query"""
+    stats = dict(DashboardCounter.objects.filter(name__in=COUNTERS).values_list('name', 'value'))
+    if stats.keys() != COUNTERS.keys():
+        return recompute_stats()[0]
+    return stats
+
+
+def recompute_stats():
+    """
+    Recount every statistic from scratch and store it, correcting any drift.
+
+    The counter rows are locked for the duration so concurrent increments wait
+    for the recount instead of being overwritten by it. Returns the fresh
+    counts and the drift found per counter.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        stored = dict(DashboardCounter.objects.select_for_update().values_list('name', 'value'))
+        counts = count_stats()
+        for name, value in counts.items():
+            DashboardCounter.objects.update_or_create(name=name, defaults={'value': value, 'updated_at': now})
+    drift = {name: value - stored.get(name, 0) for name, value in counts.items() if value != stored.get(name, 0)}
+    return counts, drift
@@ -0,0 +1,329 @@
+from asgiref.sync import sync_to_async
+from collections import namedtuple
+from django.conf import settings
+from django.utils.module_loading import import_string
+from itertools import count
+from twilio.base.exceptions import TwilioRestException
+from twilio.twiml.voice_response import VoiceResponse
+from xml.sax.saxutils import escape, quoteattr
+from .twilio_client import _rebase_url, get_async_client, get_client
+import asyncio
+import random
+import requests
+import threading
+import time
+
+CHUNK_SIZE = 64 * 1024
+STATUS_CALLBACK_EVENTS = ['initiated', 'ringing', 'answered', 'completed']
+# How questions are asked and answers recorded unless an interview script says otherwise
+VOICE = 'Polly.Amy'
+MAX_RECORDING_SECONDS = 30
+TRIM = 'trim-silence'
+
+_provider = None
+_provider_lock = threading.Lock()
+
+# A call as the provider reports it; duration is in seconds once the call has ended
+Call = namedtuple('Call', ['sid', 'status', 'duration'], defaults=[None])
+
+
+class TelephonyError(Exception):
+    """A provider request failed; ``status`` is the HTTP status where there is one, e.g. 429 when rate limited"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class TelephonyProvider:
+    """
+    What the app needs from a voice API.
+
+    Place calls that fetch their instructions from ``answer_url`` and report
+    progress to ``status_callback``, look calls up, fetch recordings and
+    their transcripts, and render the voice markup the webhooks answer with.
+    Requests raise TelephonyError when the provider refuses them.
+    """
+
+    def configuration_error(self):
+        """Why the provider cannot be used with the current settings, or None"""
+        return None
+
+    def create_call(self, phone_number, answer_url, status_callback):
+        raise NotImplementedError
+
+    async def create_call_async(self, phone_number, answer_url, status_callback):
+        return await sync_to_async(self.create_call, thread_sensitive=False)(phone_number, answer_url, status_callback)
+
+    def fetch_call(self, call_sid):
+        raise NotImplementedError
+
+    def fetch_transcript(self, recording_sid):
+        """The transcript text of a recording, or None if it is not ready yet"""
+        raise NotImplementedError
+
+    def download_recording(self, recording_sid, file):
+        """Write a recording's MP3 audio to a binary file object"""
+        raise NotImplementedError
+
+    def question_markup(self, question, action_url, voice=VOICE, max_length=MAX_RECORDING_SECONDS, trim=TRIM,
+                        audio_url=None):
+        """
+        Markup that asks ``question`` in ``voice`` and posts the recorded answer to ``action_url``.
+
+        Plays ``audio_url`` instead of speaking the text when the question
+        was rendered to audio. Answers are cut off after ``max_length``
+        seconds; ``trim`` is 'trim-silence' or 'do-not-trim'.
+        """
+        raise NotImplementedError
+
+    def say_markup(self, message, voice=VOICE, audio_url=None):
+        """Markup that says ``message``, or plays its rendered ``audio_url``, and hangs up"""
+        raise NotImplementedError
+
+
+def recording_media_url(recording_sid):
+    """The MP3 audio of a Twilio recording, rather than its REST resource"""
+    return f"https://api.twilio.com/2010-04-01/Accounts/{settings.TWILIO_ACCOUNT_SID}/Recordings/{recording_sid}.mp3"
+
+
+class TwilioProvider(TelephonyProvider):
+    """
+    Twilio's REST API and TwiML.
+
+    Uses the pooled process-wide clients from twilio_client.py unless given
+    a ``client``, which then serves both sync and async requests.
+    """
+
+    def __init__(self, client=None):
+        self._client = client
+
+    @property
+    def client(self):
+        return self._client or get_client()
+
+    def configuration_error(self):
+        if self._client is None and (not settings.TWILIO_ACCOUNT_SID or not settings.TWILIO_AUTH_TOKEN):
+            return 'Twilio credentials not found in settings'
+        return None
+
+    def _call_params(self, phone_number, answer_url, status_callback):
+        return {
+            'to': phone_number,
+            'from_': settings.TWILIO_PHONE_NUMBER,
+            'url': answer_url,
+            'record': True,
+            'status_callback': status_callback,
+            'status_callback_event': STATUS_CALLBACK_EVENTS,
+        }
+
+    def create_call(self, phone_number, answer_url, status_callback):
+        try:
+            call = self.client.calls.create(**self._call_params(phone_number, answer_url, status_callback))
+        except TwilioRestException as e:
+            raise TelephonyError(str(e), status=e.status) from e
+        return Call(call.sid, call.status)
+
+    async def create_call_async(self, phone_number, answer_url, status_callback):
+        client = self._client or get_async_client()
+        try:
+            call = await client.calls.create_async(**self._call_params(phone_number, answer_url, status_callback))
+        except TwilioRestException as e:
+            raise TelephonyError(str(e), status=e.status) from e
+        return Call(call.sid, call.status)
+
+    def fetch_call(self, call_sid):
+        try:
+            call = self.client.calls(call_sid).fetch()
+        except TwilioRestException as e:
+            raise TelephonyError(str(e), status=e.status) from e
+        return Call(call.sid, call.status, int(call.duration) if call.duration else None)
+
+    def fetch_transcript(self, recording_sid):
+        try:
+            transcripts = self.client.transcriptions.list(recording_sid=recording_sid, limit=1)
+        except TwilioRestException as e:
+            raise TelephonyError(str(e), status=e.status) from e
+        except requests.RequestException as e:
+            raise TelephonyError(f"Transcript of {recording_sid} failed: {e}") from e
+        if transcripts:
+            return transcripts[0].transcription_text
+        return None
+
+    def download_recording(self, recording_sid, file):
+        # recording_url may be the REST resource (.json) or have no extension, ask for the MP3
+        url = recording_media_url(recording_sid)
+        http_client = self.client.http_client
+        try:
+            response = http_client.session.get(
+                _rebase_url(url, http_client.base_url),
+                auth=(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN),
+                timeout=http_client.timeout,
+                stream=True
+            )
+            with response:
+                if response.status_code >= 400:
+                    raise TelephonyError(f"Recording {recording_sid} returned {response.status_code}", response.status_code)
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    file.write(chunk)
+        except requests.RequestException as e:
+            raise TelephonyError(f"Recording {recording_sid} failed: {e}") from e
+
+    def question_markup(self, question, action_url, voice=VOICE, max_length=MAX_RECORDING_SECONDS, trim=TRIM,
+                        audio_url=None):
+        resp = VoiceResponse()
+
+        # Add a short pause before asking the question
+        resp.pause(length=0.5)
+
+        # Ask the question, from pre-rendered audio when there is some
+        if audio_url:
+            resp.play(audio_url)
+        else:
+            resp.say(question, voice=voice)
+
+        # Add a short pause after the question
+        resp.pause(length=0.5)
+
+        # Record the response
+        resp.record(
+            action=action_url,
+            maxLength=str(max_length),
+            playBeep=False,
+            trim=trim
+        )
+        return str(resp)
+
+    def say_markup(self, message, voice=VOICE, audio_url=None):
+        resp = VoiceResponse()
+        if audio_url:
+            resp.play(audio_url)
+        else:
+            resp.say(message, voice=voice)
+        return str(resp)
+
+
+class FakeProvider(TelephonyProvider):
+    """
+    Deterministic in-process provider for tests and offline load tests.
+
+    Calls get sequential SIDs and progress on ``clock``: answered
+    ``ring_seconds`` after they are placed and completed ``call_seconds``
+    later. A recording's transcript is ready ``transcript_delay`` seconds
+    after it is first asked for. Every request takes ``latency`` seconds and
+    fails with probability ``failure_rate``, drawn from a generator seeded
+    with ``seed``. Markup is TwiML, so the webhooks answer as with Twilio.
+    """
+
+    AUDIO = b'ID3' + bytes(range(256)) * 64
+
+    def __init__(self, latency=None, failure_rate=None, transcript_delay=None, ring_seconds=5, call_seconds=60,
+                 seed=0, clock=time.monotonic, sleep=time.sleep):
+        self.latency = settings.FAKE_TELEPHONY_LATENCY if latency is None else latency
+        self.failure_rate = settings.FAKE_TELEPHONY_FAILURE_RATE if failure_rate is None else failure_rate
+        self.transcript_delay = (
+            settings.FAKE_TELEPHONY_TRANSCRIPT_DELAY if transcript_delay is None else transcript_delay
+        )
+        self.ring_seconds = ring_seconds
+        self.call_seconds = call_seconds
+        self.rng = random.Random(seed)
+        self.clock = clock
+        self.sleep = sleep
+        self.sids = count(1)
+        self.calls = {}
+        self.transcripts_requested = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def _fails(self):
+        with self.lock:
+            self.requests += 1
+            return self.rng.random() < self.failure_rate
+
+    def _request(self):
+        failed = self._fails()
+        if self.latency:
+            self.sleep(self.latency)
+        if failed:
+            raise TelephonyError('Simulated provider failure', status=500)
+
+    def _place(self, phone_number):
+        with self.lock:
+            sid = f"CA{next(self.sids):032x}"
+            self.calls[sid] = (phone_number, self.clock())
+        return Call(sid, 'queued')
+
+    def create_call(self, phone_number, answer_url, status_callback):
+        self._request()
+        return self._place(phone_number)
+
+    async def create_call_async(self, phone_number, answer_url, status_callback):
+        failed = self._fails()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if failed:
+            raise TelephonyError('Simulated provider failure', status=500)
+        return self._place(phone_number)
+
+    def fetch_call(self, call_sid):
+        self._request()
+        try:
+            phone_number, placed_at = self.calls[call_sid]
+        except KeyError:
+            raise TelephonyError(f"Call {call_sid} not found", status=404) from None
+        elapsed = self.clock() - placed_at
+        if elapsed < self.ring_seconds:
+            return Call(call_sid, 'ringing')
+        if elapsed < self.ring_seconds + self.call_seconds:
+            return Call(call_sid, 'in-progress')
+        return Call(call_sid, 'completed', self.call_seconds)
+
+    def fetch_transcript(self, recording_sid):
+        self._request()
+        now = self.clock()
+        with self.lock:
+            first_asked = self.transcripts_requested.setdefault(recording_sid, now)
+        if now - first_asked < self.transcript_delay:
+            return None
+        return f"Simulated transcript of {recording_sid}"
+
+    def download_recording(self, recording_sid, file):
+        self._request()
+        file.write(self.AUDIO)
+
+    def _speak(self, text, voice, audio_url):
+        if audio_url:
+            return f'<Play>{escape(audio_url)}</Play>'
+        return f'<Say voice={quoteattr(voice)}>{escape(text)}</Say>'
+
+    def question_markup(self, question, action_url, voice=VOICE, max_length=MAX_RECORDING_SECONDS, trim=TRIM,
+                        audio_url=None):
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?><Response><Pause length="0.5" />'
+            f'{self._speak(question, voice, audio_url)}<Pause length="0.5" />'
+            f'<Record action={quoteattr(action_url)} maxLength="{int(max_length)}" playBeep="false" '
+            f'trim={quoteattr(trim)} /></Response>'
+        )
+
+    def say_markup(self, message, voice=VOICE, audio_url=None):
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?><Response>'
+            f'{self._speak(message, voice, audio_url)}</Response>'
+        )
+
+
+def get_provider():
+    """Return the process-wide telephony provider configured by TELEPHONY_PROVIDER"""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = import_string(settings.TELEPHONY_PROVIDER)()
+    return _provider
+
+
+def reset_provider():
+    """Drop the shared provider, e.g. after changing the backend in tests"""
+    global _provider
+    with _provider_lock:
+        _provider = None
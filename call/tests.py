@@ -1,3 +1,1874 @@
-from django.test import TestCase
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import random
+import re
+import requests
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from contextlib import contextmanager
+from itertools import count
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import BytesIO, StringIO
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import Workbook, load_workbook
+from twilio.base.exceptions import TwilioRestException
+
+from hr_team.database import database_config
+
+from .analytics import analytics_version, get_analytics
+from .api import removal_stamp
+from .archive import archive_batch, read_archive, write_partitions
+from .dialer import CampaignDialer, TokenBucket, record_call
+from .events import RESYNC, ChangeFeed, catch_up, change_events, event_stream
+from .loadtest import InProcessTransport, LoadTest, QueryCounter
+from .metrics import REQUEST_DB_QUERIES, REQUEST_SECONDS, TWILIO_SECONDS, Histogram
+from .models import (
+    CallResponse, CallState, Campaign, CampaignNumber, DashboardCounter, Interview, InterviewScript, WebhookEvent,
+)
+from .prompts import get_synthesizer, render_prompts, reset_synthesizer
+from .recordings import RecordingCache, _fetch_locks
+from .scripts import current_scripts, publish_script
+from .search import parse_search_cursor, search_responses
+from .spool import coalesce, flush_spool
+from .state import DatabaseStateStore, LocalStateStore, get_state_store, reset_state_store
+from .stats import count_stats, read_stats, recompute_stats
+from .telephony import FakeProvider, TelephonyError, TwilioProvider, get_provider, reset_provider
+from .transcripts import backoff_delay, pending_responses, reconcile_transcripts
+from .twilio_import import OVERLAP, get_watermark
+from .twilio_client import close_async_client, get_client, reset_client
+from .twilio_stub import StubTwilioServer
+from .views import _record_and_ask_next
+from .twiml import (
+    INTERVIEW_QUESTIONS, build_question_twiml, goodbye_twiml, question_twiml, render_script_prompts, script_prompts
+)
+
+
+def create_call(call_sid, started_at, questions=3, status='completed', **fields):
+    """Create the Interview and CallResponse rows a finished interview leaves behind"""
+    interview = Interview.objects.create(
+        call_sid=call_sid,
+        phone_number='+919876543210',
+        status=status,
+        answered_questions=questions,
+        created_at=started_at
+    )
+    return [
+        CallResponse.objects.create(
+            interview=interview,
+            call_sid=call_sid,
+            phone_number=interview.phone_number,
+            question=f"Question {index}",
+            created_at=started_at + timedelta(seconds=index),
+            **fields
+        )
+        for index in range(questions)
+    ]
+
+
+# EXPLAIN QUERY PLAN reports a full table scan as "SCAN <table>", or "SCAN <table> USING [COVERING] INDEX <index>"
+# when it walks every entry of an index; a covering index spares reading the table, not the walk.
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: USING (?:COVERING )?INDEX (?P<index>\w+))?$')
+# WHERE clauses of a query and the "table"."column" references in them
+WHERE = re.compile(r' WHERE (.*?)(?= GROUP BY | ORDER BY | LIMIT |$)', re.S)
+COLUMN = re.compile(r'"(\w+)"\."(\w+)"')
+
+
+def filtered_columns(sql, table):
+    """The columns of ``table`` a query's WHERE clauses filter on"""
+    return {column for where in WHERE.findall(sql) for name, column in COLUMN.findall(where) if name == table}
+
+
+def is_full_table_scan(step, sql, plan, tables, partial_indexes=(), index_columns=None):
+    match = FULL_SCAN.match(step)
+    if not match or match.group(1) not in tables:
+        return False
+    table, index = match.group(1), match.group('index')
+    # A partial index only holds the rows its condition matches, walking it skips the rest
+    if index in partial_indexes:
+        return False
+    # An ordered walk feeding a LIMIT stops after the first rows, as long as every row it walks
+    # past is rejected by the index itself; a plain SCAN is ordered when it walks the rowid and
+    # SQLite needs no temporary b-tree to sort it
+    ordered = index or not any('TEMP B-TREE' in other for other in plan)
+    if not (ordered and ' LIMIT ' in sql):
+        return True
+    walked = (index_columns or {}).get(index, set()) if index else {'id'}
+    return not filtered_columns(sql, table) <= walked
+
+
+def full_table_scans(queries):
+    """Run EXPLAIN QUERY PLAN for each captured SQLite query and return those that scan a whole table"""
+    tables = set(connection.introspection.table_names())
+    with connection.cursor() as cursor:
+        partial_indexes, index_columns = set(), {}
+        for table in tables:
+            cursor.execute(f'PRAGMA index_list("{table}")')
+            indexes = cursor.fetchall()
+            partial_indexes.update(row[1] for row in indexes if row[4])
+            for row in indexes:
+                cursor.execute(f'PRAGMA index_info("{row[1]}")')
+                index_columns[row[1]] = {column[2] for column in cursor.fetchall()}
+    scans = []
+    for query in queries:
+        sql = query['sql']
+        if not sql.startswith(('SELECT', 'UPDATE', 'DELETE')):
+            continue
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            plan = [row[-1] for row in cursor.fetchall()]
+        if any(is_full_table_scan(step, sql, plan, tables, partial_indexes, index_columns) for step in plan):
+            scans.append((sql, plan))
+    return scans
+
+
+class QueryPlanMixin:
+    @contextmanager
+    def assertNoFullTableScans(self):
+        """Fail if any query run inside the block falls back to a full table scan"""
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN checks are SQLite specific')
+        with CaptureQueriesContext(connection) as context:
+            yield
+        scans = full_table_scans(context.captured_queries)
+        self.assertFalse(scans, '\n'.join(f"{sql}\n    {plan}" for sql, plan in scans))
+
+
+@override_settings(DASHBOARD_PAGE_SIZE=5)
+class DashboardTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user('hr', password='secret')
+        self.client.force_login(user)
+        self.now = timezone.now()
+
+    def create_calls(self, count, offset=0):
+        for index in range(offset, offset + count):
+            create_call(f"CA{index:032d}", self.now - timedelta(minutes=index))
+
+    def test_query_count_is_independent_of_call_count(self):
+        self.create_calls(3)
+        # Session, user, the page, its responses, the statistics and the script picker
+        with self.assertNumQueries(6):
+            self.client.get(reverse('dashboard'))
+
+        self.create_calls(40, offset=3)
+        with self.assertNumQueries(6):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(len(response.context['call_records']), 5)
+
+    def test_never_calls_twilio(self):
+        create_call('CA1', self.now, questions=1, recording_sid='RE1', transcript=None)
+        with mock.patch('call.views.get_client', side_effect=AssertionError('Twilio called')):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_keyset_pagination_walks_every_call_once(self):
+        self.create_calls(12)
+        seen = []
+        url = reverse('dashboard')
+        while url:
+            response = self.client.get(url)
+            seen.extend(call.call_sid for call in response.context['call_records'])
+            cursor = response.context['next_cursor']
+            url = f"{reverse('dashboard')}?{urlencode({'cursor': cursor})}" if cursor else None
+        self.assertEqual(seen, [f"CA{index:032d}" for index in range(12)])
+
+    def test_groups_responses_and_statistics(self):
+        create_call('CA1', self.now, questions=4, transcript_status='completed')
+        create_call('CA2', self.now - timedelta(hours=1), questions=2, status='in-progress')
+        # The rows above bypass the webhooks, so bring the counters up to date first
+        recompute_stats()
+        response = self.client.get(reverse('dashboard'))
+
+        records = response.context['call_records']
+        self.assertEqual([call.call_sid for call in records], ['CA1', 'CA2'])
+        self.assertEqual(len(records[0].response_list), 4)
+        self.assertEqual(records[1].status, 'in-progress')
+        self.assertEqual(response.context['total_calls'], 2)
+        self.assertEqual(response.context['completed_calls'], 1)
+        self.assertEqual(response.context['total_responses'], 6)
+        self.assertEqual(response.context['completed_transcripts'], 4)
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_user('hr', password='secret'))
+        self.now = timezone.now()
+        for index in range(5):
+            create_call(f"CA{index}", self.now - timedelta(minutes=index), questions=2)
+
+    def get(self, **params):
+        return self.client.get(f"{reverse('api_calls')}?{urlencode(params)}")
+
+    def test_cursor_walks_every_call_once(self):
+        seen, params = [], {'limit': 2}
+        while True:
+            data = self.get(**params).json()
+            seen += [call['call_sid'] for call in data['calls']]
+            if not data['next_cursor']:
+                break
+            params['cursor'] = data['next_cursor']
+        self.assertEqual(seen, [f"CA{index}" for index in range(5)])
+        call = self.get(limit=1).json()['calls'][0]
+        self.assertEqual([response['question'] for response in call['responses']], ['Question 0', 'Question 1'])
+
+    def test_updated_since_returns_only_changed_calls(self):
+        since = timezone.now()
+        self.assertEqual(self.get(updated_since=since.isoformat()).json()['calls'], [])
+
+        later = since + timedelta(seconds=1)
+        CallResponse.objects.filter(call_sid='CA3').update(transcript='Hello', updated_at=later)
+        Interview.objects.filter(call_sid='CA1').update(status='failed', updated_at=later)
+        data = self.get(updated_since=since.isoformat()).json()
+        self.assertEqual([call['call_sid'] for call in data['calls']], ['CA1', 'CA3'])
+        self.assertEqual(data['next_updated_since'], (later - timedelta(seconds=5)).isoformat())
+
+    def test_unchanged_poll_is_not_modified(self):
+        with self.assertNumQueries(7):
+            # Session, user, the two last-change lookups, the removal counter, the page and its responses
+            first = self.get()
+        with self.assertNumQueries(5):
+            unchanged = self.client.get(reverse('api_calls'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(unchanged.status_code, 304)
+
+        self.client.post(reverse('transcription'), {'CallSid': 'CA2', 'RecordingSid': 'RE9', 'TranscriptionText': 'Hi'})
+        flush_spool()
+        changed = self.client.get(reverse('api_calls'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+
+    def test_deletes_and_archives_change_the_etag(self):
+        etag = self.get()['ETag']
+        CallResponse.objects.filter(call_sid='CA4').first().delete()
+        after_delete = self.client.get(reverse('api_calls'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(after_delete.status_code, 200)
+
+        # Bulk deletes and their cascades, and archive runs, are counted by the triggers too
+        Interview.objects.filter(call_sid='CA3').delete()
+        after_cascade = self.client.get(reverse('api_calls'), HTTP_IF_NONE_MATCH=after_delete['ETag'])
+        self.assertEqual(after_cascade.status_code, 200)
+        with tempfile.TemporaryDirectory() as root:
+            archive_batch(Interview.objects.filter(call_sid='CA2').values_list('id', flat=True), root=root)
+        after_archive = self.client.get(reverse('api_calls'), HTTP_IF_NONE_MATCH=after_cascade['ETag'])
+        self.assertEqual(after_archive.status_code, 200)
+        self.assertEqual(removal_stamp(), 1 + 3 + 3)
+
+    def test_requires_login_and_valid_parameters(self):
+        for params in [{'limit': 0}, {'limit': 'all'}, {'cursor': 'nope'}, {'updated_since': 'yesterday'}]:
+            self.assertEqual(self.get(**params).status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.get().status_code, 401)
+
+
+class LiveEventsTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('hr', password='secret')
+        self.now = timezone.now()
+        for index in range(3):
+            create_call(f"CA{index}", self.now - timedelta(minutes=index), questions=1)
+        # Calls made long enough ago that the feed's overlap does not re-read them
+        Interview.objects.update(updated_at=self.now - timedelta(minutes=5))
+        CallResponse.objects.update(updated_at=self.now - timedelta(minutes=5))
+        recompute_stats()
+
+    def test_changes_are_rendered_once_per_version(self):
+        since, later = timezone.now(), timezone.now() + timedelta(seconds=1)
+        Interview.objects.filter(call_sid='CA1').update(status='failed', updated_at=later)
+        CallResponse.objects.filter(call_sid='CA2').update(transcript='Hello there', updated_at=later)
+
+        sent = {}
+        events = change_events(since, later, sent)
+        self.assertEqual(
+            [re.search(r'^event: (\w+)', event, re.M).group(1) for event in events], ['call', 'call', 'stats']
+        )
+        self.assertIn('"call_sid": "CA2"', events[0])
+        self.assertIn('Hello there', events[0])
+        self.assertIn(f"id: {later.isoformat()}", events[1])
+        # Re-reading the same changes through the overlap sends nothing new
+        self.assertEqual(change_events(since, later, sent), [])
+        # A reconnecting browser catches up from its last event id
+        self.assertEqual(len(catch_up(since)), 3)
+        self.assertEqual(catch_up(later), [])
+
+    async def test_slow_subscriber_is_told_to_resync(self):
+        feed = ChangeFeed(interval=3600, queue_size=2)
+        fast, slow = feed.subscribe(), feed.subscribe()
+        feed.publish(['a'])
+        await fast.get()
+        feed.publish(['b', 'c'])
+        self.assertEqual([fast.get_nowait(), fast.get_nowait()], ['b', 'c'])
+        self.assertEqual(slow.get_nowait(), RESYNC)
+        self.assertTrue(slow.empty())
+
+        # A stream that was told to resync ends; one that disconnects unsubscribes
+        feed.unsubscribe(slow)
+        stream = event_stream(feed)
+        self.assertEqual(await anext(stream), 'retry: 3000\n\n')
+        self.assertEqual(len(feed.subscribers), 2)
+        await stream.aclose()
+
+        task = feed.task
+        feed.unsubscribe(fast)
+        self.assertEqual(feed.subscribers, set())
+        self.assertIsNone(feed.task)
+        await asyncio.sleep(0)
+        self.assertTrue(task.cancelled())
+
+    @override_settings(LIVE_EVENTS_POLL_INTERVAL=0.01)
+    async def test_dashboard_streams_webhook_changes(self):
+        response = await self.async_client.get(reverse('live_events'))
+        self.assertEqual(response.status_code, 302)
+
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('live_events'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+        # Let the feed note where changes start before making one
+        await asyncio.sleep(0.05)
+
+        await self.async_client.post(reverse('call_status'), {'CallSid': 'CA1', 'CallStatus': 'busy'})
+        await sync_to_async(flush_spool)()
+        event = (await asyncio.wait_for(anext(stream), 5)).decode()
+        self.assertIn('event: call', event)
+        self.assertIn('"call_sid": "CA1"', event)
+        self.assertIn('busy', event)
+        stats = json.loads((await asyncio.wait_for(anext(stream), 5)).decode().split('data: ')[1])
+        self.assertEqual(stats['total_calls'], 3)
+
+    def test_wsgi_does_not_stream(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('live_events')).status_code, 204)
+
+
+def transcript_client(texts):
+    """Fake Twilio client whose transcriptions.list answers from a {recording_sid: text} map"""
+    def list_transcriptions(recording_sid, limit=None):
+        text = texts.get(recording_sid)
+        if isinstance(text, Exception):
+            raise text
+        return [mock.Mock(transcription_text=text)] if text else []
+    client = mock.Mock()
+    client.transcriptions.list.side_effect = list_transcriptions
+    return client
+
+
+class TranscriptWorkerTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        for sid in ('RE1', 'RE2', 'RE3'):
+            CallResponse.objects.create(phone_number='+919876543210', call_sid='CA1', recording_sid=sid)
+        # Rows without a recording have nothing to fetch
+        CallResponse.objects.create(phone_number='+919876543210', call_sid='CA1')
+
+    def test_completes_available_transcripts_and_backs_off_the_rest(self):
+        client = transcript_client({'RE1': 'My name is Asha', 'RE3': Exception('boom')})
+        self.assertEqual(reconcile_transcripts(TwilioProvider(client), base_delay=30), 3)
+
+        re1, re2, re3 = (CallResponse.objects.get(recording_sid=sid) for sid in ('RE1', 'RE2', 'RE3'))
+        self.assertEqual((re1.transcript_status, re1.transcript), ('completed', 'My name is Asha'))
+        for response in (re2, re3):
+            self.assertEqual(response.transcript_status, 'pending')
+            self.assertEqual(response.transcript_attempts, 1)
+            self.assertGreater(response.transcript_next_attempt_at, self.now + timedelta(seconds=29))
+
+        # Nothing is due until the backoff expires
+        self.assertEqual(reconcile_transcripts(TwilioProvider(client)), 0)
+
+    def test_marks_failed_after_max_attempts(self):
+        client = transcript_client({})
+        for attempt in range(3):
+            CallResponse.objects.update(transcript_next_attempt_at=None)
+            reconcile_transcripts(TwilioProvider(client), max_attempts=3)
+        statuses = set(CallResponse.objects.filter(recording_sid__isnull=False).values_list('transcript_status', flat=True))
+        self.assertEqual(statuses, {'failed'})
+
+    def test_backoff_is_exponential_and_capped(self):
+        self.assertEqual([backoff_delay(attempt, 30, 200) for attempt in range(1, 5)], [30, 60, 120, 200])
+
+
+@override_settings(TWILIO_ACCOUNT_SID='AC' + '0' * 32, TWILIO_AUTH_TOKEN='token', TWILIO_HTTP_CONNECT_TIMEOUT=1.5, TWILIO_HTTP_READ_TIMEOUT=4)
+class TwilioClientTests(TestCase):
+    def setUp(self):
+        reset_client()
+        self.addCleanup(reset_client)
+
+    def test_client_is_shared_within_a_process(self):
+        client = get_client()
+        self.assertIs(get_client(), client)
+        self.assertEqual(client.http_client.timeout, (1.5, 4))
+
+    def test_client_is_rebuilt_after_fork(self):
+        client = get_client()
+        with mock.patch('call.twilio_client.os.getpid', return_value=-1):
+            self.assertIsNot(get_client(), client)
+
+    def test_connections_are_reused(self):
+        with StubTwilioServer() as stub, override_settings(TWILIO_API_BASE_URL=stub.url):
+            reset_client()
+            for _ in range(5):
+                self.assertEqual(get_client().calls('CA1').fetch().to, '+919876543210')
+        self.assertEqual((stub.requests, stub.connections), (5, 1))
+
+
+@override_settings(PUBLIC_URL='https://hr.example.com', TWILIO_ACCOUNT_SID='AC' + '0' * 32, TWILIO_AUTH_TOKEN='test')
+class MetricsTests(TestCase):
+    def observations(self, histogram, *labels):
+        series = histogram.series.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def test_histogram_renders_cumulative_buckets(self):
+        histogram = Histogram('test_seconds', 'Test', ('view',), (0.1, 1))
+        for value in [0.05, 0.1, 0.5, 3]:
+            histogram.observe(value, 'a"b')
+        self.assertEqual(histogram.render().splitlines()[2:], [
+            'test_seconds_bucket{view="a\\"b",le="0.1"} 2',
+            'test_seconds_bucket{view="a\\"b",le="1"} 3',
+            'test_seconds_bucket{view="a\\"b",le="+Inf"} 4',
+            'test_seconds_sum{view="a\\"b"} 3.65',
+            'test_seconds_count{view="a\\"b"} 4',
+        ])
+
+    def test_requests_are_timed_by_view_with_their_queries(self):
+        before = self.observations(REQUEST_SECONDS, 'call_status', 'POST', '200')
+        queries_before = REQUEST_DB_QUERIES.series.get(('call_status',), [0] * 10)[:]
+        self.client.post(reverse('call_status'), {'CallSid': 'CA1', 'CallStatus': 'ringing'})
+
+        self.assertEqual(self.observations(REQUEST_SECONDS, 'call_status', 'POST', '200'), before + 1)
+        # The status callback is one INSERT into the webhook queue, bucket le="1"
+        self.assertEqual(REQUEST_DB_QUERIES.series[('call_status',)][1], queries_before[1] + 1)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.assertContains(response, 'hr_http_request_duration_seconds_count{view="call_status",method="POST",status="200"}')
+
+    def test_twilio_requests_are_timed_by_endpoint(self):
+        endpoint = ('POST', '/2010-04-01/Accounts/{sid}/Calls.json', '201')
+        before = self.observations(TWILIO_SECONDS, *endpoint)
+        with StubTwilioServer() as stub, override_settings(TWILIO_API_BASE_URL=stub.url, SLOW_REQUEST_SECONDS=0):
+            reset_client()
+            self.addCleanup(reset_client)
+            with self.assertLogs('call.slow_requests', 'WARNING') as logs:
+                self.client.post(reverse('make_call'), {'phone_number': '9876543210'})
+
+        self.assertEqual(self.observations(TWILIO_SECONDS, *endpoint), before + 1)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual((record['view'], record['status'], record['twilio_calls']), ('make_call', 302, 1))
+        self.assertGreaterEqual(record['db_queries'], 1)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token_is_required_when_set(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+
+class FakeProviderTests(TestCase):
+    def test_calls_progress_on_the_clock(self):
+        clock = FakeClock()
+        provider = FakeProvider(ring_seconds=5, call_seconds=60, clock=clock, sleep=clock.sleep)
+        call = provider.create_call('+919876543210', 'https://hr.example.com/answer/', None)
+        self.assertEqual(call.status, 'queued')
+        statuses = []
+        for now in [0, 5, 64, 65]:
+            clock.now = now
+            statuses.append(provider.fetch_call(call.sid)[1:])
+        self.assertEqual(statuses, [('ringing', None), ('in-progress', None), ('in-progress', None), ('completed', 60)])
+        with self.assertRaises(TelephonyError) as raised:
+            provider.fetch_call('CA404')
+        self.assertEqual(raised.exception.status, 404)
+
+    def test_transcripts_arrive_after_a_delay(self):
+        clock = FakeClock()
+        provider = FakeProvider(transcript_delay=30, clock=clock, sleep=clock.sleep)
+        self.assertIsNone(provider.fetch_transcript('RE1'))
+        clock.now = 30
+        self.assertEqual(provider.fetch_transcript('RE1'), 'Simulated transcript of RE1')
+
+    def test_latency_and_failures_are_reproducible(self):
+        def outcomes():
+            clock = FakeClock()
+            provider = FakeProvider(latency=0.2, failure_rate=0.5, seed=7, clock=clock, sleep=clock.sleep)
+            results = []
+            for _ in range(20):
+                try:
+                    results.append(provider.create_call('+919876543210', '', '').sid)
+                except TelephonyError:
+                    results.append(None)
+            return results, clock.now
+        first, elapsed = outcomes()
+        self.assertEqual(outcomes(), (first, elapsed))
+        self.assertAlmostEqual(elapsed, 4.0)
+        self.assertTrue(0 < first.count(None) < 20)
+
+    def test_markup_matches_twilio(self):
+        provider = FakeProvider()
+        self.assertEqual(
+            provider.question_markup('Why <us>?', 'https://hr.example.com/voice/?response_id=1'),
+            TwilioProvider().question_markup('Why <us>?', 'https://hr.example.com/voice/?response_id=1')
+        )
+        self.assertEqual(provider.say_markup('Bye & thanks'), TwilioProvider().say_markup('Bye & thanks'))
+        settings = {'voice': 'Polly.Joanna', 'max_length': 90, 'trim': 'do-not-trim'}
+        self.assertEqual(
+            provider.question_markup('Why?', 'https://hr.example.com/voice/', **settings),
+            TwilioProvider().question_markup('Why?', 'https://hr.example.com/voice/', **settings)
+        )
+        audio = 'https://hr.example.com/prompts/why.wav?a=1&b=2'
+        self.assertEqual(
+            provider.question_markup('Why?', 'https://hr.example.com/voice/', audio_url=audio),
+            TwilioProvider().question_markup('Why?', 'https://hr.example.com/voice/', audio_url=audio)
+        )
+        self.assertEqual(provider.say_markup('Bye', audio_url=audio), TwilioProvider().say_markup('Bye', audio_url=audio))
+
+
+class TwilioProviderTests(TestCase):
+    def test_request_failures_raise_telephony_errors(self):
+        client = mock.Mock()
+        client.transcriptions.list.side_effect = TwilioRestException(404, '/Transcriptions.json', 'Not Found')
+        client.http_client.session.get.side_effect = requests.ConnectionError('Connection reset')
+        provider = TwilioProvider(client)
+
+        with self.assertRaises(TelephonyError) as raised:
+            provider.fetch_transcript('RE1')
+        self.assertEqual(raised.exception.status, 404)
+        with self.assertRaises(TelephonyError):
+            provider.download_recording('RE1', BytesIO())
+        client.transcriptions.list.side_effect = requests.Timeout('Read timed out')
+        with self.assertRaises(TelephonyError):
+            provider.fetch_transcript('RE1')
+
+
+@override_settings(PUBLIC_URL='https://hr.example.com', TELEPHONY_PROVIDER='call.telephony.FakeProvider')
+class FakeProviderFlowTests(TestCase):
+    def setUp(self):
+        reset_provider()
+        self.addCleanup(reset_provider)
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        settings = override_settings(RECORDING_CACHE_DIR=cache_dir.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client.force_login(get_user_model().objects.create_user('hr', password='secret'))
+
+    def test_interview_runs_offline(self):
+        self.client.post(reverse('make_call'), {'phone_number': '9876543210'})
+        call_sid = Interview.objects.get().call_sid
+        self.assertEqual(call_sid, f"CA{1:032x}")
+
+        response = self.client.post(reverse('answer'), {'CallSid': call_sid, 'To': '+919876543210'})
+        for index in range(len(INTERVIEW_QUESTIONS)):
+            response_id = re.search(r'response_id=(\d+)', response.content.decode()).group(1)
+            response = self.client.post(f"{reverse('voice')}?response_id={response_id}", {
+                'CallSid': call_sid, 'To': '+919876543210', 'RecordingSid': f"RE{index:032x}"
+            })
+        self.assertContains(response, 'Thank you for your time')
+
+        self.assertEqual(reconcile_transcripts(get_provider()), len(INTERVIEW_QUESTIONS))
+        self.assertEqual(
+            CallResponse.objects.get(recording_sid=f"RE{0:032x}").transcript, f"Simulated transcript of RE{0:032x}"
+        )
+        audio = self.client.get(reverse('recording_audio', args=[f"RE{0:032x}"]))
+        self.assertEqual(b''.join(audio.streaming_content), FakeProvider.AUDIO)
+        self.assertEqual(get_provider().requests, 2 + len(INTERVIEW_QUESTIONS))
+
+    def test_dialer_retries_provider_failures(self):
+        campaign = Campaign.objects.create(name='June')
+        CampaignNumber.objects.create(campaign=campaign, phone_number='+919876543210')
+        clock = FakeClock()
+        dialer = CampaignDialer(
+            provider=FakeProvider(failure_rate=1), bucket=TokenBucket(rate=5, clock=clock, sleep=clock.sleep), retry_delay=0
+        )
+        self.addCleanup(dialer.close)
+        self.assertEqual(dialer.run_once(), 0)
+        number = CampaignNumber.objects.get()
+        self.assertEqual((number.status, number.attempts, number.error), ('queued', 1, 'Simulated provider failure'))
+
+
+@override_settings(PUBLIC_URL='https://hr.example.com', TELEPHONY_PROVIDER='call.telephony.FakeProvider')
+class InterviewScriptTests(TestCase):
+    def setUp(self):
+        reset_provider()
+        self.addCleanup(reset_provider)
+        self.client.force_login(get_user_model().objects.create_user('hr', password='secret'))
+        self.script = publish_script(
+            'Engineering', ['Which languages do you use?', 'Describe a hard bug.', ''],
+            voice='Polly.Joanna', max_length=90, trim='do-not-trim'
+        )
+
+    def test_publishing_adds_the_next_current_version(self):
+        second = publish_script('Engineering', ['Why engineering?'])
+        self.assertEqual((self.script.version, second.version), (1, 2))
+        self.assertEqual(current_scripts(), [second])
+        self.script.refresh_from_db()
+        self.assertFalse(self.script.is_current)
+        with self.assertRaises(ValueError):
+            publish_script('Empty', ['  '])
+
+    def test_call_asks_its_script_version(self):
+        self.client.post(reverse('make_call'), {'phone_number': '9876543210', 'script': self.script.id})
+        interview = Interview.objects.get()
+        self.assertEqual(interview.script, self.script)
+        # Publishing a new version does not change the script of a call already placed
+        publish_script('Engineering', ['Why engineering?'])
+
+        response = self.client.post(reverse('answer'), {'CallSid': interview.call_sid, 'To': '+919876543210'})
+        self.assertContains(response, '<Say voice="Polly.Joanna">Which languages do you use?</Say>')
+        self.assertContains(response, 'maxLength="90"')
+        self.assertContains(response, 'trim="do-not-trim"')
+        for index in range(2):
+            response_id = re.search(r'response_id=(\d+)', response.content.decode()).group(1)
+            response = self.client.post(f"{reverse('voice')}?response_id={response_id}", {
+                'CallSid': interview.call_sid, 'To': '+919876543210', 'RecordingSid': f"RE{index}"
+            })
+        self.assertContains(response, '<Say voice="Polly.Joanna">Thank you for your time')
+        self.assertEqual(
+            list(CallResponse.objects.order_by('id').values_list('question', flat=True)),
+            ['Which languages do you use?', 'Describe a hard bug.']
+        )
+
+    def test_unknown_script_places_no_call(self):
+        self.client.post(reverse('make_call'), {'phone_number': '9876543210', 'script': 999})
+        self.assertFalse(Interview.objects.exists())
+        self.assertEqual(get_provider().requests, 0)
+
+    def test_campaign_calls_ask_the_campaign_script(self):
+        upload = SimpleUploadedFile('numbers.csv', b'9876543210\n')
+        self.client.post(reverse('upload_campaign'), {'numbers_file': upload, 'script': self.script.id})
+        dialer = CampaignDialer(bucket=TokenBucket(rate=5))
+        self.addCleanup(dialer.close)
+        self.assertEqual(dialer.run_once(), 1)
+        self.assertEqual(Interview.objects.get().script, self.script)
+
+    def test_versions_compile_once_until_changed(self):
+        with self.assertNumQueries(1):
+            question_twiml(0, 7, self.script.id)
+        with self.assertNumQueries(0):
+            twiml = question_twiml(1, 7, self.script.id)
+        self.assertEqual(twiml, build_question_twiml('Describe a hard bug.', 7, script=self.script))
+
+        self.script.questions = ['Edited in place', 'Describe a hard bug.']
+        self.script.save()
+        self.assertIn('Edited in place', question_twiml(0, 7, self.script.id))
+
+
+@override_settings(
+    PUBLIC_URL='https://hr.example.com', TELEPHONY_PROVIDER='call.telephony.FakeProvider',
+    PROMPT_SYNTHESIZER='call.prompts.FakeSynthesizer', PROMPT_AUDIO_RECHECK=0
+)
+class PromptAudioTests(TestCase):
+    def setUp(self):
+        prompt_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(prompt_dir.cleanup)
+        settings = override_settings(PROMPT_AUDIO_ROOT=prompt_dir.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        for reset in (reset_provider, reset_synthesizer):
+            reset()
+            self.addCleanup(reset)
+        self.root = prompt_dir.name
+        self.script = publish_script('Engineering', ['Which languages do you use?', 'Describe a hard bug.'])
+
+    def test_questions_are_spoken_until_their_audio_is_rendered(self):
+        self.assertIn('<Say voice="Polly.Amy">Which languages do you use?</Say>', question_twiml(0, 7, self.script.id))
+
+        # Rendered by another process, e.g. the publish_script command
+        self.assertEqual(render_prompts(script_prompts(self.script), self.script.voice), 3)
+        twiml = question_twiml(0, 7, self.script.id)
+        url = re.search(r'<Play>(https://hr\.example\.com/prompts/[0-9a-f]{32}\.wav)</Play>', twiml).group(1)
+        self.assertNotIn('<Say', twiml)
+        self.assertIn('<Play>', goodbye_twiml(self.script.id))
+        self.assertEqual(get_synthesizer().requests, 3)
+
+        # Rendering again reuses every file
+        self.assertEqual(render_script_prompts(self.script), 0)
+        self.assertEqual(get_synthesizer().requests, 3)
+
+        name = url.rsplit('/', 1)[1]
+        with open(os.path.join(self.root, name), 'rb') as audio:
+            self.assertEqual(name.split('.')[0], hashlib.sha256(audio.read()).hexdigest()[:32])
+
+    def test_rendered_audio_is_served_with_far_future_caching(self):
+        render_script_prompts(self.script)
+        name = re.search(r'/prompts/(\w+\.wav)', question_twiml(1, 7, self.script.id)).group(1)
+        response = self.client.get(f"/prompts/{name}")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        with open(os.path.join(self.root, name), 'rb') as audio:
+            self.assertEqual(b''.join(response.streaming_content), audio.read())
+        self.assertEqual(self.client.get('/prompts/../manifest.json').status_code, 404)
+        self.assertEqual(self.client.get(f"/prompts/{'0' * 32}.wav").status_code, 404)
+
+
+class DatabaseConfigTests(TestCase):
+    def test_sqlite_takes_the_write_lock_up_front_and_waits_for_it(self):
+        config = database_config('sqlite:////tmp/hr.sqlite3')
+        self.assertEqual((config['NAME'], config['CONN_MAX_AGE'], config['CONN_HEALTH_CHECKS']), ('/tmp/hr.sqlite3', 600, True))
+        self.assertEqual(config['OPTIONS'], {'transaction_mode': 'IMMEDIATE'})
+        self.assertEqual(config['PRAGMAS']['journal_mode'], 'WAL')
+
+    def test_pragmas_are_applied_to_new_connections(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('SQLite only')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+    def test_pooled_postgres_drops_persistent_connections(self):
+        config = database_config('postgres://hr:secret@db:5432/hr', pool=True, pool_max_size=20)
+        self.assertEqual((config['CONN_MAX_AGE'], config['CONN_HEALTH_CHECKS']), (0, False))
+        self.assertEqual(config['OPTIONS'], {'pool': {'min_size': 2, 'max_size': 20}})
+        self.assertEqual(database_config('postgres://hr:secret@db:5432/hr')['CONN_MAX_AGE'], 600)
+
+    def test_asgi_does_not_keep_persistent_connections(self):
+        script = "import hr_team.asgi; from django.conf import settings; print(settings.DATABASES['default']['CONN_MAX_AGE'])"
+        env = {key: value for key, value in os.environ.items() if key != 'DATABASE_CONN_MAX_AGE'}
+        output = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.strip(), '0')
+
+
+@override_settings(PUBLIC_URL='https://hr.example.com')
+class WebhookTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch('call.views.get_client', side_effect=AssertionError('Twilio called'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_answer_builds_state_from_payload(self):
+        response = self.client.post(reverse('answer'), {'CallSid': 'CA1', 'To': '+919876543210'})
+        first = CallResponse.objects.get()
+        self.assertEqual((first.phone_number, first.question), ('+919876543210', INTERVIEW_QUESTIONS[0]))
+        self.assertContains(response, f'https://hr.example.com/voice/?response_id={first.id}')
+
+    def test_voice_records_recording_from_payload(self):
+        first = CallResponse.objects.create(phone_number='+919876543210', call_sid='CA1')
+        self.client.post(f"{reverse('voice')}?response_id={first.id}", {
+            'CallSid': 'CA1',
+            'To': '+919876543210',
+            'RecordingSid': 'RE1',
+            'RecordingUrl': 'https://api.twilio.com/2010-04-01/Accounts/AC1/Recordings/RE1',
+            'RecordingDuration': '12'
+        })
+        first.refresh_from_db()
+        self.assertEqual(first.recording_url, 'https://api.twilio.com/2010-04-01/Accounts/AC1/Recordings/RE1')
+        self.assertEqual((first.recording_duration, first.transcript_status), (12, 'pending'))
+        self.assertEqual(CallResponse.objects.filter(call_sid='CA1').count(), 2)
+
+    def test_cached_twiml_matches_freshly_built_twiml(self):
+        for index, question in enumerate(INTERVIEW_QUESTIONS):
+            self.assertEqual(question_twiml(index, 42), build_question_twiml(question, 42))
+
+
+@override_settings(TWILIO_ACCOUNT_SID='AC' + '0' * 32, TWILIO_AUTH_TOKEN='token')
+class RecordingProxyTests(TestCase):
+    def setUp(self):
+        self.stub = StubTwilioServer()
+        self.stub.__enter__()
+        self.addCleanup(self.stub.__exit__, None, None, None)
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        settings = override_settings(TWILIO_API_BASE_URL=self.stub.url, RECORDING_CACHE_DIR=cache_dir.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        reset_client()
+        self.addCleanup(reset_client)
+
+        self.client.force_login(get_user_model().objects.create_user('hr', password='secret'))
+        self.recording_sid = 'RE' + 'a' * 32
+        create_call('CA1', timezone.now(), questions=1, recording_sid=self.recording_sid)
+        self.url = reverse('recording_audio', args=[self.recording_sid])
+
+    def test_repeat_playback_is_served_locally(self):
+        first = self.client.get(self.url)
+        self.assertEqual(b''.join(first.streaming_content), self.stub.audio)
+        self.assertEqual((first['Content-Type'], first['Accept-Ranges']), ('audio/mpeg', 'bytes'))
+        for _ in range(3):
+            self.assertEqual(b''.join(self.client.get(self.url).streaming_content), self.stub.audio)
+        self.assertEqual(self.stub.requests, 1)
+
+    def test_range_requests(self):
+        size = len(self.stub.audio)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f"bytes 10-19/{size}")
+        self.assertEqual(b''.join(response.streaming_content), self.stub.audio[10:20])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(response.streaming_content), self.stub.audio[-5:])
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-')
+        self.assertEqual(b''.join(response.streaming_content), self.stub.audio[100:])
+
+        response = self.client.get(self.url, HTTP_RANGE=f"bytes={size}-")
+        self.assertEqual((response.status_code, response['Content-Range']), (416, f"bytes */{size}"))
+        # A stale If-Range gets the whole, current file
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"other"')
+        self.assertEqual(response.status_code, 200)
+
+    async def test_asgi_streams_recordings_a_chunk_at_a_time(self):
+        await self.async_client.aforce_login(await get_user_model().objects.aget(username='hr'))
+        for headers, expected in (({}, self.stub.audio), ({'Range': 'bytes=100-'}, self.stub.audio[100:])):
+            response = await self.async_client.get(self.url, headers=headers)
+            self.assertTrue(response.is_async)
+            self.assertEqual(response['Content-Length'], str(len(expected)))
+            with mock.patch('call.views.STREAM_CHUNK_SIZE', 1024), warnings.catch_warnings():
+                warnings.simplefilter('error')
+                chunks = [chunk async for chunk in response]
+            self.assertEqual(b''.join(chunks), expected)
+            self.assertGreater(len(chunks), 10)
+
+    def test_conditional_requests(self):
+        response = self.client.get(self.url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def test_dashboard_plays_through_the_proxy(self):
+        create_call('CA2', timezone.now(), questions=1, recording_url='https://api.twilio.com/legacy.mp3')
+        response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, f'<source src="{self.url}" type="audio/mpeg">')
+        self.assertContains(response, '<source src="https://api.twilio.com/legacy.mp3" type="audio/mpeg">')
+        self.assertContains(response, 'preload="none"', count=2)
+        self.assertEqual(self.stub.requests, 0)
+
+    def test_unknown_recordings_are_not_fetched(self):
+        self.assertEqual(self.client.get(reverse('recording_audio', args=['RE' + 'b' * 32])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('recording_audio', args=['..'])).status_code, 404)
+        self.assertEqual(self.stub.requests, 0)
+
+    def test_recording_evicted_before_it_is_opened_is_fetched_again(self):
+        self.client.get(self.url)
+        cache = RecordingCache()
+        fetch = RecordingCache.fetch
+
+        def evicted_after_lookup(self, recording_sid, provider=None):
+            path = fetch(self, recording_sid, provider)
+            if not evicted:
+                evicted.append(path)
+                path.unlink()
+            return path
+
+        evicted = []
+        with mock.patch.object(RecordingCache, 'fetch', evicted_after_lookup):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.stub.audio)
+        self.assertEqual(self.stub.requests, 2)
+        self.assertIsNotNone(cache.get(self.recording_sid))
+
+    def test_least_recently_played_recordings_are_evicted(self):
+        sids = [f"RE{index:032x}" for index in range(3)]
+        cache = RecordingCache(max_bytes=2 * len(self.stub.audio))
+        cache.fetch(sids[0])
+        cache.fetch(sids[1])
+        # Playing the first makes the second the least recently used
+        os.utime(cache.path(sids[1]), (1, 1))
+        cache.get(sids[0])
+        cache.fetch(sids[2])
+        self.assertEqual([cache.get(sid) is not None for sid in sids], [True, False, True])
+
+    def test_the_directory_is_swept_only_when_the_cache_may_be_full(self):
+        cache = RecordingCache(max_bytes=3 * len(self.stub.audio))
+        with mock.patch.object(RecordingCache, 'evict', wraps=cache.evict) as evict:
+            for index in range(3):
+                cache.fetch(f"RE{index:032x}")
+            # The first download counts the directory, the next two fit in the running total
+            self.assertEqual(evict.call_count, 1)
+            cache.fetch(f"RE{3:032x}")
+            self.assertEqual(evict.call_count, 2)
+        self.assertEqual(len(list(cache.directory.glob('RE*.mp3'))), 3)
+
+    def test_requests_waiting_on_a_failed_download_share_one_lock(self):
+        cache, downloads, overlapped = RecordingCache(), [], []
+
+        def fetch():
+            try:
+                cache.fetch(self.recording_sid, provider)
+            except TelephonyError:
+                pass
+
+        threads = [threading.Thread(target=fetch) for _ in range(3)]
+
+        def download_recording(recording_sid, file):
+            downloads.append(recording_sid)
+            if len(downloads) == 1:
+                # The second request queues on the lock, then this download fails
+                threads[1].start()
+                time.sleep(0.1)
+                raise TelephonyError('Service unavailable', 503)
+            # A request arriving during the retry must wait for it rather than download too
+            threads[2].start()
+            threads[2].join(0.2)
+            overlapped.append(len(downloads) > 2)
+            file.write(self.stub.audio)
+
+        provider = mock.Mock()
+        provider.download_recording.side_effect = download_recording
+        threads[0].start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual((len(downloads), overlapped), (2, [False]))
+        self.assertEqual(_fetch_locks, {})
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_user('hr', password='secret'))
+        now = timezone.now()
+        transcripts = [
+            'I led a team of Python developers for three years',
+            'Mostly Java, some Python scripting',
+            'I enjoy mentoring and team leadership',
+            'No <script>alert(1)</script> experience with python',
+        ]
+        self.responses = [
+            CallResponse.objects.create(call_sid='CA1', phone_number='+919876543210', question='Tell us about yourself',
+                                        transcript=transcript, created_at=now)
+            for transcript in transcripts
+        ]
+
+    def test_matches_are_ranked_and_highlighted(self):
+        results, next_cursor = search_responses('python team')
+        self.assertEqual([response.id for response in results], [self.responses[0].id])
+        self.assertIn('<mark>Python</mark>', results[0].snippet)
+        self.assertIn('<mark>team</mark>', results[0].snippet)
+        self.assertIsNone(next_cursor)
+
+    def test_snippets_are_escaped(self):
+        results, _ = search_responses('alert')
+        self.assertIn('&lt;script&gt;<mark>alert</mark>', results[0].snippet)
+
+    def test_keyset_pagination_walks_every_match_once(self):
+        seen, cursor = [], None
+        while True:
+            results, next_cursor = search_responses('python', limit=1, cursor=cursor)
+            seen.extend(response.id for response in results)
+            if next_cursor is None:
+                break
+            cursor = parse_search_cursor(next_cursor)
+        self.assertEqual(sorted(seen), sorted(response.id for response in self.responses if 'ython' in response.transcript))
+
+    def test_only_the_newest_matches_are_ranked(self):
+        results, _ = search_responses('python', window=2)
+        self.assertEqual(sorted(response.id for response in results[:2]), [self.responses[1].id, self.responses[3].id])
+        self.assertEqual([response.ranked for response in results], [True, True, False])
+        # Matches older than the window follow the ranked ones
+        self.assertEqual(results[2].id, self.responses[0].id)
+
+    def test_pagination_goes_on_past_the_ranked_window(self):
+        for index in range(3):
+            CallResponse.objects.create(call_sid='CA2', phone_number='+919876543210', question='Q',
+                                        transcript=f"Python again {index}", created_at=timezone.now())
+        seen, cursor = [], None
+        while True:
+            results, next_cursor = search_responses('python', limit=2, cursor=cursor, window=2)
+            seen.extend(response.id for response in results)
+            if next_cursor is None:
+                break
+            cursor = parse_search_cursor(next_cursor)
+        matches = CallResponse.objects.filter(transcript__icontains='python').order_by('-id').values_list('id', flat=True)
+        self.assertEqual(len(seen), len(matches))
+        self.assertEqual(seen[2:], list(matches[2:]))
+
+        response = self.client.get(reverse('search'), {'q': 'python'})
+        self.assertNotContains(response, 'Older matches')
+
+    def test_index_follows_updates_and_deletes(self):
+        CallResponse.objects.filter(id=self.responses[1].id).update(transcript='Kotlin only')
+        self.responses[2].delete()
+        self.assertEqual(len(search_responses('python')[0]), 2)
+        self.assertEqual(search_responses('kotlin')[0][0].id, self.responses[1].id)
+        self.assertEqual(search_responses('mentoring')[0], [])
+        # Query syntax is never passed through
+        self.assertEqual(search_responses('"python* (')[0], search_responses('python')[0])
+
+    def test_search_page(self):
+        response = self.client.get(reverse('search'), {'q': 'leadership'})
+        self.assertContains(response, 'team <mark>leadership</mark>')
+        self.assertContains(self.client.get(reverse('search')), 'Search Transcripts')
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TokenBucketTests(TestCase):
+    def test_admits_calls_at_the_configured_rate(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, clock=clock, sleep=clock.sleep)
+        for _ in range(10):
+            bucket.acquire()
+        # Two calls are admitted straight away, the other eight at 2 per second
+        self.assertAlmostEqual(clock.now, 4.0)
+
+    def test_pause_blocks_admission(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=1, clock=clock, sleep=clock.sleep)
+        bucket.pause(3)
+        self.assertFalse(bucket.try_acquire())
+        bucket.acquire()
+        self.assertAlmostEqual(clock.now, 4.0)
+
+
+def dialing_client(statuses=None):
+    """Fake Twilio client whose calls.create hands out sequential SIDs, or raises per number"""
+    statuses = statuses or {}
+    def create(to, **kwargs):
+        if to in statuses:
+            raise statuses[to]
+        return mock.Mock(sid=f"CA{to[1:]}", status='queued')
+    client = mock.Mock()
+    client.calls.create.side_effect = create
+    return client
+
+
+class CampaignTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('hr', password='secret')
+        self.client.force_login(self.user)
+
+    def test_upload_normalizes_and_queues_numbers(self):
+        upload = SimpleUploadedFile('numbers.csv', b'phone\n9876543210\n09876543211\n919876543212\n9876543210\nn/a\n')
+        response = self.client.post(reverse('upload_campaign'), {'name': 'June', 'numbers_file': upload})
+        self.assertRedirects(response, reverse('campaigns'))
+        campaign = Campaign.objects.get()
+        self.assertEqual(
+            list(campaign.numbers.values_list('phone_number', flat=True)),
+            ['+919876543210', '+919876543211', '+919876543212']
+        )
+
+    def test_upload_reads_xlsx(self):
+        workbook = Workbook()
+        for value in ['Phone', 9876543210, '98765 43211']:
+            workbook.active.append([value])
+        content = BytesIO()
+        workbook.save(content)
+        upload = SimpleUploadedFile('numbers.xlsx', content.getvalue())
+        self.client.post(reverse('upload_campaign'), {'numbers_file': upload})
+        self.assertEqual(CampaignNumber.objects.count(), 2)
+
+    def create_campaign(self, count):
+        campaign = Campaign.objects.create(name='June')
+        CampaignNumber.objects.bulk_create(
+            CampaignNumber(campaign=campaign, phone_number=f"+9198765432{index:02d}") for index in range(count)
+        )
+        return campaign
+
+    def dialer(self, client, **kwargs):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=5, clock=clock, sleep=clock.sleep)
+        dialer = CampaignDialer(provider=TwilioProvider(client), bucket=bucket, **kwargs)
+        self.addCleanup(dialer.close)
+        return dialer
+
+    def test_dialer_respects_live_call_cap_and_frees_slots_on_completion(self):
+        campaign = self.create_campaign(5)
+        dialer = self.dialer(dialing_client(), max_live_calls=3)
+
+        self.assertEqual(dialer.run_once(), 3)
+        self.assertEqual(dialer.run_once(), 0)
+        self.assertEqual(Interview.objects.filter(status='queued').count(), 3)
+
+        # Final status callbacks free the slots for the rest of the list
+        for number in CampaignNumber.objects.filter(status='dialing'):
+            self.client.post(reverse('call_status'), {'CallSid': number.call_sid, 'CallStatus': 'completed'})
+        flush_spool()
+        self.assertEqual(dialer.run_once(), 2)
+        for number in CampaignNumber.objects.filter(status='dialing'):
+            self.client.post(reverse('call_status'), {'CallSid': number.call_sid, 'CallStatus': 'no-answer'})
+        flush_spool()
+        dialer.run_once()
+
+        campaign.refresh_from_db()
+        self.assertEqual(campaign.status, 'completed')
+        self.assertEqual(CampaignNumber.objects.filter(status='completed').count(), 3)
+        self.assertEqual(CampaignNumber.objects.filter(status='failed').count(), 2)
+
+    def test_status_flushed_before_the_cycle_ends_finds_the_call(self):
+        self.create_campaign(3)
+        dialer = self.dialer(dialing_client())
+        real_record_call = record_call
+
+        def record_then_complete(phone_number, call, script_id=None):
+            # The final status of a short call, applied while the rest of the cycle is still dialing
+            interview = real_record_call(phone_number, call, script_id)
+            self.client.post(reverse('call_status'), {'CallSid': call.sid, 'CallStatus': 'completed'})
+            flush_spool()
+            return interview
+
+        with mock.patch('call.dialer.record_call', side_effect=record_then_complete):
+            self.assertEqual(dialer.run_once(), 3)
+        self.assertEqual(CampaignNumber.objects.filter(status='completed').count(), 3)
+        self.assertEqual(Interview.objects.filter(status='completed').count(), 3)
+
+    def test_an_error_saving_one_call_does_not_stop_the_cycle(self):
+        self.create_campaign(4)
+        failing = TwilioRestException(400, '/Calls.json', 'Invalid number')
+        dialer = self.dialer(dialing_client({'+919876543203': failing}))
+        real_record_call = record_call
+
+        def record_or_fail(phone_number, call, script_id=None):
+            if phone_number == '+919876543200':
+                raise IntegrityError('UNIQUE constraint failed: call_interview.call_sid')
+            return real_record_call(phone_number, call, script_id)
+
+        with mock.patch('call.dialer.record_call', side_effect=record_or_fail):
+            self.assertEqual(dialer.run_once(), 3)
+        numbers = dict(CampaignNumber.objects.values_list('phone_number', 'call_sid'))
+        self.assertEqual(numbers, {
+            '+919876543200': 'CA919876543200', '+919876543201': 'CA919876543201',
+            '+919876543202': 'CA919876543202', '+919876543203': None,
+        })
+        self.assertEqual(Interview.objects.count(), 2)
+        failed = CampaignNumber.objects.get(phone_number='+919876543203')
+        self.assertEqual((failed.status, failed.attempts), ('queued', 1))
+
+    def test_rate_limited_numbers_are_requeued_without_spending_an_attempt(self):
+        self.create_campaign(2)
+        rate_limited = TwilioRestException(429, '/Calls.json', 'Too Many Requests')
+        dialer = self.dialer(dialing_client({'+919876543201': rate_limited}))
+
+        self.assertEqual(dialer.run_once(), 1)
+        number = CampaignNumber.objects.get(phone_number='+919876543201')
+        self.assertEqual((number.status, number.attempts), ('queued', 0))
+        self.assertIsNotNone(number.next_attempt_at)
+
+    def test_numbers_fail_after_max_attempts(self):
+        self.create_campaign(1)
+        dialer = self.dialer(dialing_client({'+919876543200': Exception('boom')}), max_attempts=2, retry_delay=0)
+        dialer.run_once()
+        dialer.run_once()
+        number = CampaignNumber.objects.get()
+        self.assertEqual((number.status, number.attempts, number.error), ('failed', 2, 'boom'))
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        create_call('CA1', now, questions=2, transcript='Hello')
+        create_call('CA2', now - timedelta(days=3), questions=1, status='no-answer')
+
+    def test_excel_export_streams_every_row(self):
+        response = self.client.get(reverse('export_excel'))
+        self.assertTrue(response.streaming)
+        workbook = load_workbook(BytesIO(b''.join(response.streaming_content)))
+        rows = list(workbook['Call Responses'].iter_rows(values_only=True))
+        self.assertEqual(rows[0][:2], ('Phone Number', 'Question'))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1][5], 'Hello')
+        self.assertEqual(rows[3][2], 'N/A')
+
+    def test_csv_export_applies_filters_in_sql(self):
+        today = timezone.now().date()
+        url = f"{reverse('export_csv')}?start={today - timedelta(days=1)}&end={today}&status=completed"
+        with self.assertNumQueries(1):
+            content = b''.join(self.client.get(url).streaming_content).decode()
+        rows = list(csv.reader(content.splitlines()))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual({row[7] for row in rows[1:]}, {'CA1'})
+
+    async def test_asgi_streams_exports_a_chunk_at_a_time(self):
+        for i in range(20):
+            await sync_to_async(create_call)(f"CA{i + 3}", timezone.now(), questions=1, transcript='A longer answer ' * 4)
+        chunks = {}
+        for url in (reverse('export_csv'), reverse('export_excel')):
+            expected = await sync_to_async(lambda: b''.join(self.client.get(url).streaming_content))()
+            with mock.patch('call.views.STREAM_CHUNK_SIZE', 256), warnings.catch_warnings():
+                response = await self.async_client.get(url)
+                # A sync iterator would be read to the end, with a warning, before anything is sent
+                self.assertTrue(response.is_async)
+                warnings.simplefilter('error')
+                chunks[url] = [chunk async for chunk in response]
+            content = b''.join(chunks[url])
+            if url == reverse('export_excel'):
+                # The workbook records when it was written, so compare the cells
+                content, expected = (list(load_workbook(BytesIO(data)).active.values) for data in (content, expected))
+            self.assertEqual(content, expected)
+        # Each chunk is read from the cursor or workbook file a few hundred bytes at a time
+        for url_chunks in chunks.values():
+            self.assertGreater(len(url_chunks), 5)
+            self.assertTrue(all(len(chunk) < 2 * 256 for chunk in url_chunks))
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        settings = override_settings(ARCHIVE_ROOT=archive_dir.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.root = archive_dir.name
+        self.now = timezone.now()
+        create_call('CA1', self.now - timedelta(days=400), questions=2, transcript='Old', transcript_status='completed')
+        create_call('CA2', self.now - timedelta(days=430), questions=1, status='no-answer')
+        create_call('CA3', self.now - timedelta(days=470), questions=3)
+        create_call('CA4', self.now - timedelta(days=2), questions=2, transcript='New')
+        recompute_stats()
+
+    def export(self, query=''):
+        return b''.join(self.client.get(f"{reverse('export_csv')}{query}").streaming_content).decode()
+
+    def test_moves_old_calls_into_monthly_partitions(self):
+        stats = read_stats()
+        output = StringIO()
+        call_command('archive_calls', '--older-than-days', '365', '--batch-size', '2', stdout=output)
+        self.assertIn('Archived 3 calls and 6 responses', output.getvalue())
+
+        self.assertEqual(list(Interview.objects.values_list('call_sid', flat=True)), ['CA4'])
+        self.assertEqual(CallResponse.objects.count(), 2)
+        months = {
+            (self.now - timedelta(days=days)).astimezone(dt_timezone.utc).strftime('month=%Y-%m')
+            for days in (400, 430, 470)
+        }
+        self.assertEqual(set(os.listdir(os.path.join(self.root, 'responses'))), months)
+
+        interviews = read_archive('interviews', ['call_sid', 'status'])
+        self.assertEqual(sorted(interviews.column('call_sid').to_pylist()), ['CA1', 'CA2', 'CA3'])
+        responses = read_archive('responses', ['call_sid', 'transcript'], call_status='completed', transcript_status='completed')
+        self.assertEqual(responses.to_pylist(), [{'call_sid': 'CA1', 'transcript': 'Old'}] * 2)
+
+        # Archived calls still count, now and after a recount
+        self.assertEqual(read_stats(), stats)
+        self.assertEqual(recompute_stats(), (stats, {}))
+
+    def test_exports_read_archived_months_transparently(self):
+        today = self.now.date()
+        queries = ['', '?status=completed', f"?start={today - timedelta(days=440)}&end={today - timedelta(days=410)}"]
+        before = [self.export(query) for query in queries]
+        call_command('archive_calls', '--older-than-days', '365', stdout=StringIO())
+        self.assertEqual([self.export(query) for query in queries], before)
+        self.assertEqual(len(before[2].splitlines()), 2)
+
+        # Only the hot table is queried, the archive is read from disk
+        with self.assertNumQueries(1):
+            self.export()
+
+    def test_rewriting_a_batch_replaces_its_files(self):
+        rows = list(Interview.objects.values(
+            'id', 'call_sid', 'phone_number', 'status', 'duration', 'answered_questions', 'started_at', 'ended_at',
+            'script_id', 'created_at', 'updated_at'
+        ))
+        write_partitions('interviews', rows)
+        write_partitions('interviews', rows)
+        self.assertEqual(read_archive('interviews').num_rows, 4)
+        self.assertEqual(read_archive('interviews', start=self.now - timedelta(days=10)).column('call_sid').to_pylist(), ['CA4'])
+
+    def test_dry_run_changes_nothing(self):
+        output = StringIO()
+        call_command('archive_calls', '--older-than-days', '420', '--dry-run', stdout=output)
+        self.assertIn('Would archive 2 calls and 4 responses', output.getvalue())
+        self.assertEqual(Interview.objects.count(), 4)
+        self.assertFalse(os.listdir(self.root))
+
+    def test_responses_without_an_interview_are_archived(self):
+        orphan = CallResponse.objects.create(call_sid='CA9', phone_number='+919876543210', question='Lost',
+                                             created_at=self.now - timedelta(days=400))
+        CallResponse.objects.create(call_sid='CA9', phone_number='+919876543210', question='Recent', created_at=self.now)
+        output = StringIO()
+        call_command('archive_calls', '--older-than-days', '365', '--dry-run', stdout=output)
+        self.assertIn('Would archive 3 calls and 7 responses', output.getvalue())
+
+        call_command('archive_calls', '--older-than-days', '365', stdout=StringIO())
+        self.assertFalse(CallResponse.objects.filter(id=orphan.id).exists())
+        self.assertEqual(read_archive('responses', ['question'], call_sid='CA9').to_pylist(), [{'question': 'Lost'}])
+
+    def test_every_row_is_archived_once(self):
+        for _ in range(2):
+            call_command('archive_calls', '--older-than-days', '1', '--batch-size', '1', stdout=StringIO())
+        self.assertFalse(Interview.objects.exists())
+        interview_ids = read_archive('interviews', ['id']).column('id').to_pylist()
+        response_ids = read_archive('responses', ['id']).column('id').to_pylist()
+        self.assertEqual((len(interview_ids), len(set(interview_ids))), (4, 4))
+        self.assertEqual((len(response_ids), len(set(response_ids))), (8, 8))
+
+
+class AnalyticsTests(TestCase):
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_user('hr', password='secret'))
+        cache.clear()
+        self.addCleanup(cache.clear)
+        monday = datetime(2024, 1, 1, 9, 0, tzinfo=dt_timezone.utc)
+        create_call('CA1', monday, questions=4, transcript_status='completed')
+        create_call('CA2', monday + timedelta(minutes=30), questions=0, status='no-answer')
+        create_call('CA3', monday + timedelta(days=1, hours=5), questions=2, transcript_status='pending')
+        for response in CallResponse.objects.all():
+            response.recording_sid = f"RE{response.id}"
+            response.recording_duration = 10 if response.call_sid == 'CA1' else 20
+            response.save()
+
+    def report(self):
+        report = get_analytics()
+        report.pop('generated_at')
+        return report
+
+    def test_reports(self):
+        report = self.report()
+        self.assertEqual(report['funnel'], [
+            {'stage': 'Initiated', 'calls': 3, 'rate': 1.0},
+            {'stage': 'Answered', 'calls': 2, 'rate': 0.6667},
+            {'stage': 'All questions answered', 'calls': 1, 'rate': 0.3333},
+        ])
+        first = report['questions'][0]
+        self.assertEqual(
+            (first['question'], first['responses'], first['mean'], first['median'], first['max'], first['transcript_rate']),
+            ('Question 0', 2, 15.0, 15.0, 20.0, 0.5)
+        )
+        self.assertEqual(report['questions'][-1]['transcript_rate'], 1.0)
+        self.assertEqual(report['transcripts'], {
+            'responses': 6, 'recorded': 6, 'completed': 4, 'rate': 0.6667, 'by_status': {'completed': 4, 'pending': 2}
+        })
+        self.assertEqual(report['pickup_by_hour'][9], {'hour': 9, 'calls': 2, 'answered': 1, 'rate': 0.5})
+        self.assertEqual(report['pickup_by_hour'][14], {'hour': 14, 'calls': 1, 'answered': 1, 'rate': 1.0})
+        self.assertEqual(report['pickup_by_weekday'][0], {'day': 'Monday', 'calls': 2, 'answered': 1, 'rate': 0.5})
+        self.assertEqual(report['pickup_by_weekday'][6]['rate'], None)
+
+    def test_repeat_views_are_cache_hits_until_the_data_changes(self):
+        self.assertEqual(self.client.get(reverse('analytics')).status_code, 200)
+        # Only the version lookups, no table is read
+        with self.assertNumQueries(4), CaptureQueriesContext(connection) as context:
+            get_analytics()
+        # Only the few script versions are read in full
+        scanned = {step.split()[1] for _, plan in full_table_scans(context.captured_queries) for step in plan}
+        self.assertLessEqual(scanned, {'call_interviewscript'})
+
+        CallResponse.objects.filter(call_sid='CA3').update(transcript_status='completed', updated_at=timezone.now())
+        self.assertEqual(self.report()['transcripts']['completed'], 6)
+
+    def test_deletes_and_new_scripts_invalidate_the_cache(self):
+        self.assertEqual(self.report()['transcripts']['responses'], 6)
+        CallResponse.objects.filter(call_sid='CA1').first().delete()
+        self.assertEqual(self.report()['transcripts']['responses'], 5)
+
+        # The funnel counts a call as finished against its script's length
+        version = analytics_version()
+        InterviewScript.objects.create(name='Short', questions=['One?', 'Two?'], is_current=True)
+        self.assertNotEqual(analytics_version(), version)
+
+    def test_includes_archived_calls(self):
+        before = self.report()
+        with tempfile.TemporaryDirectory() as root, override_settings(ARCHIVE_ROOT=root):
+            call_command('archive_calls', '--older-than-days', '1', stdout=StringIO())
+            self.assertFalse(Interview.objects.exists())
+            self.assertEqual(self.report(), before)
+
+    def test_api_revalidates_with_etags(self):
+        response = self.client.get(reverse('api_analytics'))
+        self.assertEqual(response.json()['funnel'][0]['calls'], 3)
+        self.assertEqual(self.client.get(reverse('api_analytics'), HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('api_analytics')).status_code, 401)
+
+
+class QueryPlanTests(QueryPlanMixin, TestCase):
+    """Every hot query must be answered from an index"""
+
+    def setUp(self):
+        user = get_user_model().objects.create_user('hr', password='secret')
+        self.client.force_login(user)
+        now = timezone.now()
+        for index in range(20):
+            create_call(f"CA{index}", now - timedelta(minutes=index), recording_sid=None)
+
+    def test_dashboard_queries(self):
+        with self.assertNoFullTableScans():
+            self.client.get(reverse('dashboard'))
+
+    def test_status_webhook_fan_out(self):
+        with self.assertNoFullTableScans():
+            self.client.post(reverse('call_status'), {'CallSid': 'CA1', 'CallStatus': 'completed'})
+            flush_spool()
+
+    def test_api_change_polling(self):
+        since = (timezone.now() - timedelta(minutes=1)).isoformat()
+        with self.assertNoFullTableScans():
+            self.client.get(f"{reverse('api_calls')}?{urlencode({'updated_since': since})}")
+
+    def test_transcript_worker_queue(self):
+        with self.assertNoFullTableScans():
+            pending_responses(50)
+
+    def test_export_filters(self):
+        today = timezone.now().date()
+        with self.assertNoFullTableScans():
+            b''.join(self.client.get(f"{reverse('export_csv')}?start={today}&status=completed").streaming_content)
+            b''.join(self.client.get(f"{reverse('export_csv')}?start={today}").streaming_content)
+
+    def test_latest_responses(self):
+        with self.assertNoFullTableScans():
+            list(CallResponse.objects.all()[:20])
+
+    def test_detects_full_table_scans(self):
+        with CaptureQueriesContext(connection) as context:
+            list(CallResponse.objects.filter(question='Question 1'))
+            list(CallResponse.objects.filter(question='Question 1')[:5])
+            CallResponse.objects.count()
+            list(CallResponse.objects.order_by('-id')[:5])
+        # An unindexed filter under a LIMIT may still walk every row, a covering index scan walks them all
+        self.assertEqual(len(full_table_scans(context.captured_queries)), 3)
+
+
+class InterviewTests(TestCase):
+    def test_status_webhook_is_a_single_insert(self):
+        create_call('CA1', timezone.now(), questions=4, status='in-progress')
+        with self.assertNumQueries(1):
+            self.client.post(reverse('call_status'), {'CallSid': 'CA1', 'CallStatus': 'completed', 'CallDuration': '95'})
+        self.assertEqual(Interview.objects.get().status, 'in-progress')
+
+        flush_spool()
+        interview = Interview.objects.get()
+        self.assertEqual((interview.status, interview.duration), ('completed', 95))
+        self.assertIsNotNone(interview.ended_at)
+
+    @override_settings(PUBLIC_URL='https://hr.example.com')
+    def test_webhooks_maintain_the_answered_question_counter(self):
+        self.client.post(reverse('answer'), {'CallSid': 'CA1', 'To': '+919876543210'})
+        for index in range(2):
+            response_id = CallResponse.objects.latest('id').id
+            self.client.post(f"{reverse('voice')}?response_id={response_id}", {
+                'CallSid': 'CA1', 'To': '+919876543210', 'RecordingSid': f"RE{index}", 'RecordingDuration': '5'
+            })
+        interview = Interview.objects.get()
+        self.assertEqual((interview.status, interview.answered_questions), ('in-progress', 2))
+        self.assertEqual(interview.responses.count(), 3)
+
+
+class InterviewBackfillMigrationTests(TransactionTestCase):
+    before = [('call', '0008_interview')]
+    after = [('call', '0009_backfill_interviews')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        self.addCleanup(lambda: MigrationExecutor(connection).migrate(executor.loader.graph.leaf_nodes()))
+
+    def test_backfills_one_interview_per_call(self):
+        apps = MigrationExecutor(connection).loader.project_state(self.before).apps
+        OldCallResponse = apps.get_model('call', 'CallResponse')
+        now = timezone.now()
+        OldCallResponse.objects.create(phone_number='+919876543210', call_sid='CA1', call_status='initiated', created_at=now)
+        OldCallResponse.objects.create(phone_number='+919876543210', call_sid='CA1', call_status='completed', call_duration=80,
+                                       recording_sid='RE1', created_at=now + timedelta(seconds=5))
+        OldCallResponse.objects.create(phone_number='+919876543211', call_sid='CA2', call_status='no-answer', created_at=now)
+        OldCallResponse.objects.create(phone_number='CA3', question='Auto-transcribed response')
+
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(self.after)
+        apps = executor.loader.project_state(self.after).apps
+        NewInterview = apps.get_model('call', 'Interview')
+        NewCallResponse = apps.get_model('call', 'CallResponse')
+
+        interview = NewInterview.objects.get(call_sid='CA1')
+        self.assertEqual((interview.status, interview.duration, interview.answered_questions), ('completed', 80, 1))
+        self.assertEqual(interview.created_at, now)
+        self.assertEqual(NewInterview.objects.count(), 2)
+        self.assertEqual(NewCallResponse.objects.filter(interview__isnull=True).count(), 1)
+
+
+@override_settings(PUBLIC_URL='https://hr.example.com')
+class DashboardCounterTests(TestCase):
+    def post_event(self, rng, calls):
+        """Send one random webhook, or place a call, for one of a handful of calls"""
+        call_sid = rng.choice(calls)
+        event = rng.choice(['make_call', 'answer', 'voice', 'call_status', 'transcription', 'worker', 'flush'])
+        if event == 'make_call':
+            with mock.patch('call.dialer.get_provider', return_value=TwilioProvider(dialing_client())):
+                self.client.post(reverse('make_call'), {'phone_number': f"98765{rng.randrange(100000):05d}"})
+        elif event == 'answer':
+            self.client.post(reverse('answer'), {'CallSid': call_sid, 'To': '+919876543210'})
+        elif event == 'voice':
+            response_id = CallResponse.objects.filter(call_sid=call_sid).values_list('id', flat=True).last()
+            data = {'CallSid': call_sid, 'To': '+919876543210'}
+            if rng.random() < 0.7:
+                data['RecordingSid'] = f"RE{next(self.recording_sids)}"
+            self.client.post(f"{reverse('voice')}?response_id={response_id}", data)
+        elif event == 'call_status':
+            self.client.post(reverse('call_status'), {
+                'CallSid': call_sid, 'CallStatus': rng.choice(['ringing', 'in-progress', 'completed', 'no-answer'])
+            })
+        elif event == 'transcription':
+            # Usually for a recording voice saw, sometimes one it did not
+            recording_sid = CallResponse.objects.filter(recording_sid__isnull=False).order_by('?').values_list('recording_sid', flat=True).first()
+            if not recording_sid or rng.random() < 0.2:
+                recording_sid = f"RE{next(self.recording_sids)}"
+            self.client.post(reverse('transcription'), {
+                'CallSid': call_sid, 'RecordingSid': recording_sid, 'TranscriptionText': 'Answer'
+            })
+        elif event == 'flush':
+            flush_spool(batch_size=rng.randrange(1, 10))
+        else:
+            recording_sids = CallResponse.objects.filter(recording_sid__isnull=False).values_list('recording_sid', flat=True)
+            texts = {sid: rng.choice(['Answer', None]) for sid in recording_sids}
+            reconcile_transcripts(TwilioProvider(transcript_client(texts)), max_attempts=2, base_delay=0)
+
+    def test_counters_match_a_recompute_after_random_webhooks(self):
+        rng = random.Random(9)
+        self.recording_sids = count()
+        calls = [f"CA{index}" for index in range(6)]
+        for _ in range(300):
+            self.post_event(rng, calls)
+        flush_spool()
+        self.assertEqual(read_stats(), count_stats())
+        self.assertGreater(read_stats()['completed_transcripts'], 0)
+
+    def test_recompute_corrects_drift(self):
+        create_call('CA1', timezone.now(), questions=2)
+        counts, drift = recompute_stats()
+        self.assertEqual(counts, {'total_calls': 1, 'completed_calls': 1, 'total_responses': 2, 'completed_transcripts': 0})
+        self.assertEqual(drift, {'total_calls': 1, 'completed_calls': 1, 'total_responses': 2})
+        self.assertEqual(recompute_stats()[1], {})
+
+    def test_missing_counters_are_rebuilt(self):
+        create_call('CA1', timezone.now(), questions=2)
+        DashboardCounter.objects.all().delete()
+        self.assertEqual(read_stats()['total_responses'], 2)
+        self.client.post(reverse('answer'), {'CallSid': 'CA2', 'To': '+919876543210'})
+        self.assertEqual(read_stats(), count_stats())
+
+
+class StateStoreTests(TestCase):
+    def test_local_store_compare_and_set(self):
+        store = LocalStateStore(ttl=60, max_entries=10)
+        self.assertTrue(store.compare_and_set('CA1', None, question_index=1, response_id=7))
+        self.assertFalse(store.compare_and_set('CA1', None, question_index=1, response_id=8))
+        state = store.get('CA1')
+        self.assertEqual((state['question_index'], state['response_id']), (1, 7))
+        self.assertTrue(store.compare_and_set('CA1', state['version'], question_index=2, response_id=9))
+        self.assertFalse(store.compare_and_set('CA1', state['version'], question_index=2, response_id=10))
+        self.assertEqual(store.get('CA1')['response_id'], 9)
+
+    def test_local_store_expires_and_evicts(self):
+        clock = FakeClock()
+        store = LocalStateStore(ttl=60, max_entries=2, clock=clock)
+        store.compare_and_set('CA1', None, question_index=1, response_id=1)
+        clock.now = 30
+        store.compare_and_set('CA2', None, question_index=1, response_id=2)
+        store.get('CA1')
+        store.compare_and_set('CA3', None, question_index=1, response_id=3)
+        self.assertIsNone(store.get('CA2'))
+        clock.now = 61
+        self.assertIsNone(store.get('CA1'))
+        self.assertIsNotNone(store.get('CA3'))
+
+    def test_database_store_compare_and_set(self):
+        store = DatabaseStateStore(ttl=60)
+        self.assertTrue(store.compare_and_set('CA1', None, question_index=1, response_id=7))
+        self.assertFalse(store.compare_and_set('CA1', None, question_index=1, response_id=8))
+        state = store.get('CA1')
+        self.assertTrue(store.compare_and_set('CA1', state['version'], question_index=2, response_id=9))
+        self.assertFalse(store.compare_and_set('CA1', state['version'], question_index=2, response_id=10))
+        self.assertEqual(store.get('CA1')['response_id'], 9)
+
+    def test_database_store_takes_over_expired_state(self):
+        store = DatabaseStateStore(ttl=60)
+        store.compare_and_set('CA1', None, question_index=3, response_id=7)
+        CallState.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertIsNone(store.get('CA1'))
+        self.assertTrue(store.compare_and_set('CA1', None, question_index=1, response_id=8))
+        self.assertEqual(store.get('CA1')['question_index'], 1)
+
+
+@override_settings(PUBLIC_URL='https://hr.example.com')
+class InterviewFlowTests(TestCase):
+    def setUp(self):
+        reset_state_store()
+        self.addCleanup(reset_state_store)
+
+    def voice(self, response_id, **data):
+        return self.client.post(f"{reverse('voice')}?response_id={response_id}", {'CallSid': 'CA1', 'To': '+919876543210', **data})
+
+    def run_interview(self, between_webhooks=lambda: None):
+        response = self.client.post(reverse('answer'), {'CallSid': 'CA1', 'To': '+919876543210'})
+        for index in range(len(INTERVIEW_QUESTIONS)):
+            between_webhooks()
+            response_id = re.search(r'response_id=(\d+)', response.content.decode()).group(1)
+            response = self.voice(response_id, RecordingSid=f"RE{index}")
+        return response
+
+    def assertAskedEveryQuestionOnce(self, last_response):
+        self.assertContains(last_response, 'Thank you for your time')
+        questions = list(CallResponse.objects.filter(call_sid='CA1').order_by('id').values_list('question', flat=True))
+        self.assertEqual(questions, INTERVIEW_QUESTIONS)
+        interview = Interview.objects.get()
+        self.assertEqual((interview.status, interview.answered_questions), ('completed', len(INTERVIEW_QUESTIONS)))
+
+    def test_walks_the_script_without_sessions(self):
+        self.assertAskedEveryQuestionOnce(self.run_interview())
+        self.assertFalse(Session.objects.exists())
+
+    def test_progress_survives_switching_workers(self):
+        # A fresh store per webhook stands in for requests landing on different worker processes
+        self.assertAskedEveryQuestionOnce(self.run_interview(between_webhooks=reset_state_store))
+
+    @override_settings(INTERVIEW_STATE_BACKEND='call.state.LocalStateStore')
+    def test_local_backend_walks_the_script(self):
+        self.assertIsInstance(get_state_store(), LocalStateStore)
+        self.assertAskedEveryQuestionOnce(self.run_interview())
+
+    def test_retried_webhook_does_not_advance(self):
+        self.client.post(reverse('answer'), {'CallSid': 'CA1', 'To': '+919876543210'})
+        first = CallResponse.objects.get()
+        response = self.voice(first.id, RecordingSid='RE1')
+        retried = self.voice(first.id, RecordingSid='RE1')
+        self.assertEqual(retried.content, response.content)
+        self.assertEqual(CallResponse.objects.count(), 2)
+        self.assertEqual(Interview.objects.get().answered_questions, 1)
+
+    def test_recording_webhook_that_loses_the_race_repeats_the_winner(self):
+        self.client.post(reverse('answer'), {'CallSid': 'CA1', 'To': '+919876543210'})
+        first = CallResponse.objects.get()
+        store = get_state_store()
+        stale = store.get('CA1')
+        # A concurrent copy of the webhook advances the call first
+        store.compare_and_set('CA1', stale['version'], question_index=2, response_id=first.id)
+
+        with mock.patch.object(store, 'get', side_effect=[stale, store.get('CA1')]):
+            twiml = _record_and_ask_next('CA1', first, {'recording_sid': 'RE1', 'recording_url': None, 'recording_duration': 5})
+        self.assertEqual(twiml, question_twiml(1, first.id))
+        self.assertEqual(Interview.objects.get().answered_questions, 0)
+        self.assertIsNone(CallResponse.objects.get().recording_sid)
+
+
+@override_settings(PUBLIC_URL='https://hr.example.com', TWILIO_ACCOUNT_SID='AC' + '0' * 32, TWILIO_AUTH_TOKEN='test')
+class AsgiTests(TestCase):
+    async def test_concurrent_calls_wait_on_twilio_together(self):
+        with StubTwilioServer(latency=0.2) as stub, override_settings(TWILIO_API_BASE_URL=stub.url):
+            try:
+                responses = await asyncio.gather(*(
+                    self.async_client.post(reverse('make_call'), {'phone_number': f"98765432{index:02d}"})
+                    for index in range(5)
+                ))
+            finally:
+                await close_async_client()
+        self.assertEqual([response.status_code for response in responses], [302] * 5)
+        self.assertEqual(await Interview.objects.acount(), 5)
+        # One process had every call in flight at once, a sync worker would have had one
+        self.assertEqual(stub.peak_in_flight, 5)
+
+    async def test_webhooks_walk_the_script(self):
+        response = await self.async_client.post(reverse('answer'), {'CallSid': 'CA1', 'To': '+919876543210'})
+        for index in range(len(INTERVIEW_QUESTIONS)):
+            response_id = re.search(r'response_id=(\d+)', response.content.decode()).group(1)
+            response = await self.async_client.post(f"{reverse('voice')}?response_id={response_id}", {
+                'CallSid': 'CA1', 'To': '+919876543210', 'RecordingSid': f"RE{index}"
+            })
+        await self.async_client.post(reverse('call_status'), {'CallSid': 'CA1', 'CallStatus': 'completed', 'CallDuration': '60'})
+        await sync_to_async(flush_spool)()
+
+        self.assertContains(response, 'Thank you for your time')
+        interview = await Interview.objects.aget()
+        self.assertEqual((interview.status, interview.duration, interview.answered_questions), ('completed', 60, 4))
+
+
+@override_settings(PUBLIC_URL='https://hr.example.com', TWILIO_ACCOUNT_SID='AC' + '0' * 32, TWILIO_AUTH_TOKEN='test')
+class LoadTestTests(TestCase):
+    async def test_simulated_calls_complete(self):
+        with StubTwilioServer() as stub, override_settings(TWILIO_API_BASE_URL=stub.url):
+            try:
+                with QueryCounter().active() as counter:
+                    report = await LoadTest(InProcessTransport(), calls=3, concurrency=3, think_time=0).run(counter)
+            finally:
+                await close_async_client()
+
+        self.assertEqual(report['errors'], 0)
+        self.assertEqual(report['calls'], {'completed': 3, 'failed': 0, 'peak_live': 3})
+        endpoints = report['endpoints']
+        self.assertEqual(endpoints['make_call']['count'], 3)
+        self.assertEqual(endpoints['voice']['count'], 3 * len(INTERVIEW_QUESTIONS))
+        self.assertEqual(endpoints['call_status']['count'], 3 * 4)
+        self.assertEqual(endpoints['call_status']['queries_per_request'], 1)
+        self.assertEqual(report['flushed_events'], 3 * 4 + 3 * len(INTERVIEW_QUESTIONS))
+        self.assertEqual(stub.requests, 3)
+
+        statuses = [interview.status async for interview in Interview.objects.all()]
+        self.assertEqual(statuses, ['completed'] * 3)
+        self.assertEqual(await CallResponse.objects.filter(transcript_status='completed').acount(), 3 * len(INTERVIEW_QUESTIONS))
+
+
+class WebhookSpoolTests(TestCase):
+    def setUp(self):
+        create_call('CA1', timezone.now(), questions=1, status='queued', recording_sid='RE0')
+        recompute_stats()
+
+    def post_status(self, call_status, sequence, duration=None):
+        data = {'CallSid': 'CA1', 'CallStatus': call_status, 'SequenceNumber': str(sequence)}
+        if duration is not None:
+            data['CallDuration'] = str(duration)
+        self.client.post(reverse('call_status'), data)
+
+    def test_last_status_by_sequence_number_wins(self):
+        # Delivered out of order: the completed callback overtook ringing and in-progress
+        self.post_status('completed', 3, duration=42)
+        self.post_status('ringing', 1)
+        self.post_status('in-progress', 2)
+        self.assertEqual(flush_spool(), 3)
+
+        interview = Interview.objects.get()
+        self.assertEqual((interview.status, interview.duration), ('completed', 42))
+        self.assertFalse(WebhookEvent.objects.exists())
+        self.assertEqual(read_stats(), count_stats())
+
+    def test_final_status_is_not_reopened_by_a_late_callback(self):
+        self.post_status('completed', 3, duration=42)
+        flush_spool()
+        self.post_status('ringing', 1)
+        flush_spool()
+        self.assertEqual(Interview.objects.get().status, 'completed')
+        self.assertEqual(read_stats()['completed_calls'], 1)
+
+    def test_batches_apply_in_order(self):
+        for sequence, call_status in enumerate(['initiated', 'ringing', 'in-progress', 'completed']):
+            self.post_status(call_status, sequence)
+        self.assertEqual(flush_spool(batch_size=3), 4)
+        self.assertEqual(Interview.objects.get().status, 'completed')
+
+    def test_status_for_a_call_not_saved_yet_is_retried(self):
+        for sequence, call_status in enumerate(['in-progress', 'completed']):
+            self.client.post(reverse('call_status'), {'CallSid': 'CA2', 'CallStatus': call_status, 'SequenceNumber': str(sequence)})
+        self.post_status('completed', 3, duration=42)
+        self.assertEqual(flush_spool(batch_size=1), 1)
+        self.assertEqual(WebhookEvent.objects.count(), 2)
+
+        # The call's row commits after its callbacks arrived
+        create_call('CA2', timezone.now(), questions=0, status='queued')
+        self.assertEqual(flush_spool(), 2)
+        self.assertEqual(Interview.objects.get(call_sid='CA2').status, 'completed')
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_unmatched_status_is_dropped_after_the_grace_period(self):
+        self.client.post(reverse('call_status'), {'CallSid': 'CA2', 'CallStatus': 'completed'})
+        flush_spool()
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+        WebhookEvent.objects.update(created_at=timezone.now() - timedelta(minutes=10))
+        with self.assertLogs('call.spool', 'WARNING'):
+            self.assertEqual(flush_spool(grace=300), 0)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_transcriptions_update_or_create_responses(self):
+        for recording_sid, text in [('RE0', 'First'), ('RE0', 'Second'), ('RE9', 'Unknown recording')]:
+            self.client.post(reverse('transcription'), {
+                'CallSid': 'CA1', 'RecordingSid': recording_sid, 'TranscriptionText': text
+            })
+        with self.assertNumQueries(10):
+            # In one savepoint: claim the batch, lock and update the known response, look up the
+            # interview for the unknown one and create it, both counters, then delete the batch
+            flush_spool()
+
+        self.assertEqual(CallResponse.objects.get(recording_sid='RE0').transcript, 'Second')
+        created = CallResponse.objects.get(recording_sid='RE9')
+        self.assertEqual((created.interview, created.transcript_status), (Interview.objects.get(), 'completed'))
+        self.assertEqual(read_stats(), count_stats())
+
+    def test_transcription_without_recording_sid_is_rejected(self):
+        response = self.client.post(reverse('transcription'), {'CallSid': 'CA1', 'TranscriptionText': 'Hi'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_coalesce_keeps_the_final_duration(self):
+        statuses, transcriptions = coalesce([
+            {'type': 'status', 'call_sid': 'CA1', 'status': 'completed', 'duration': 30, 'sequence': 2},
+            {'type': 'status', 'call_sid': 'CA1', 'status': 'in-progress', 'duration': None, 'sequence': 1},
+        ])
+        self.assertEqual(statuses, [{'type': 'status', 'call_sid': 'CA1', 'status': 'completed', 'duration': 30, 'sequence': 2}])
+        self.assertEqual(transcriptions, [])
+
+
+def history_client(calls, recordings, texts):
+    """Fake Twilio client listing the given calls and recordings, filtered by their creation time"""
+    client = transcript_client(texts)
+    client.calls.stream.side_effect = lambda start_time_after: iter([c for c in calls if c.start_time > start_time_after])
+    client.recordings.stream.side_effect = lambda date_created_after: iter(
+        [r for r in recordings if r.date_created > date_created_after]
+    )
+    calls_by_sid = {call.sid: call for call in calls}
+    client.calls.side_effect = lambda sid: mock.Mock(fetch=lambda: calls_by_sid[sid])
+    return client
+
+
+@override_settings(TWILIO_ACCOUNT_SID='AC' + '0' * 32, TWILIO_AUTH_TOKEN='test')
+class ImportTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.calls = [
+            mock.Mock(sid='CA1', to='+919876543210', status='completed', duration='60', start_time=now - timedelta(days=40)),
+            mock.Mock(sid='CA2', to='+919876543211', status='completed', duration='45', start_time=now - timedelta(days=2)),
+        ]
+        self.recordings = [
+            mock.Mock(sid='RE1', call_sid='CA1', uri='/RE1.json', duration='10', date_created=now - timedelta(days=1)),
+            mock.Mock(sid='RE2', call_sid='CA2', uri='/RE2.json', duration='12', date_created=now - timedelta(days=2)),
+            mock.Mock(sid='RE3', call_sid='CA2', uri='/RE3.json', duration='8', date_created=now - timedelta(days=2)),
+        ]
+        self.texts = {'RE1': 'First answer', 'RE2': 'Second answer'}
+
+    def fetch(self, *args):
+        client = history_client(self.calls, self.recordings, self.texts)
+        with mock.patch('call.management.commands.fetch_twilio_transcripts.get_client', return_value=client):
+            call_command('fetch_twilio_transcripts', *args, stdout=StringIO())
+        return client
+
+    def test_imports_calls_recordings_and_transcripts(self):
+        # A response the webhooks already recorded keeps its question
+        create_call(
+            'CA2', timezone.now() - timedelta(days=2), questions=1, recording_sid='RE2',
+            recording_url='https://api.twilio.com/Recordings/RE2'
+        )
+        self.fetch('--workers', '2')
+
+        self.assertEqual(Interview.objects.count(), 2)
+        self.assertEqual(Interview.objects.get(call_sid='CA1').duration, 60)
+        responses = {response.recording_sid: response for response in CallResponse.objects.all()}
+        self.assertEqual(len(responses), 3)
+        self.assertEqual((responses['RE2'].question, responses['RE2'].transcript), ('Question 0', 'Second answer'))
+        self.assertEqual(responses['RE1'].interview.call_sid, 'CA1')
+        self.assertEqual(responses['RE3'].transcript_status, 'pending')
+        # Playable audio, not the recording's JSON resource
+        self.assertEqual(responses['RE1'].recording_url, f"https://api.twilio.com/2010-04-01/Accounts/AC{'0' * 32}/Recordings/RE1.mp3")
+        self.assertEqual(responses['RE2'].recording_url, 'https://api.twilio.com/Recordings/RE2')
+        self.assertEqual(read_stats(), count_stats())
+        self.assertIsNotNone(get_watermark())
+
+    def test_later_runs_start_from_the_watermark(self):
+        self.fetch()
+        watermark = get_watermark()
+        self.texts = {}
+        client = self.fetch()
+
+        client.recordings.stream.assert_called_once_with(date_created_after=watermark - OVERLAP)
+        self.assertEqual(CallResponse.objects.count(), 3)
+        # A transcript already stored is not reset by a run that found none
+        self.assertEqual(CallResponse.objects.get(recording_sid='RE1').transcript, 'First answer')
+
+    def test_dry_run_and_since(self):
+        self.fetch('--dry-run')
+        self.assertFalse(CallResponse.objects.exists())
+        self.assertIsNone(get_watermark())
+
+        client = self.fetch('--since', '2000-01-01')
+        self.assertEqual(client.calls.stream.call_args.kwargs['start_time_after'].year, 2000)
+        self.assertEqual(Interview.objects.count(), 2)
@@ -0,0 +1,87 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import logging
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import CallResponse
+from .stats import increment
+
+logger = logging.getLogger(__name__)
+
+
+def pending_responses(batch_size):
+    """Return the next batch of responses whose transcript is due for a fetch"""
+    now = timezone.now()
+    return list(
+        CallResponse.objects
+        .filter(transcript_status='pending', recording_sid__isnull=False)
+        .filter(Q(transcript_next_attempt_at__isnull=True) | Q(transcript_next_attempt_at__lte=now))
+        .order_by('created_at')[:batch_size]
+    )
+
+
+def backoff_delay(attempts, base_delay, max_delay):
+    """Exponential backoff: base_delay, 2 * base_delay, 4 * base_delay, ... capped at max_delay"""
+    return min(base_delay * (2 ** (attempts - 1)), max_delay)
+
+
+def reconcile_transcripts(provider, batch_size=50, workers=4, max_attempts=5, base_delay=30, max_delay=3600):
+    """
+    Fetch transcripts for one batch of pending responses.
+
+    Telephony provider requests run on a bounded thread pool; all database access stays on
+    the calling thread and the batch is written back with a single bulk_update.
+    Returns the number of responses processed.
+    """
+    responses = pending_responses(batch_size)
+    if not responses:
+        return 0
+
+    def fetch(response):
+        try:
+            return provider.fetch_transcript(response.recording_sid), None
+        except Exception as e:
+            return None, e
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(fetch, responses))
+
+    now = timezone.now()
+    for response, (transcript, error) in zip(responses, results):
+        # bulk_update skips auto_now, so stamp the change by hand
+        response.updated_at = now
+        if transcript:
+            response.transcript = transcript
+            response.transcript_status = 'completed'
+            response.transcript_next_attempt_at = None
+            continue
+
+        if error:
+            logger.error(f"Error fetching transcript for recording {response.recording_sid}: {str(error)}")
+
+        response.transcript_attempts += 1
+        if response.transcript_attempts >= max_attempts:
+            response.transcript_status = 'failed'
+            response.transcript_next_attempt_at = None
+            logger.warning(f"Giving up on transcript for recording {response.recording_sid} after {response.transcript_attempts} attempts")
+        else:
+            delay = backoff_delay(response.transcript_attempts, base_delay, max_delay)
+            response.transcript_next_attempt_at = now + timedelta(seconds=delay)
+
+    with transaction.atomic():
+        # Skip responses the transcription webhook completed while we were fetching
+        still_pending = set(
+            CallResponse.objects.select_for_update()
+            .filter(id__in=[response.id for response in responses], transcript_status='pending')
+            .values_list('id', flat=True)
+        )
+        responses = [response for response in responses if response.id in still_pending]
+        CallResponse.objects.bulk_update(
+            responses,
+            ['transcript', 'transcript_status', 'transcript_attempts', 'transcript_next_attempt_at', 'updated_at']
+        )
+        increment(completed_transcripts=sum(response.transcript_status == 'completed' for response in responses))
+    return len(results)
@@ -0,0 +1,182 @@
+from aiohttp import BasicAuth, ClientSession, ClientTimeout, TCPConnector
+from django.conf import settings
+from .metrics import observe_twilio
+from requests.adapters import HTTPAdapter
+from twilio.http.async_http_client import AsyncTwilioHttpClient
+from twilio.http.http_client import TwilioHttpClient
+from twilio.http.response import Response
+from twilio.rest import Client
+from urllib.parse import urlsplit
+import asyncio
+import logging
+import os
+import threading
+import time
+import weakref
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _rebase_url(url, base_url):
+    """Point a Twilio API URL at base_url, keeping its path and query"""
+    if not base_url:
+        return url
+    parts = urlsplit(url)
+    return f"{base_url}{parts.path}" + (f"?{parts.query}" if parts.query else '')
+
+
+class PooledTwilioHttpClient(TwilioHttpClient):
+    """
+    Twilio HTTP transport backed by one keep-alive requests session.
+
+    Connections to api.twilio.com are kept in a urllib3 pool of ``pool_maxsize``
+    sockets and reused across requests, so only the first call per socket pays
+    for the TCP and TLS handshake. ``timeout`` may be a ``(connect, read)`` tuple.
+    ``base_url`` reroutes every Twilio host to another origin, e.g. a local stub.
+    """
+
+    def __init__(self, timeout=None, pool_connections=1, pool_maxsize=10, max_retries=0, base_url=None):
+        super().__init__(pool_connections=True)
+        # The parent only accepts a single positive number, requests also takes (connect, read)
+        self.timeout = timeout
+        self.base_url = base_url.rstrip('/') if base_url else None
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=max_retries
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method, url, *args, **kwargs):
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            response = super().request(method, _rebase_url(url, self.base_url), *args, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            observe_twilio(method, url, status, time.perf_counter() - started)
+
+
+class PooledAsyncTwilioHttpClient(AsyncTwilioHttpClient):
+    """
+    aiohttp counterpart of PooledTwilioHttpClient for async views.
+
+    One keep-alive ClientSession with up to ``pool_maxsize`` sockets, bound to
+    the event loop it was created on. ``timeout`` is a ``(connect, read)``
+    tuple and ``base_url`` reroutes every Twilio host, as for the sync client.
+    """
+
+    def __init__(self, timeout=None, pool_maxsize=10, base_url=None):
+        super().__init__(pool_connections=False)
+        connect_timeout, read_timeout = timeout or (None, None)
+        self.client_timeout = ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.base_url = base_url.rstrip('/') if base_url else None
+        self.session = ClientSession(connector=TCPConnector(limit=pool_maxsize), timeout=self.client_timeout)
+
+    async def request(self, method, url, params=None, data=None, headers=None, auth=None, timeout=None,
+                      allow_redirects=False):
+        # The parent only accepts a single total timeout, keep the session's (connect, read) split
+        kwargs = {
+            'method': method.upper(),
+            'url': _rebase_url(url, self.base_url),
+            'params': params,
+            'data': data,
+            'headers': headers,
+            'auth': BasicAuth(login=auth[0], password=auth[1]) if auth else None,
+            'allow_redirects': allow_redirects,
+        }
+        if timeout is not None:
+            kwargs['timeout'] = ClientTimeout(total=timeout)
+        self.log_request(kwargs)
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            async with self.session.request(**kwargs) as response:
+                self.log_response(response.status, response)
+                status = response.status
+                return Response(response.status, await response.text(), response.headers)
+        finally:
+            observe_twilio(method, url, status, time.perf_counter() - started)
+
+
+def build_http_client():
+    """Build a pooled transport from the TWILIO_HTTP_* settings"""
+    return PooledTwilioHttpClient(
+        timeout=(settings.TWILIO_HTTP_CONNECT_TIMEOUT, settings.TWILIO_HTTP_READ_TIMEOUT),
+        pool_connections=settings.TWILIO_HTTP_POOL_CONNECTIONS,
+        pool_maxsize=settings.TWILIO_HTTP_POOL_SIZE,
+        max_retries=settings.TWILIO_HTTP_MAX_RETRIES,
+        base_url=settings.TWILIO_API_BASE_URL
+    )
+
+
+def get_client():
+    """
+    Return the process-wide Twilio client.
+
+    The client is created lazily and rebuilt when the process id changes, so
+    every gunicorn worker gets its own connection pool even with --preload
+    (sockets must never be shared across a fork). Threads within a worker
+    share the client and its pool.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = Client(
+                    settings.TWILIO_ACCOUNT_SID,
+                    settings.TWILIO_AUTH_TOKEN,
+                    http_client=build_http_client()
+                )
+                _client_pid = pid
+                logger.info(f"Created pooled Twilio client for worker {pid}")
+    return _client
+
+
+def get_async_client():
+    """
+    Return the Twilio client for async views on the running event loop.
+
+    aiohttp sessions cannot cross event loops, so each loop gets its own
+    client. Under an ASGI server that is one pooled client per worker process.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = Client(
+            settings.TWILIO_ACCOUNT_SID,
+            settings.TWILIO_AUTH_TOKEN,
+            http_client=PooledAsyncTwilioHttpClient(
+                timeout=(settings.TWILIO_HTTP_CONNECT_TIMEOUT, settings.TWILIO_HTTP_READ_TIMEOUT),
+                pool_maxsize=settings.TWILIO_HTTP_POOL_SIZE,
+                base_url=settings.TWILIO_API_BASE_URL
+            )
+        )
+        _async_clients[loop] = client
+        logger.info(f"Created pooled async Twilio client for worker {os.getpid()}")
+    return client
+
+
+async def close_async_client():
+    """Close the running loop's async client, e.g. before the loop shuts down"""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.http_client.close()
+
+
+def reset_client():
+    """Drop the shared client, e.g. after changing credentials or settings in tests"""
+    global _client, _client_pid
+    with _client_lock:
+        if _client is not None:
+            _client.http_client.session.close()
+        _client = None
+        _client_pid = None
@@ -0,0 +1,168 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import islice
+import logging
+
+from django.utils import timezone
+
+from .models import CallResponse, ImportWatermark, Interview
+from .stats import recompute_stats
+from .telephony import TwilioProvider, recording_media_url
+
+logger = logging.getLogger(__name__)
+
+WATERMARK = 'fetch_twilio_transcripts'
+# Re-read a little before the watermark so calls and recordings that were still
+# being created during the previous run are picked up; the upserts are idempotent
+OVERLAP = timedelta(hours=1)
+
+
+def get_watermark(name=WATERMARK):
+    return ImportWatermark.objects.filter(name=name).values_list('value', flat=True).first()
+
+
+def set_watermark(value, name=WATERMARK):
+    ImportWatermark.objects.update_or_create(name=name, defaults={'value': value})
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _parse_duration(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def upsert_interviews(calls):
+    """Insert or refresh one Interview per Twilio call in a single statement"""
+    Interview.objects.bulk_create(
+        [
+            Interview(
+                call_sid=call.sid,
+                phone_number=call.to or '',
+                status=call.status,
+                duration=_parse_duration(call.duration),
+                created_at=call.start_time or timezone.now(),
+            )
+            for call in calls
+        ],
+        update_conflicts=True,
+        unique_fields=['call_sid'],
+        update_fields=['status', 'duration', 'updated_at']
+    )
+
+
+def upsert_responses(recordings, transcripts, interviews):
+    """
+    Insert or refresh one CallResponse per recording.
+
+    Rows with a transcript overwrite the stored one; rows without keep
+    whatever the transcript worker or webhook already stored, and new ones
+    start as pending for the process_transcripts worker. The media URL a
+    webhook stored is kept; new rows get the recording's MP3 URL, since the
+    listing only carries the URI of its JSON resource.
+    """
+    now = timezone.now()
+    transcribed, untranscribed = [], []
+    for recording in recordings:
+        interview = interviews.get(recording.call_sid)
+        transcript = transcripts.get(recording.sid)
+        response = CallResponse(
+            interview_id=interview and interview['id'],
+            call_sid=recording.call_sid,
+            phone_number=interview['phone_number'] if interview else recording.call_sid,
+            recording_sid=recording.sid,
+            recording_url=recording_media_url(recording.sid),
+            recording_duration=_parse_duration(recording.duration),
+            transcript=transcript,
+            transcript_status='completed' if transcript else 'pending',
+            created_at=recording.date_created or now,
+            updated_at=now,
+        )
+        (transcribed if transcript else untranscribed).append(response)
+
+    recording_fields = ['interview', 'call_sid', 'recording_duration', 'updated_at']
+    if transcribed:
+        CallResponse.objects.bulk_create(
+            transcribed, update_conflicts=True, unique_fields=['recording_sid'],
+            update_fields=recording_fields + ['transcript', 'transcript_status']
+        )
+    if untranscribed:
+        CallResponse.objects.bulk_create(
+            untranscribed, update_conflicts=True, unique_fields=['recording_sid'], update_fields=recording_fields
+        )
+
+
+def import_from_twilio(client, since, workers=8, batch_size=200, dry_run=False, stdout=None):
+    """
+    Pull calls and recordings created since ``since`` and upsert them in batches.
+
+    Both listings are streamed page by page, transcripts are fetched on a
+    bounded thread pool and every batch is written with two or three bulk
+    statements. Returns the number of calls and recordings seen.
+    """
+    def report(message):
+        if stdout:
+            stdout.write(message)
+
+    provider = TwilioProvider(client)
+    calls_seen = recordings_seen = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Calls first, so recordings find their interview
+        for calls in batched(client.calls.stream(start_time_after=since), batch_size):
+            calls_seen += len(calls)
+            if not dry_run:
+                upsert_interviews(calls)
+            report(f"Imported {calls_seen} calls")
+
+        def fetch(recording):
+            try:
+                return recording.sid, provider.fetch_transcript(recording.sid)
+            except Exception as e:
+                # Left pending, the transcript worker retries it with backoff
+                logger.error(f"Error fetching transcript for recording {recording.sid}: {str(e)}")
+                return recording.sid, None
+
+        for recordings in batched(client.recordings.stream(date_created_after=since), batch_size):
+            recordings_seen += len(recordings)
+            transcripts = dict(executor.map(fetch, recordings))
+
+            # Recordings of calls that started before the window need their call fetched once
+            call_sids = {recording.call_sid for recording in recordings}
+            interviews = {
+                interview['call_sid']: interview
+                for interview in Interview.objects.filter(call_sid__in=call_sids).values('id', 'call_sid', 'phone_number')
+            }
+            missing = call_sids - interviews.keys()
+            if missing and not dry_run:
+                upsert_interviews(executor.map(lambda sid: client.calls(sid).fetch(), missing))
+                interviews.update({
+                    interview['call_sid']: interview
+                    for interview in Interview.objects.filter(call_sid__in=missing).values('id', 'call_sid', 'phone_number')
+                })
+
+            if not dry_run:
+                upsert_responses(recordings, transcripts, interviews)
+            report(f"Imported {recordings_seen} recordings, {sum(1 for text in transcripts.values() if text)} transcribed in this batch")
+
+    if not dry_run and (calls_seen or recordings_seen):
+        # Bulk upserts skip the per-row counter updates
+        recompute_stats()
+    return calls_seen, recordings_seen
+
+
+def import_since(client, since=None, **options):
+    """Import from an explicit start, or from the stored watermark, and advance the watermark"""
+    started_at = timezone.now()
+    if since is None:
+        watermark = get_watermark()
+        since = watermark - OVERLAP if watermark else started_at - timedelta(days=30)
+    result = import_from_twilio(client, since, **options)
+    if not options.get('dry_run'):
+        set_watermark(started_at)
+    return since, result
@@ -0,0 +1,112 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import json
+import re
+import threading
+import time
+import uuid
+
+
+class StubTwilioHandler(BaseHTTPRequestHandler):
+    """Answer the handful of Twilio REST endpoints this app uses with canned JSON"""
+
+    # Keep connections open so pooled clients can reuse them
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes, avoid the delayed-ACK stall on reused sockets
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.respond()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.form = {key: values[-1] for key, values in parse_qs(self.rfile.read(length).decode()).items()}
+        self.respond()
+
+    def respond(self):
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            server.peak_in_flight = max(server.peak_in_flight, server.in_flight)
+        if server.latency:
+            time.sleep(server.latency)
+        with server.lock:
+            server.requests += 1
+            server.in_flight -= 1
+
+        path = urlsplit(self.path).path
+        if re.search(r'/Recordings/(RE\w+)\.mp3$', path):
+            self.send_body(200, 'audio/mpeg', server.audio)
+            return
+
+        status, payload = 200, None
+        if re.search(r'/Calls\.json$', path) and self.command == 'POST':
+            sid = f"CA{uuid.uuid4().hex}"
+            status, payload = 201, {'sid': sid, 'to': self.form.get('To'), 'from': self.form.get('From'), 'status': 'queued'}
+        elif match := re.search(r'/Calls/(CA\w+)\.json$', path):
+            payload = {'sid': match.group(1), 'to': '+919876543210', 'status': 'in-progress'}
+        elif match := re.search(r'/Recordings/(RE\w+)\.json$', path):
+            payload = {'sid': match.group(1), 'duration': '12', 'uri': path}
+        elif path.endswith('/Transcriptions.json'):
+            payload = {'transcriptions': [{'sid': 'TR1', 'transcription_text': 'Stub transcript'}], 'next_page_uri': None}
+        elif re.search(r'/Accounts/(AC\w+)\.json$', path):
+            payload = {'sid': path.rsplit('/', 1)[-1][:-5], 'status': 'active'}
+        else:
+            status, payload = 404, {'code': 20404, 'message': 'Not found', 'status': 404}
+
+        self.send_body(status, 'application/json', json.dumps(payload).encode())
+
+    def send_body(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StubTwilioServer(ThreadingHTTPServer):
+    """
+    Local stand-in for api.twilio.com, used by benchmarks and load tests.
+
+    Usage::
+
+        with StubTwilioServer(latency=0.05) as stub:
+            settings.TWILIO_API_BASE_URL = stub.url
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, host='127.0.0.1', port=0, audio=b'ID3' + bytes(range(256)) * 64):
+        super().__init__((host, port), StubTwilioHandler)
+        self.latency = latency
+        # Served for every recording's .mp3
+        self.audio = audio
+        self.requests = 0
+        self.connections = 0
+        # Requests being answered right now, and the most seen at once
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def process_request(self, request, client_address):
+        with self.lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,144 @@
+from collections import namedtuple
+from django.conf import settings
+from functools import lru_cache
+from .models import InterviewScript
+from .prompts import get_synthesizer, prompt_url, render_prompts
+from .telephony import MAX_RECORDING_SECONDS, TRIM, VOICE, get_provider
+import threading
+import time
+
+# Define the sequence of questions
+INTERVIEW_QUESTIONS = [
+    "Hi, what is your full name?",
+    "What is your work experience?",
+    "What was your previous job role?",
+    "Why do you want to join our company?"
+]
+
+GOODBYE_MESSAGE = "Thank you for your time. We will review your responses and get back to you soon."
+ERROR_MESSAGE = "We're sorry, but there was an error processing your call. Please try again later."
+
+# Stands in for the response id inside cached TwiML, swapped in per request
+RESPONSE_ID_PLACEHOLDER = '__RESPONSE_ID__'
+
+# A script version's questions and the TwiML that asks each one and says goodbye, ready to serve.
+# Incomplete while some of its prompts are spoken because their audio has not been rendered yet.
+CompiledScript = namedtuple('CompiledScript', ['questions', 'templates', 'goodbye', 'complete', 'compiled_at'])
+
+_compiled = {}
+_compiled_lock = threading.Lock()
+
+
+def builtin_script():
+    """The script of calls placed without one: INTERVIEW_QUESTIONS with the default voice and limits"""
+    return InterviewScript(
+        name='Built-in', questions=INTERVIEW_QUESTIONS, voice=VOICE, max_length=MAX_RECORDING_SECONDS, trim=TRIM
+    )
+
+
+def build_question_twiml(question, response_id, public_url=None, provider=None, script=None, audio_url=None):
+    """Build the TwiML that asks one question, by playing its ``audio_url`` if rendered, and records the answer"""
+    public_url = public_url or settings.PUBLIC_URL
+    provider = provider or get_provider()
+    script = script or builtin_script()
+    return provider.question_markup(
+        question, f'{public_url}/voice/?response_id={response_id}',
+        voice=script.voice, max_length=script.max_length, trim=script.trim, audio_url=audio_url
+    )
+
+
+def script_prompts(script):
+    """Everything a script version says: its questions and the goodbye"""
+    return list(script.questions) + [GOODBYE_MESSAGE]
+
+
+def render_script_prompts(script):
+    """Render a script version's prompts to audio, so its calls <Play> them; returns how many were rendered"""
+    rendered = render_prompts(script_prompts(script), script.voice)
+    if rendered:
+        invalidate_script(script.id)
+    return rendered
+
+
+def compile_script(script, public_url=None, provider=None):
+    """
+    Build every TwiML fragment of a script version, with a placeholder for the response id.
+
+    Prompts with rendered audio are played, the rest are spoken with <Say>
+    until their audio exists.
+    """
+    provider = provider or get_provider()
+    urls = {text: prompt_url(text, script.voice) for text in script_prompts(script)}
+    return CompiledScript(
+        questions=tuple(script.questions),
+        templates=tuple(
+            build_question_twiml(question, RESPONSE_ID_PLACEHOLDER, public_url, provider, script, urls[question])
+            for question in script.questions
+        ),
+        goodbye=provider.say_markup(GOODBYE_MESSAGE, voice=script.voice, audio_url=urls[GOODBYE_MESSAGE]),
+        complete=get_synthesizer() is None or all(urls.values()),
+        compiled_at=time.monotonic(),
+    )
+
+
+def get_script(script_id=None):
+    """
+    The compiled TwiML of a script version, or of the built-in script for None.
+
+    Each version is read and compiled once per process and served from
+    memory after that. Published versions never change, so workers need not
+    agree on when to drop them; a new version is a new entry. A version
+    still missing prompt audio is recompiled every PROMPT_AUDIO_RECHECK
+    seconds until the audio rendered by any process shows up.
+    """
+    key = (script_id, settings.PUBLIC_URL, get_provider(), get_synthesizer())
+    compiled = _compiled.get(key)
+    if compiled is not None and not compiled.complete and (
+        time.monotonic() - compiled.compiled_at >= settings.PROMPT_AUDIO_RECHECK
+    ):
+        compiled = None
+    if compiled is None:
+        script = InterviewScript.objects.get(id=script_id) if script_id else builtin_script()
+        compiled = compile_script(script, key[1], key[2])
+        with _compiled_lock:
+            _compiled[key] = compiled
+    return compiled
+
+
+def invalidate_script(script_id):
+    """Drop a script version's compiled TwiML, e.g. after the row was edited in place"""
+    with _compiled_lock:
+        for key in [key for key in _compiled if key[0] == script_id]:
+            del _compiled[key]
+
+
+def script_changed(sender, instance, **kwargs):
+    """post_save and post_delete receiver for InterviewScript"""
+    invalidate_script(instance.id)
+
+
+def question_twiml(index, response_id, script_id=None):
+    """TwiML for question ``index`` of a script version, served from its compiled fragments"""
+    template = get_script(script_id).templates[index]
+    return template.replace(RESPONSE_ID_PLACEHOLDER, str(response_id))
+
+
+@lru_cache(maxsize=None)
+def _say_twiml(message, provider):
+    return provider.say_markup(message)
+
+
+def goodbye_twiml(script_id=None):
+    """TwiML that thanks the candidate once every question has been asked"""
+    return get_script(script_id).goodbye
+
+
+def error_twiml():
+    """TwiML played when a webhook fails"""
+    return _say_twiml(ERROR_MESSAGE, get_provider())
+
+
+def warm_twiml_cache():
+    """Build the built-in script's fragments up front so the first call pays nothing"""
+    get_script()
+    error_twiml()
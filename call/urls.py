@@ -4,11 +4,22 @@ from . import views
 urlpatterns = [
     path('', views.index, name='index'),
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('search/', views.search, name='search'),
+    path('api/calls/', views.api_calls, name='api_calls'),
+    path('analytics/', views.analytics, name='analytics'),
+    path('api/analytics/', views.api_analytics, name='api_analytics'),
+    path('events/', views.live_events, name='live_events'),
     path('make-call/', views.make_call, name='make_call'),
     path('answer/', views.answer, name='answer'),
     path('voice/', views.voice, name='voice'),
     path('test-config/', views.test_config, name='test_config'),
+    path('metrics', views.metrics, name='metrics'),
     path('view-response/<int:response_id>/', views.view_response, name='view_response'),
+    path('recordings/<str:recording_sid>.mp3', views.recording_audio, name='recording_audio'),
     path('export-excel/', views.export_to_excel, name='export_excel'),
+    path('export-csv/', views.export_to_csv, name='export_csv'),
     path('transcription/', views.transcription_webhook, name='transcription'),
+    path('call_status/', views.call_status, name='call_status'),
+    path('campaigns/', views.campaigns, name='campaigns'),
+    path('campaigns/upload/', views.upload_campaign, name='upload_campaign'),
 ]
\ No newline at end of file
@@ -1,22 +1,46 @@
-from django.http import HttpResponse, JsonResponse
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.shortcuts import render, redirect
-from twilio.twiml.voice_response import VoiceResponse, Record, Say, Gather
-from twilio.rest import Client
 from django.conf import settings
 from urllib.parse import quote
-from .models import Recording, CallResponse
+from .models import Recording, CallResponse, Campaign, CampaignNumber, Interview
+from .api import MAX_PAGE_SIZE, OVERLAP, calls_etag, changed_calls, last_change, parse_updated_since, removal_stamp, serialize_call
+from .analytics import analytics_version, get_analytics
+from .archive import archived_responses
+from .interviews import answer_interview, complete_interview, record_answer
+from .metrics import render_metrics
+from .recordings import RECORDING_SID, RecordingCache
+from .search import parse_search_cursor, search_responses
+from .spool import spool_status, spool_transcription
+from .state import get_state_store
+from .stats import increment, read_stats
+from .dialer import place_call, place_call_async
+from .events import event_stream, get_feed
+from .twilio_client import get_client
+from .scripts import current_scripts, parse_script_id
+from .twiml import error_twiml, get_script, goodbye_twiml, question_twiml
 import re
 from django.views.decorators.http import require_http_methods
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
 from django.utils import timezone
-import pandas as pd
+from django.utils.cache import get_conditional_response
+from django.utils.crypto import constant_time_compare
+from django.utils.dateparse import parse_date
+from django.utils.http import http_date, parse_http_date_safe
+from django.db import transaction
+from django.db.models import Case, Count, Prefetch, Q, Value, When
+from openpyxl import Workbook, load_workbook
+from openpyxl.utils import get_column_letter
+import csv
 import logging
 import time
 import json
-from io import BytesIO
+from itertools import chain, islice
+import tempfile
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 
@@ -25,22 +49,18 @@ logger = logging.getLogger(__name__)
 # Load environment variables first
 load_dotenv()
 
-# Initialize Twilio client with environment variables
-client = Client(
-    os.getenv('TWILIO_ACCOUNT_SID'),
-    os.getenv('TWILIO_AUTH_TOKEN')
-)
+# A new recording queues its transcript, unless the transcription webhook already delivered it
+PENDING_TRANSCRIPT = Case(When(transcript_status='completed', then=Value('completed')), default=Value('pending'))
 
 # Public URL for webhooks - Replace this with your actual public URL
 PUBLIC_URL = "https://call-1-u39m.onrender.com"  # Update this with your Render URL
 
-# Define the sequence of questions
-INTERVIEW_QUESTIONS = [
-    "Hi, what is your full name?",
-    "What is your work experience?",
-    "What was your previous job role?",
-    "Why do you want to join our company?"
-]
+def _parse_duration(value):
+    """Parse a duration in seconds from a webhook payload, tolerating blanks"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
 
 def format_phone_number(phone_number):
     """Format phone number to E.164 format"""
@@ -60,7 +80,7 @@ def format_phone_number(phone_number):
 # Make a call to client
 @csrf_exempt
 @require_http_methods(["POST"])
-def make_call(request):
+async def make_call(request):
     try:
         phone_number = request.POST.get('phone_number')
         if not phone_number:
@@ -74,32 +94,15 @@ def make_call(request):
             else:
                 phone_number = '+91' + phone_number
 
-        # Create Twilio client
-        client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-        
-        # Reset session for new call
-        request.session['current_question_index'] = 0
-        
-        # Create webhook URL using settings
-        webhook_url = f"{settings.PUBLIC_URL}/answer/"
-        
-        # Make the call
-        call = client.calls.create(
-            to=phone_number,
-            from_=settings.TWILIO_PHONE_NUMBER,
-            url=webhook_url,
-            record=True,
-            status_callback=f"{settings.PUBLIC_URL}/call_status/",
-            status_callback_event=['initiated', 'ringing', 'answered', 'completed']
-        )
-        
-        # Create initial call response record
-        CallResponse.objects.create(
-            phone_number=phone_number,
-            call_sid=call.sid,
-            call_status=call.status,
-            question="Call initiated"
-        )
+        # The script version to ask, checked before anyone is dialed
+        script_id = await sync_to_async(parse_script_id)(request.POST.get('script'))
+
+        # Make the call and create the interview record. Under ASGI the Twilio request is awaited on
+        # the worker's event loop; under WSGI every request gets a throwaway loop, so use the pooled sync client.
+        if isinstance(request, ASGIRequest):
+            call = await place_call_async(phone_number, script_id=script_id)
+        else:
+            call = await sync_to_async(place_call)(phone_number, script_id=script_id)
         
         logger.info(f"Call initiated to {phone_number} with SID: {call.sid}")
         messages.success(request, f"Call successfully initiated to {phone_number}")
@@ -110,10 +113,79 @@ def make_call(request):
         messages.error(request, f"Error making call: {str(e)}")
         return redirect('dashboard')
 
+def read_phone_numbers(uploaded_file):
+    """Read phone numbers from the first column of an uploaded CSV or XLSX file, normalized to E.164"""
+    if uploaded_file.name.lower().endswith('.xlsx'):
+        workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+        values = (row[0] for row in workbook.active.iter_rows(values_only=True) if row)
+    else:
+        lines = (line.decode('utf-8-sig') for line in uploaded_file)
+        values = (row[0] for row in csv.reader(lines) if row)
+
+    numbers = []
+    seen = set()
+    for value in values:
+        # Spreadsheets hand back numeric cells as floats
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        digits = ''.join(filter(str.isdigit, str(value or '')))
+        if len(digits) < 10:
+            # Header rows and junk cells
+            continue
+        phone_number = format_phone_number(digits.lstrip('0') if len(digits) == 11 else digits)
+        if phone_number.startswith('+') and phone_number not in seen:
+            seen.add(phone_number)
+            numbers.append(phone_number)
+    return numbers
+
+@login_required
+@require_http_methods(["POST"])
+def upload_campaign(request):
+    """Store an uploaded list of numbers as a campaign; the run_campaigns worker dials it"""
+    try:
+        uploaded_file = request.FILES.get('numbers_file')
+        if not uploaded_file:
+            messages.error(request, "Please choose a CSV or XLSX file of phone numbers")
+            return redirect('campaigns')
+
+        numbers = read_phone_numbers(uploaded_file)
+        if not numbers:
+            messages.error(request, "No valid phone numbers found in the uploaded file")
+            return redirect('campaigns')
+
+        script_id = parse_script_id(request.POST.get('script'))
+
+        with transaction.atomic():
+            campaign = Campaign.objects.create(name=request.POST.get('name') or uploaded_file.name, script_id=script_id)
+            CampaignNumber.objects.bulk_create(
+                CampaignNumber(campaign=campaign, phone_number=phone_number) for phone_number in numbers
+            )
+
+        logger.info(f"Campaign {campaign.id} created with {len(numbers)} numbers")
+        messages.success(request, f"Campaign '{campaign.name}' queued with {len(numbers)} numbers")
+        return redirect('campaigns')
+
+    except Exception as e:
+        logger.error(f"Error uploading campaign: {str(e)}")
+        messages.error(request, f"Error uploading campaign: {str(e)}")
+        return redirect('campaigns')
+
+@login_required
+def campaigns(request):
+    """List campaigns with per-status dialing progress"""
+    campaign_list = Campaign.objects.annotate(
+        total_numbers=Count('numbers'),
+        queued_numbers=Count('numbers', filter=Q(numbers__status='queued')),
+        dialing_numbers=Count('numbers', filter=Q(numbers__status='dialing')),
+        completed_numbers=Count('numbers', filter=Q(numbers__status='completed')),
+        failed_numbers=Count('numbers', filter=Q(numbers__status='failed'))
+    ).select_related('script')[:50]
+    return render(request, 'call/campaigns.html', {'campaigns': campaign_list, 'scripts': current_scripts()})
+
 # Answer call with questions
 @csrf_exempt
 @require_http_methods(["POST"])
-def answer(request):
+async def answer(request):
     """Handle incoming call and play question"""
     try:
         # Get the call SID from the request
@@ -122,80 +194,47 @@ def answer(request):
             logger.error("No CallSid provided in request")
             return HttpResponse('No CallSid provided', status=400)
 
-        # Get the phone number from the request
+        # The webhook payload carries everything we need, no Twilio API round trip
         phone_number = request.POST.get('To', '')
         logger.info(f"Received call from {phone_number} with SID: {call_sid}")
+
+        return HttpResponse(await sync_to_async(_start_interview)(call_sid, phone_number))
         
-        # Initialize Twilio client
-        client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-        
-        # Get call details
-        call = client.calls(call_sid).fetch()
-        
-        # Get the first question
-        question = INTERVIEW_QUESTIONS[0]
-        
-        # Create a new response record
+    except Exception as e:
+        logger.error(f"Error in answer view: {str(e)}")
+        return HttpResponse(error_twiml())
+
+def _start_interview(call_sid, phone_number):
+    """Record the first question of a call and return its TwiML; the transaction keeps this a sync unit"""
+    store = get_state_store()
+    with transaction.atomic():
+        # Mark the interview in progress
+        interview = answer_interview(call_sid, phone_number)
+
+        # Create a new response record for the first question of the call's script
         response = CallResponse.objects.create(
+            interview=interview,
             phone_number=phone_number,
             call_sid=call_sid,
-            question=question,
-            call_status='in-progress'
-        )
-        
-        # Store the response ID in the session
-        request.session['response_id'] = response.id
-        
-        # Create TwiML response
-        resp = VoiceResponse()
-        
-        # Add a short pause before asking the question
-        resp.pause(length=0.5)
-        
-        # Ask the question
-        resp.say(question, voice='Polly.Amy')
-        
-        # Add a short pause after the question
-        resp.pause(length=0.5)
-        
-        # Record the response
-        resp.record(
-            action=f'{settings.PUBLIC_URL}/voice/?response_id={response.id}',
-            maxLength='30',
-            playBeep=False,
-            trim='trim-silence'
+            question=get_script(interview.script_id).questions[0]
         )
-        
-        return HttpResponse(str(resp))
-        
-    except Exception as e:
-        logger.error(f"Error in answer view: {str(e)}")
-        resp = VoiceResponse()
-        resp.say("We're sorry, but there was an error processing your call. Please try again later.", voice='Polly.Amy')
-        return HttpResponse(str(resp))
+        increment(total_responses=1)
 
-def fetch_transcript(recording_sid):
-    """Fetch transcript for a recording using Twilio's API"""
-    try:
-        client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-        
-        # Get the recording
-        recording = client.recordings(recording_sid).fetch()
-        
-        # Get the transcript
-        transcript = client.recordings(recording_sid).transcriptions.list()
-        
-        if transcript:
-            return transcript[0].transcription_text
-        return None
-    except Exception as e:
-        logger.error(f"Error fetching transcript: {str(e)}")
-        return None
+        # Start tracking the call's progress, unless a retry of this webhook already did
+        started = store.compare_and_set(call_sid, None, question_index=1, response_id=response.id)
+        if not started:
+            transaction.set_rollback(True)
+
+    if not started:
+        return _state_twiml(store.get(call_sid), interview.script_id)
+
+    # Serve the prebuilt TwiML for the first question
+    return question_twiml(0, response.id, interview.script_id)
 
 # Handle recorded answer
 @csrf_exempt
 @require_http_methods(["POST"])
-def recording_status(request):
+async def recording_status(request):
     """Handle recording status and ask next question"""
     try:
         # Get the call SID from the request
@@ -218,150 +257,242 @@ def recording_status(request):
 
         logger.info(f"Processing recording {recording_sid} for call {call_sid} with response_id {response_id}")
         
-        # Initialize Twilio client
-        client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-        
-        # Get call details
-        call = client.calls(call_sid).fetch()
-        
-        # Update the response with recording details
+        # Update the response with the recording details from the payload
         try:
-            response = CallResponse.objects.get(id=response_id)
-            recording = client.recordings(recording_sid).fetch()
-            response.recording_sid = recording_sid
-            response.recording_url = recording.uri
-            response.recording_duration = recording.duration
-            response.save()
-
-            # Try to get the transcript
-            try:
-                # Get transcript for this recording
-                transcript = client.transcriptions.list(recording_sid=recording_sid)
-                if transcript:
-                    response.transcript = transcript[0].transcription_text
-                    response.transcript_status = 'completed'
-                else:
-                    response.transcript_status = 'pending'
-            except Exception as e:
-                logger.error(f"Error fetching transcript for recording {recording_sid}: {str(e)}")
-                response.transcript_status = 'failed'
-            response.save()
-
-            # Create a new VoiceResponse for the next question
-            resp = VoiceResponse()
-            
-            # Get questions from session or use default
-            questions = request.session.get('questions', INTERVIEW_QUESTIONS)
-            
-            # Get current question index from session or initialize to 0
-            current_index = request.session.get('current_question_index', 0)
-            
-            if current_index < len(questions):
-                # Ask the next question
-                resp.say(questions[current_index], voice='Polly.Amy')
-                resp.record(
-                    action=f'{settings.PUBLIC_URL}/voice/?response_id={response.id}',
-                    maxLength='30',
-                    playBeep=False,
-                    trim='trim-silence'
-                )
-                
-                # Increment the question index for next time
-                request.session['current_question_index'] = current_index + 1
-            else:
-                # All questions have been asked
-                resp.say("Thank you for your time. We will review your responses and get back to you soon.", voice='Polly.Amy')
-                
-                # Update all responses for this call to completed
-                CallResponse.objects.filter(call_sid=call_sid).update(call_status='completed')
-                
-                # Reset the session
-                request.session['current_question_index'] = 0
-                if 'response_id' in request.session:
-                    del request.session['response_id']
-                if 'questions' in request.session:
-                    del request.session['questions']
-            
-            return HttpResponse(str(resp))
-            
+            response = await CallResponse.objects.aget(id=response_id)
         except CallResponse.DoesNotExist:
             logger.error(f"Response not found: {response_id}")
             return HttpResponse('Response not found', status=404)
+
+        twiml = await sync_to_async(_record_and_ask_next)(call_sid, response, {
+            'recording_sid': recording_sid,
+            'recording_url': request.POST.get('RecordingUrl'),
+            'recording_duration': _parse_duration(request.POST.get('RecordingDuration')),
+        })
+        return HttpResponse(twiml)
             
     except Exception as e:
         logger.error(f"Error in recording_status view: {str(e)}")
-        resp = VoiceResponse()
-        resp.say("We're sorry, but there was an error processing your call. Please try again later.", voice='Polly.Amy')
-        return HttpResponse(str(resp))
+        return HttpResponse(error_twiml())
+
+def _record_and_ask_next(call_sid, response, recording):
+    """Store a recording on its response and return the TwiML for the next question"""
+    # Get the current question index for this call
+    store = get_state_store()
+    state = store.get(call_sid)
+    current_index = state['question_index'] if state else 0
+    version = state['version'] if state else None
+    script_id = Interview.objects.filter(call_sid=call_sid).values_list('script_id', flat=True).first()
+    asking = current_index < len(get_script(script_id).questions)
+
+    with transaction.atomic():
+        CallResponse.objects.filter(id=response.id).update(
+            # The transcript is picked up later by the process_transcripts worker
+            transcript_status=PENDING_TRANSCRIPT,
+            updated_at=timezone.now(),
+            **recording
+        )
+        record_answer(call_sid)
+
+        if asking:
+            # Increment the question index for next time
+            next_state = {'question_index': current_index + 1, 'response_id': response.id}
+        else:
+            # All questions have been asked, mark the interview completed
+            complete_interview(call_sid)
+            next_state = {'question_index': current_index, 'response_id': None}
+
+        # Advance only if no concurrent copy of this webhook got there first
+        advanced = store.compare_and_set(call_sid, version, **next_state)
+        if not advanced:
+            transaction.set_rollback(True)
+
+    if not advanced:
+        logger.info(f"Concurrent webhook already advanced call {call_sid}")
+        return _state_twiml(store.get(call_sid), script_id)
+    if asking:
+        # Ask the next question from the prebuilt cache
+        return question_twiml(current_index, response.id, script_id)
+    return goodbye_twiml(script_id)
 
 # HR Dashboard
+def _parse_dashboard_cursor(cursor):
+    """Split a '<created_at>|<id>' keyset cursor, or return None if it is malformed"""
+    try:
+        created_at, interview_id = cursor.split('|', 1)
+        created_at = datetime.fromisoformat(created_at)
+        interview_id = int(interview_id)
+    except (AttributeError, ValueError):
+        return None
+    if timezone.is_naive(created_at):
+        created_at = timezone.make_aware(created_at)
+    return created_at, interview_id
+
 @login_required
 def dashboard(request):
     """Display call dashboard"""
     try:
-        # Get all calls with their responses
-        calls = CallResponse.objects.values('call_sid').distinct()
-        call_records = []
-        
-        for call in calls:
-            # Get the first response for each call to get call details
-            first_response = CallResponse.objects.filter(call_sid=call['call_sid']).first()
-            if first_response:
-                # Get all responses for this call
-                responses = CallResponse.objects.filter(call_sid=call['call_sid']).order_by('created_at')
-                
-                # Get transcripts for each response
-                for response in responses:
-                    if response.recording_sid and not response.transcript:
-                        try:
-                            client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-                            transcript = client.transcriptions.list(recording_sid=response.recording_sid)
-                            if transcript:
-                                response.transcript = transcript[0].transcription_text
-                                response.transcript_status = 'completed'
-                                response.save()
-                        except Exception as e:
-                            logger.error(f"Error fetching transcript for recording {response.recording_sid}: {str(e)}")
-                
-                call_records.append({
-                    'phone_number': first_response.phone_number,
-                    'call_sid': first_response.call_sid,
-                    'call_status': first_response.call_status,
-                    'created_at': first_response.created_at,
-                    'recording_duration': first_response.recording_duration,
-                    'responses': responses
-                })
-        
-        # Calculate statistics
-        total_calls = len(call_records)
-        completed_calls = CallResponse.objects.filter(call_status='completed').values('call_sid').distinct().count()
-        total_responses = CallResponse.objects.count()
-        completed_transcripts = CallResponse.objects.filter(transcript_status='completed').count()
-        
+        page_size = settings.DASHBOARD_PAGE_SIZE
+
+        # Newest interviews first, with their responses prefetched in one query
+        interviews = Interview.objects.order_by('-created_at', '-id').prefetch_related(
+            Prefetch('responses', queryset=CallResponse.objects.order_by('created_at', 'id'), to_attr='response_list')
+        )
+
+        # Keyset pagination on (created_at, id) so deep pages stay cheap
+        cursor = _parse_dashboard_cursor(request.GET.get('cursor'))
+        if cursor:
+            created_at, interview_id = cursor
+            interviews = interviews.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=interview_id)
+            )
+
+        # Fetch one extra row to know whether there is an older page
+        call_records = list(interviews[:page_size + 1])
+        has_next = len(call_records) > page_size
+        call_records = call_records[:page_size]
+
+        next_cursor = None
+        if has_next:
+            last_call = call_records[-1]
+            next_cursor = f"{last_call.created_at.isoformat()}|{last_call.id}"
+
+        # Statistics come from counters maintained by the webhooks, not from aggregates
+        stats = read_stats()
+
         context = {
             'call_records': call_records,
-            'total_calls': total_calls,
-            'completed_calls': completed_calls,
-            'total_responses': total_responses,
-            'completed_transcripts': completed_transcripts
+            'next_cursor': next_cursor,
+            'is_first_page': cursor is None,
+            'scripts': current_scripts(),
+            **stats
         }
-        
+
         return render(request, 'call/dashboard.html', context)
-        
+
     except Exception as e:
         logger.error(f"Error in dashboard view: {str(e)}")
         messages.error(request, "Error loading dashboard")
         return redirect('home')
 
+@require_http_methods(["GET", "HEAD"])
+def api_calls(request):
+    """
+    Calls with their responses as JSON, newest first.
+
+    ``cursor`` pages like the dashboard and ``limit`` sets the page size.
+    ``updated_since`` returns only calls that changed after it, as did their
+    responses; poll with the first page's ``next_updated_since``, which only
+    moves when something changes. Pages carry an ETag, so a poll that sends
+    If-None-Match gets a 304 until a call or response changes or is removed.
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    try:
+        cursor = None
+        if request.GET.get('cursor'):
+            cursor = _parse_dashboard_cursor(request.GET['cursor'])
+            if cursor is None:
+                raise ValueError(f"Invalid cursor: {request.GET['cursor']!r}")
+        limit = int(request.GET.get('limit', settings.DASHBOARD_PAGE_SIZE))
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+        updated_since = parse_updated_since(request.GET['updated_since']) if request.GET.get('updated_since') else None
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    # Answer If-None-Match from the last change and removal alone, before reading the page
+    changed_at = last_change()
+    etag = calls_etag(request.get_full_path(), changed_at, removal_stamp())
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        calls, next_cursor = changed_calls(cursor, limit, updated_since)
+        response = JsonResponse({
+            'calls': [serialize_call(interview) for interview in calls],
+            'next_cursor': next_cursor,
+            'next_updated_since': (changed_at - OVERLAP).isoformat() if changed_at else None,
+        })
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+@login_required
+def search(request):
+    """Search transcripts and questions, best matches first"""
+    query = request.GET.get('q', '').strip()
+    cursor = parse_search_cursor(request.GET.get('cursor'))
+    results, next_cursor = [], None
+    if query:
+        results, next_cursor = search_responses(query, limit=settings.DASHBOARD_PAGE_SIZE, cursor=cursor)
+    return render(request, 'call/search.html', {
+        'query': query,
+        'results': results,
+        'next_cursor': next_cursor,
+        'is_first_page': cursor is None,
+    })
+
+@login_required
+def analytics(request):
+    """Completion funnel, answer lengths, transcript coverage and pickup rates over every call"""
+    return render(request, 'call/analytics.html', {'report': get_analytics()})
+
+@require_http_methods(["GET", "HEAD"])
+def api_analytics(request):
+    """The analytics reports as JSON, with an ETag that changes with the data"""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    version = analytics_version()
+    etag = f'"{version}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(get_analytics(version))
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
 def index(request):
     """Render the main page"""
     return render(request, 'call/dashboard.html')
 
+@login_required
+@require_http_methods(["GET"])
+async def live_events(request):
+    """
+    Server-sent events that patch the open dashboard as calls and transcripts change.
+
+    Each worker polls for changes once for all its dashboards, see
+    call/events.py; a reconnecting browser resumes from its Last-Event-ID.
+    Under WSGI a stream would hold a worker for as long as the page is open,
+    so it answers 204 instead, which tells EventSource not to reconnect.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    since = None
+    if request.headers.get('Last-Event-ID'):
+        try:
+            since = parse_updated_since(request.headers['Last-Event-ID'])
+        except ValueError:
+            pass
+    response = StreamingHttpResponse(event_stream(get_feed(), since), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Let nginx pass events through as they are written
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@require_http_methods(["GET"])
+def metrics(request):
+    """Request and Twilio API metrics of this worker process, for Prometheus to scrape"""
+    if settings.METRICS_TOKEN and not constant_time_compare(
+        request.headers.get('Authorization', ''), f"Bearer {settings.METRICS_TOKEN}"
+    ):
+        return HttpResponse(status=401)
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 def test_config(request):
     """Test Twilio configuration and webhook URLs"""
     try:
         # Test Twilio credentials
-        client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+        client = get_client()
         account = client.api.accounts(settings.TWILIO_ACCOUNT_SID).fetch()
         
         # Get webhook URLs
@@ -403,57 +534,240 @@ def view_response(request, response_id):
     response = CallResponse.objects.get(id=response_id)
     return render(request, 'call/view_response.html', {'response': response})
 
+BYTE_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+def _parse_byte_range(header, size):
+    """
+    Return the (start, end) of a single "bytes=" Range header, inclusive.
+
+    None means serve the whole file (malformed or multi-range headers may be
+    ignored), False means the range lies outside the file.
+    """
+    match = BYTE_RANGE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        if int(last) == 0 or size == 0:
+            return False
+        return max(0, size - int(last)), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        return False
+    return start, min(int(last), size - 1) if last else size - 1
+
+# Bytes a streamed file or export is read in, and sent per trip to a worker thread under ASGI
+STREAM_CHUNK_SIZE = 64 * 1024
+
+def _next_chunk(iterator, size):
+    """Join the next parts of a sync iterator until they reach ``size``; None once it is exhausted"""
+    parts, length = [], 0
+    for part in iterator:
+        parts.append(part)
+        length += len(part)
+        if length >= size:
+            break
+    if not parts:
+        return None
+    return b''.join(part if isinstance(part, bytes) else part.encode() for part in parts)
+
+async def _async_chunks(iterator, size=None):
+    """Advance a sync iterator on the request's worker thread a chunk at a time, closing it when done"""
+    size = size or STREAM_CHUNK_SIZE
+    try:
+        while (chunk := await sync_to_async(_next_chunk)(iterator, size)) is not None:
+            yield chunk
+    finally:
+        if hasattr(iterator, 'close'):
+            await sync_to_async(iterator.close)()
+
+def _stream(request, iterator):
+    """
+    Streaming content for a response that reads a cursor or file as it is sent.
+
+    Under ASGI Django reads a sync iterator to the end before sending any of
+    it, so there it is wrapped in an async iterator; WSGI servers pull the
+    sync iterator as they write.
+    """
+    if isinstance(request, ASGIRequest):
+        return _async_chunks(iterator)
+    return iterator
+
+def _file_range(file, start, length, chunk_size=None):
+    """Yield length bytes of a file from start and close it once they have been sent"""
+    chunk_size = chunk_size or STREAM_CHUNK_SIZE
+    try:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+@login_required
+@require_http_methods(["GET", "HEAD"])
+def recording_audio(request, recording_sid):
+    """Serve a recording's MP3 from the local cache, fetching it from the telephony provider only on a miss"""
+    if not RECORDING_SID.match(recording_sid):
+        return HttpResponse(status=404)
+    cache = RecordingCache()
+    if cache.get(recording_sid) is None and not CallResponse.objects.filter(recording_sid=recording_sid).exists():
+        return HttpResponse(status=404)
+    try:
+        file = cache.open(recording_sid)
+    except Exception as e:
+        logger.error(f"Error fetching recording {recording_sid}: {str(e)}")
+        return HttpResponse(status=502)
+
+    # Recordings never change, so the SID and size identify the content
+    stat = os.fstat(file.fileno())
+    size, last_modified = stat.st_size, int(stat.st_mtime)
+    etag = f'"{recording_sid}-{size}"'
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        byte_range = None
+        if_range = request.headers.get('If-Range')
+        if request.headers.get('Range') and (not if_range or if_range == etag or parse_http_date_safe(if_range) == last_modified):
+            byte_range = _parse_byte_range(request.headers['Range'], size)
+
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f"bytes */{size}"
+        elif byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _stream(request, _file_range(file, start, end - start + 1)), status=206, content_type='audio/mpeg'
+            )
+            response['Content-Range'] = f"bytes {start}-{end}/{size}"
+            response['Content-Length'] = str(end - start + 1)
+            file = None
+        elif isinstance(request, ASGIRequest):
+            response = StreamingHttpResponse(_stream(request, _file_range(file, 0, size)), content_type='audio/mpeg')
+            response['Content-Length'] = str(size)
+            file = None
+        else:
+            # WSGI servers may send the file with wsgi.file_wrapper
+            response = FileResponse(file, content_type='audio/mpeg')
+            file = None
+    if file is not None:
+        file.close()
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private, max-age=86400'
+    return response
+
+# Export columns, in order, paired with the CallResponse field or lookup each is read from
+EXPORT_COLUMNS = [
+    ('Phone Number', 'phone_number'),
+    ('Question', 'question'),
+    ('Response', 'response'),
+    ('Recording URL', 'recording_url'),
+    ('Recording Duration (seconds)', 'recording_duration'),
+    ('Transcript', 'transcript'),
+    ('Transcript Status', 'transcript_status'),
+    ('Call SID', 'call_sid'),
+    ('Call Duration (seconds)', 'interview__duration'),
+    ('Call Status', 'interview__status'),
+    ('Created At', 'created_at'),
+    ('Updated At', 'updated_at'),
+]
+EXPORT_CHUNK_SIZE = 2000
+# Rows sampled to estimate column widths, the write-only sheet needs them before the first row
+EXPORT_WIDTH_SAMPLE = 200
+EXPORT_MAX_COLUMN_WIDTH = 80
+
+def _export_filters(request):
+    """The created_at range and call status picked by ?start=, ?end= (YYYY-MM-DD) and ?status="""
+    start = parse_date(request.GET.get('start') or '')
+    if start:
+        start = timezone.make_aware(datetime.combine(start, datetime.min.time()))
+    end = parse_date(request.GET.get('end') or '')
+    if end:
+        end = timezone.make_aware(datetime.combine(end + timedelta(days=1), datetime.min.time()))
+    return start, end, request.GET.get('status') or None
+
+def _export_queryset(fields, start=None, end=None, status=None):
+    """Responses in the database to export, filtered in SQL"""
+    responses = CallResponse.objects.order_by('-created_at')
+    if start:
+        responses = responses.filter(created_at__gte=start)
+    if end:
+        responses = responses.filter(created_at__lt=end)
+    if status:
+        responses = responses.filter(interview__status=status)
+    return responses.values_list(*fields)
+
+def _export_rows(request):
+    """
+    Stream export rows from the database a chunk at a time, then from the
+    archive a month at a time; archived responses are the oldest
+    """
+    filters = _export_filters(request)
+    fields = [field for _, field in EXPORT_COLUMNS]
+    responses = chain(
+        _export_queryset(fields, *filters).iterator(chunk_size=EXPORT_CHUNK_SIZE),
+        archived_responses(fields, *filters, chunk_size=EXPORT_CHUNK_SIZE),
+    )
+    for values in responses:
+        row = [value if value not in (None, '') else 'N/A' for value in values]
+        row[-2] = values[-2].strftime('%Y-%m-%d %H:%M:%S')
+        row[-1] = values[-1].strftime('%Y-%m-%d %H:%M:%S')
+        yield row
+
+def _file_chunks(file, chunk_size=None):
+    """Yield a file in chunks and close it once it has been sent"""
+    chunk_size = chunk_size or STREAM_CHUNK_SIZE
+    try:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        file.close()
+
+class _Echo:
+    """File-like object whose write() hands the written value straight back, for streaming csv.writer"""
+    def write(self, value):
+        return value
+
 def export_to_excel(request):
     try:
-        # Get all responses
-        responses = CallResponse.objects.all().order_by('-created_at')
-        
-        # Create a DataFrame
-        data = []
-        for response in responses:
-            data.append({
-                'Phone Number': response.phone_number,
-                'Question': response.question or 'N/A',
-                'Response': response.response or 'N/A',
-                'Recording URL': response.recording_url or 'N/A',
-                'Recording Duration (seconds)': response.recording_duration or 'N/A',
-                'Transcript': response.transcript or 'N/A',
-                'Transcript Status': response.transcript_status,
-                'Call SID': response.call_sid or 'N/A',
-                'Call Duration (seconds)': response.call_duration or 'N/A',
-                'Call Status': response.call_status or 'N/A',
-                'Created At': response.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                'Updated At': response.updated_at.strftime('%Y-%m-%d %H:%M:%S')
-            })
-        
-        df = pd.DataFrame(data)
-        
-        # Create Excel writer
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='Call Responses', index=False)
-            
-            # Get workbook and worksheet
-            workbook = writer.book
-            worksheet = writer.sheets['Call Responses']
-            
-            # Auto-adjust column widths
-            for column in worksheet.columns:
-                max_length = 0
-                column = [cell for cell in column]
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = (max_length + 2)
-                worksheet.column_dimensions[column[0].column_letter].width = adjusted_width
-        
-        # Set up the response
+        rows = _export_rows(request)
+        headers = [header for header, _ in EXPORT_COLUMNS]
+
+        # Estimate column widths from the first rows instead of scanning every cell
+        sample = list(islice(rows, EXPORT_WIDTH_SAMPLE))
+        widths = [len(header) for header in headers]
+        for row in sample:
+            for index, value in enumerate(row):
+                widths[index] = max(widths[index], len(str(value)))
+
+        # A write-only workbook flushes rows to disk as they are appended
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet('Call Responses')
+        for index, width in enumerate(widths, start=1):
+            worksheet.column_dimensions[get_column_letter(index)].width = min(width + 2, EXPORT_MAX_COLUMN_WIDTH)
+
+        worksheet.append(headers)
+        for row in chain(sample, rows):
+            worksheet.append(row)
+
+        # Save to a temporary file and stream it back instead of holding the workbook in memory
+        output = tempfile.TemporaryFile()
+        workbook.save(output)
         output.seek(0)
-        response = HttpResponse(
-            output.read(),
+
+        response = StreamingHttpResponse(
+            _stream(request, _file_chunks(output)),
             content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
         )
         response['Content-Disposition'] = 'attachment; filename=call_responses.xlsx'
@@ -465,8 +779,25 @@ def export_to_excel(request):
         messages.error(request, f"Error exporting to Excel: {str(e)}")
         return redirect('dashboard')
 
+def export_to_csv(request):
+    """Stream responses as CSV, one database chunk at a time"""
+    writer = csv.writer(_Echo())
+    headers = [header for header, _ in EXPORT_COLUMNS]
+    rows = chain([headers], _export_rows(request))
+    response = StreamingHttpResponse(_stream(request, (writer.writerow(row) for row in rows)), content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename=call_responses.csv'
+    return response
+
+def _state_twiml(state, script_id):
+    """The TwiML last served for a call's state: the pending question, or goodbye once the script is done"""
+    if state is None:
+        return error_twiml()
+    if state['response_id'] is None:
+        return goodbye_twiml(script_id)
+    return question_twiml(state['question_index'] - 1, state['response_id'], script_id)
+
 @csrf_exempt
-def voice(request):
+async def voice(request):
     """Handle voice response and ask next question"""
     try:
         # Get the call SID from the request
@@ -482,111 +813,95 @@ def voice(request):
             return HttpResponse('No response_id provided', status=400)
 
         logger.info(f"Processing voice response for call {call_sid} with response_id {response_id}")
+
+        # Recording details from the payload, if the candidate answered
+        recording = None
+        if request.POST.get('RecordingSid'):
+            recording = {
+                'recording_sid': request.POST.get('RecordingSid'),
+                'recording_url': request.POST.get('RecordingUrl'),
+                'recording_duration': _parse_duration(request.POST.get('RecordingDuration')),
+            }
+
+        twiml = await sync_to_async(_advance_interview)(call_sid, response_id, request.POST.get('To', ''), recording)
+        return HttpResponse(twiml)
         
-        # Initialize Twilio client
-        client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-        
-        # Get call details
-        call = client.calls(call_sid).fetch()
-        
-        # Get the recording SID from the request
-        recording_sid = request.POST.get('RecordingSid')
-        if recording_sid:
-            # Update the previous response with recording details
-            try:
-                response = CallResponse.objects.get(id=response_id)
-                recording = client.recordings(recording_sid).fetch()
-                response.recording_sid = recording_sid
-                response.recording_url = recording.uri
-                response.recording_duration = recording.duration
-                response.save()
-
-                # Get the transcript from Twilio
-                try:
-                    # Get the recording's transcript
-                    transcript = client.transcriptions.list(recording_sid=recording_sid)
-                    if transcript:
-                        response.transcript = transcript[0].transcription_text
-                        response.transcript_status = 'completed'
-                        logger.info(f"Transcript saved for recording {recording_sid}")
-                    else:
-                        response.transcript_status = 'pending'
-                        logger.info(f"No transcript available for recording {recording_sid}")
-                except Exception as e:
-                    logger.error(f"Error fetching transcript: {str(e)}")
-                    response.transcript_status = 'failed'
-                response.save()
-            except CallResponse.DoesNotExist:
+    except Exception as e:
+        logger.error(f"Error in voice view: {str(e)}")
+        return HttpResponse(error_twiml())
+
+def _advance_interview(call_sid, response_id, phone_number, recording):
+    """Store the answer to the current question and return the TwiML for the next step of the call"""
+    # Where this call is in the interview, shared by every worker
+    store = get_state_store()
+    state = store.get(call_sid)
+    # The call's interview, created when it was placed or answered
+    interview = Interview.objects.filter(call_sid=call_sid).values('id', 'script_id', 'ended_at').first() or {}
+    script_id = interview.get('script_id')
+    questions = get_script(script_id).questions
+
+    # A retry of a webhook we already answered, repeat that answer instead of advancing twice
+    if state and str(state['response_id']) != response_id:
+        logger.info(f"Repeating question {state['question_index']} for retried webhook on call {call_sid}")
+        return _state_twiml(state, script_id)
+
+    if state:
+        current_index = state['question_index']
+    elif interview.get('ended_at'):
+        # The final status callback beat the last recording and cleared the state
+        current_index = len(questions)
+    else:
+        current_index = 0
+
+    with transaction.atomic():
+        if recording:
+            # Update the previous response with the recording details from the payload
+            updated = CallResponse.objects.filter(id=response_id).update(
+                # The transcript is picked up later by the process_transcripts worker
+                transcript_status=PENDING_TRANSCRIPT,
+                updated_at=timezone.now(),
+                **recording
+            )
+            if updated:
+                record_answer(call_sid)
+            else:
                 logger.error(f"Response not found: {response_id}")
-        
-        # Get current question index from session or initialize to 0
-        current_index = request.session.get('current_question_index', 0)
-        
-        # Create response object
-        resp = VoiceResponse()
-        
+
         # Check if we have more questions to ask
-        if current_index < len(INTERVIEW_QUESTIONS):
-            # Get the current question
-            question = INTERVIEW_QUESTIONS[current_index]
-            
-            # Create a new CallResponse record
+        if current_index < len(questions):
+            # Create a new CallResponse record on the call's interview
             response = CallResponse.objects.create(
-                phone_number=call.to,
+                interview_id=interview.get('id'),
+                phone_number=phone_number,
                 call_sid=call_sid,
-                question=question,
-                call_status='in-progress'
+                question=questions[current_index]
             )
-            
-            # Store the response ID in the session
-            request.session['response_id'] = response.id
-            
-            # Add a short pause before asking the question
-            resp.pause(length=0.5)
-            
-            # Ask the question
-            resp.say(question, voice='Polly.Amy')
-            
-            # Add a short pause after the question
-            resp.pause(length=0.5)
-            
-            # Record the response
-            resp.record(
-                action=f'{settings.PUBLIC_URL}/voice/?response_id={response.id}',
-                maxLength='30',
-                playBeep=False,
-                trim='trim-silence'
-            )
-            
-            # Increment the question index for next time
-            request.session['current_question_index'] = current_index + 1
-            
-            logger.info(f"Generated TwiML for next question {current_index + 1} for call {call_sid}")
-            
+            increment(total_responses=1)
+            next_state = {'question_index': current_index + 1, 'response_id': response.id}
         else:
-            # All questions have been asked
-            resp.say("Thank you for your time. We will review your responses and get back to you soon.", voice='Polly.Amy')
-            
-            # Update all responses for this call to completed
-            CallResponse.objects.filter(call_sid=call_sid).update(call_status='completed')
-            
-            # Reset the session
-            request.session['current_question_index'] = 0
-            if 'response_id' in request.session:
-                del request.session['response_id']
-            
-            logger.info(f"Call {call_sid} completed successfully")
-        
-        return HttpResponse(str(resp))
-        
-    except Exception as e:
-        logger.error(f"Error in voice view: {str(e)}")
-        resp = VoiceResponse()
-        resp.say("We're sorry, but there was an error processing your call. Please try again later.", voice='Polly.Amy')
-        return HttpResponse(str(resp))
+            # All questions have been asked, mark the interview completed
+            complete_interview(call_sid)
+            next_state = {'question_index': current_index, 'response_id': None}
+
+        # Advance only if no concurrent copy of this webhook got there first
+        advanced = store.compare_and_set(call_sid, state['version'] if state else None, **next_state)
+        if not advanced:
+            transaction.set_rollback(True)
+
+    if not advanced:
+        logger.info(f"Concurrent webhook already advanced call {call_sid}")
+        return _state_twiml(store.get(call_sid), script_id)
+
+    if current_index < len(questions):
+        # Serve the prebuilt TwiML for this question
+        logger.info(f"Generated TwiML for next question {current_index + 1} for call {call_sid}")
+        return question_twiml(current_index, response.id, script_id)
+
+    logger.info(f"Call {call_sid} completed successfully")
+    return goodbye_twiml(script_id)
 
 @csrf_exempt
-def transcription_webhook(request):
+async def transcription_webhook(request):
     """Handle transcription webhook from Twilio"""
     if request.method == "POST":
         try:
@@ -599,25 +914,16 @@ def transcription_webhook(request):
             logger.info(f"Received transcription for CallSID: {call_sid}")
             logger.info(f"Transcript: {transcript_text}")
             logger.info(f"Recording URL: {recording_url}")
-            
-            # Find or create CallResponse
-            response, created = CallResponse.objects.get_or_create(
-                recording_sid=recording_sid,
-                defaults={
-                    'phone_number': call_sid,  # Using call_sid temporarily
-                    'question': 'Auto-transcribed response',
-                    'recording_url': recording_url,
-                    'transcript': transcript_text,
-                    'transcript_status': 'completed'
-                }
+
+            if not recording_sid:
+                logger.error("No RecordingSid provided in request")
+                return HttpResponse('No RecordingSid provided', status=400)
+
+            # Acknowledge once the event is spooled, the flush_webhooks worker stores it in batches
+            await sync_to_async(spool_transcription)(
+                call_sid, recording_sid, recording_url, transcript_text
             )
             
-            if not created:
-                # Update existing response
-                response.transcript = transcript_text
-                response.transcript_status = 'completed'
-                response.save()
-            
             return HttpResponse("Transcription received", status=200)
             
         except Exception as e:
@@ -627,18 +933,23 @@ def transcription_webhook(request):
     return HttpResponse("Invalid request method", status=400)
 
 @csrf_exempt
-def call_status(request):
+async def call_status(request):
     """Handle call status updates"""
     try:
         call_sid = request.POST.get('CallSid')
         call_status = request.POST.get('CallStatus')
         
         if call_sid and call_status:
-            # Update all responses for this call with the new status
-            CallResponse.objects.filter(call_sid=call_sid).update(call_status=call_status)
-            logger.info(f"Updated call {call_sid} status to {call_status}")
+            # Acknowledge once the event is spooled, the flush_webhooks worker applies the last status per call
+            await sync_to_async(spool_status)(
+                call_sid,
+                call_status,
+                _parse_duration(request.POST.get('CallDuration')),
+                _parse_duration(request.POST.get('SequenceNumber'))
+            )
+            logger.info(f"Queued call {call_sid} status {call_status}")
         
         return HttpResponse(status=200)
     except Exception as e:
         logger.error(f"Error in call_status view: {str(e)}")
-        return HttpResponse(status=500)
\ No newline at end of file
+        return HttpResponse(status=500)
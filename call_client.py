@@ -1,21 +1,19 @@
-from twilio.rest import Client
+"""Place one interview call from the command line: python call_client.py +919876543210"""
 import os
-from dotenv import load_dotenv
+import sys
 
-# Load environment variables
-load_dotenv()
+import django
 
-# Get Twilio credentials from environment variables
-account_sid = os.getenv('TWILIO_ACCOUNT_SID')
-auth_token = os.getenv('TWILIO_AUTH_TOKEN')
-twilio_phone = os.getenv('TWILIO_PHONE_NUMBER')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hr_team.settings')
+django.setup()
 
-client = Client(account_sid, auth_token)
+from call.dialer import place_call  # noqa: E402
 
-def make_call(to_number, question):
-    call = client.calls.create(
-        to=to_number,
-        from_=twilio_phone,
-        url=f'https://YOUR_SERVER_URL/answer/?q={question}'
-    )
-    return call.sid 
\ No newline at end of file
+
+def make_call(to_number):
+    """Dial a candidate through the configured telephony provider and return the call SID"""
+    return place_call(to_number).sid
+
+
+if __name__ == '__main__':
+    print(make_call(sys.argv[1]))
@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hr_team.settings')
+# Persistent connections leak under ASGI: each one belongs to a sync_to_async thread that never closes it.
+# Close connections after every request and set DATABASE_POOL=True on Postgres to reuse them instead.
+os.environ.setdefault('DATABASE_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
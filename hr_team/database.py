@@ -0,0 +1,47 @@
+"""
+Database settings built from DATABASE_URL.
+
+SQLite connections get WAL journaling, a busy timeout and synchronous=NORMAL
+as they are opened, so concurrent webhooks queue briefly for the write lock
+instead of failing with "database is locked". Postgres can use psycopg's
+connection pool instead of persistent per-thread connections.
+"""
+from django.db.backends.signals import connection_created
+import dj_database_url
+
+SQLITE_PRAGMAS = {
+    # Readers and the single writer no longer block each other
+    'journal_mode': 'WAL',
+    # Milliseconds to wait for the write lock before giving up
+    'busy_timeout': 5000,
+    # Under WAL a power loss can drop the last commits but never corrupts the database
+    'synchronous': 'NORMAL',
+}
+
+
+def database_config(url, conn_max_age=600, pool=False, pool_min_size=2, pool_max_size=10):
+    """Parse a DATABASE_URL into a DATABASES entry tuned for the webhook workload"""
+    config = dj_database_url.parse(url, conn_max_age=conn_max_age, conn_health_checks=conn_max_age > 0)
+    if config['ENGINE'] == 'django.db.backends.sqlite3':
+        # Take the write lock at BEGIN; a read transaction that later writes cannot
+        # wait on busy_timeout and fails at once if another writer got there first
+        config['OPTIONS'] = {'transaction_mode': 'IMMEDIATE'}
+        config['PRAGMAS'] = dict(SQLITE_PRAGMAS)
+    elif pool and config['ENGINE'] == 'django.db.backends.postgresql':
+        # Django's pool replaces persistent connections and refuses to run alongside them
+        config['CONN_MAX_AGE'] = 0
+        config['CONN_HEALTH_CHECKS'] = False
+        config['OPTIONS'] = {'pool': {'min_size': pool_min_size, 'max_size': pool_max_size}}
+    return config
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """Apply the PRAGMAS of a SQLite DATABASES entry to each new connection"""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in connection.settings_dict.get('PRAGMAS', {}).items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+connection_created.connect(apply_sqlite_pragmas)
@@ -0,0 +1,102 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from call.metrics import finish_request, start_request
+from call.prompts import PROMPT_NAME
+from whitenoise.middleware import WhiteNoiseMiddleware
+import os
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise that also runs natively under ASGI.
+
+    Django runs a sync-only middleware, and everything below it, on the single
+    thread-sensitive executor thread, so stock WhiteNoise would serialize every
+    async view in the process. Static files are still served by WhiteNoise's
+    sync code; other requests are awaited straight through.
+
+    Also serves rendered prompt audio from PROMPT_AUDIO_ROOT, see
+    call/prompts.py. Prompts appear while the server runs, so they are
+    looked up on first request instead of being indexed at startup, and
+    their content-hash names are cached forever like hashed static files.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        # Set before WhiteNoise indexes the static files, which asks immutable_file_test
+        self.prompt_prefix = settings.PROMPT_AUDIO_URL
+        self.prompt_root = settings.PROMPT_AUDIO_ROOT
+        super().__init__(get_response, settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        static_file = self.lookup(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        static_file = self.lookup(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+        return await self.get_response(request)
+
+    def lookup(self, url):
+        if self.autorefresh:
+            static_file = self.find_file(url)
+        else:
+            static_file = self.files.get(url)
+        if static_file is None and url.startswith(self.prompt_prefix):
+            static_file = self.find_prompt(url)
+        return static_file
+
+    def find_prompt(self, url):
+        name = url[len(self.prompt_prefix):]
+        if not PROMPT_NAME.match(name):
+            return None
+        path = os.path.join(self.prompt_root, name)
+        if not os.path.isfile(path):
+            return None
+        # A content-hash name never changes content, so index it like a collected static file
+        static_file = self.files[url] = self.get_static_file(path, url)
+        return static_file
+
+    def immutable_file_test(self, path, url):
+        return url.startswith(self.prompt_prefix) or super().immutable_file_test(path, url)
+
+
+class RequestMetricsMiddleware:
+    """
+    Time every request and count its SQL queries and Twilio API calls.
+
+    Goes first in MIDDLEWARE so the histograms at /metrics and the slow
+    request log cover the whole stack, see call/metrics.py. Runs in either
+    mode without adding a thread hop.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token = start_request()
+        response = self.get_response(request)
+        finish_request(request, response, stats, token)
+        return response
+
+    async def __acall__(self, request):
+        stats, token = start_request()
+        response = await self.get_response(request)
+        finish_request(request, response, stats, token)
+        return response
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 import os
 from pathlib import Path
 from dotenv import load_dotenv
+from .database import database_config
 
 # Load environment variables from .env file
 load_dotenv()
@@ -44,8 +45,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'hr_team.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'hr_team.middleware.AsyncWhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -76,12 +78,17 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'hr_team.wsgi.application'
 
-# Database
+# Database, from DATABASE_URL or the local SQLite file; see hr_team/database.py.
+# DATABASE_POOL=True pools Postgres connections (psycopg[pool]) instead of keeping one per thread.
+# Connections persist for DATABASE_CONN_MAX_AGE seconds, except under ASGI where hr_team/asgi.py defaults it to 0.
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(
+        os.getenv('DATABASE_URL', f"sqlite:///{BASE_DIR / 'db.sqlite3'}"),
+        conn_max_age=int(os.getenv('DATABASE_CONN_MAX_AGE', '600')),
+        pool=os.getenv('DATABASE_POOL', 'False') == 'True',
+        pool_min_size=int(os.getenv('DATABASE_POOL_MIN_SIZE', '2')),
+        pool_max_size=int(os.getenv('DATABASE_POOL_MAX_SIZE', '10')),
+    )
 }
 
 # Password validation
@@ -111,11 +118,76 @@ STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# Telephony provider behind calls, recordings, transcripts and voice markup; see call/telephony.py.
+# call.telephony.FakeProvider simulates one in process, for offline tests and load tests.
+TELEPHONY_PROVIDER = os.getenv('TELEPHONY_PROVIDER', 'call.telephony.TwilioProvider')
+FAKE_TELEPHONY_LATENCY = float(os.getenv('FAKE_TELEPHONY_LATENCY', '0'))
+FAKE_TELEPHONY_FAILURE_RATE = float(os.getenv('FAKE_TELEPHONY_FAILURE_RATE', '0'))
+FAKE_TELEPHONY_TRANSCRIPT_DELAY = float(os.getenv('FAKE_TELEPHONY_TRANSCRIPT_DELAY', '0'))
+
+# Prompt audio: questions rendered to audio once per script version and played with <Play> instead of <Say>.
+# Set PROMPT_SYNTHESIZER to call.prompts.PollySynthesizer (needs boto3), or call.prompts.FakeSynthesizer offline;
+# unset, every prompt is spoken with <Say>. Rendered files are served by WhiteNoise from PROMPT_AUDIO_URL.
+PROMPT_SYNTHESIZER = os.getenv('PROMPT_SYNTHESIZER')
+PROMPT_AUDIO_ROOT = os.getenv('PROMPT_AUDIO_ROOT', os.path.join(BASE_DIR, 'prompt_audio'))
+PROMPT_AUDIO_URL = '/prompts/'
+# Seconds a script with prompts still missing audio waits before looking for newly rendered ones
+PROMPT_AUDIO_RECHECK = float(os.getenv('PROMPT_AUDIO_RECHECK', '60'))
+
+# Cold storage: archive_calls moves interviews older than ARCHIVE_AFTER_DAYS, with their responses, out of the
+# database into compressed Parquet files under ARCHIVE_ROOT, one directory per month. Exports still include them.
+ARCHIVE_ROOT = os.getenv('ARCHIVE_ROOT', os.path.join(BASE_DIR, 'archive'))
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '365'))
+ARCHIVE_COMPRESSION = os.getenv('ARCHIVE_COMPRESSION', 'zstd')
+
 # Twilio Settings
 TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
 TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
 TWILIO_PHONE_NUMBER = os.getenv('TWILIO_PHONE_NUMBER')
 PUBLIC_URL = 'https://call-1-u39m.onrender.com'  # Render deployment URL
 
+# Twilio HTTP transport, shared by every request in a worker process
+TWILIO_HTTP_CONNECT_TIMEOUT = float(os.getenv('TWILIO_HTTP_CONNECT_TIMEOUT', '3.05'))
+TWILIO_HTTP_READ_TIMEOUT = float(os.getenv('TWILIO_HTTP_READ_TIMEOUT', '10'))
+TWILIO_HTTP_POOL_CONNECTIONS = int(os.getenv('TWILIO_HTTP_POOL_CONNECTIONS', '2'))
+TWILIO_HTTP_POOL_SIZE = int(os.getenv('TWILIO_HTTP_POOL_SIZE', '10'))
+TWILIO_HTTP_MAX_RETRIES = int(os.getenv('TWILIO_HTTP_MAX_RETRIES', '0'))
+TWILIO_API_BASE_URL = os.getenv('TWILIO_API_BASE_URL')  # Override to point at a stub server
+
+# Recording audio served by /recordings/<sid>.mp3, cached on local disk and evicted least recently played first
+RECORDING_CACHE_DIR = os.getenv('RECORDING_CACHE_DIR', str(BASE_DIR / 'recording_cache'))
+RECORDING_CACHE_MAX_BYTES = int(os.getenv('RECORDING_CACHE_MAX_BYTES', str(1024 ** 3)))
+
+# Campaign dialing limits, match these to the account's calls-per-second limit
+TWILIO_CALLS_PER_SECOND = float(os.getenv('TWILIO_CALLS_PER_SECOND', '1'))
+CAMPAIGN_MAX_LIVE_CALLS = int(os.getenv('CAMPAIGN_MAX_LIVE_CALLS', '10'))
+
+# Interview progress per CallSid. DatabaseStateStore is shared by every worker;
+# call.state.LocalStateStore keeps it in process and only suits a single worker.
+INTERVIEW_STATE_BACKEND = os.getenv('INTERVIEW_STATE_BACKEND', 'call.state.DatabaseStateStore')
+INTERVIEW_STATE_TTL = int(os.getenv('INTERVIEW_STATE_TTL', '7200'))
+INTERVIEW_STATE_MAX_ENTRIES = int(os.getenv('INTERVIEW_STATE_MAX_ENTRIES', '10000'))
+
+# Status callbacks that beat the row of their call, written by make_call or the dialer, stay spooled and are
+# retried by flush_webhooks for this many seconds before they are dropped
+WEBHOOK_UNMATCHED_GRACE = int(os.getenv('WEBHOOK_UNMATCHED_GRACE', '300'))
+
+# Dashboard Settings
+DASHBOARD_PAGE_SIZE = int(os.getenv('DASHBOARD_PAGE_SIZE', '20'))
+# Live dashboard updates at /events: each worker polls for changes this often and fans them out to its
+# open dashboards, each buffering at most LIVE_EVENTS_QUEUE_SIZE events before it is told to reload
+LIVE_EVENTS_POLL_INTERVAL = float(os.getenv('LIVE_EVENTS_POLL_INTERVAL', '1.0'))
+LIVE_EVENTS_QUEUE_SIZE = int(os.getenv('LIVE_EVENTS_QUEUE_SIZE', '100'))
+LIVE_EVENTS_KEEPALIVE = float(os.getenv('LIVE_EVENTS_KEEPALIVE', '15'))
+
+# Analytics at /analytics/ are cached in the default cache under the data's last change, recomputed after any
+# change; entries of superseded versions expire after ANALYTICS_CACHE_TIMEOUT seconds
+ANALYTICS_CACHE_TIMEOUT = int(os.getenv('ANALYTICS_CACHE_TIMEOUT', '3600'))
+
+# Request metrics at /metrics, in the Prometheus text format; set METRICS_TOKEN to require it as a bearer token
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+# Requests slower than this are logged to call.slow_requests with their SQL and Twilio time
+SLOW_REQUEST_SECONDS = float(os.getenv('SLOW_REQUEST_SECONDS', '1.0'))
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField' 
\ No newline at end of file